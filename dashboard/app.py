@@ -3,8 +3,10 @@ Main Application Entry Point
 Ford GoBike Interactive Dashboard
 """
 
+import os
+
 import dash
-from dash import html
+from dash import dcc, html
 from components.filters  import create_sidebar
 from components.kpi_cards import create_kpi_cards
 from components.charts   import create_charts
@@ -20,10 +22,41 @@ app.layout = html.Div([
     html.Div([
         html.Div(create_kpi_cards(), className="kpi-row"),
         *create_charts(),
-    ], className="content")
+    ], className="content"),
+
+    # Cube and figure templates for GOBIKE_CALLBACK_MODE=clientside
+    dcc.Store(id='trip-tensor'),
+    dcc.Store(id='figure-templates'),
+
+    # Filter state whose exact summary is being computed, then the one just
+    # finished (GOBIKE_APPROX=1)
+    dcc.Store(id='exact-pending'),
+    dcc.Store(id='exact-ready'),
 ], className="dashboard-wrapper")
 
 import callbacks  # noqa: E402 – must be imported after app is defined
 
+# /ready reports when the background warm-up has precomputed common views
+from warmup import register_readiness, start_warmup  # noqa: E402
+register_readiness(app.server)
+
+# Server-Timing headers and /metrics when GOBIKE_METRICS=1
+from instrumentation import register_metrics  # noqa: E402
+register_metrics(app.server)
+
+# Brotli/gzip responses and long-lived caching of fingerprinted assets
+from serving import enable_compression, register_asset_caching  # noqa: E402
+enable_compression(app.server)
+register_asset_caching(app)
+
+# WSGI callable; production serving goes through wsgi.py
+server = app.server
+
 if __name__ == '__main__':
-    app.run(host='127.0.0.1', port=8055, debug=True)
\ No newline at end of file
+    # Development server; see wsgi.py for production
+    debug = True
+    # The reloader's parent process only watches the files: load and warm in the child that serves
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        callbacks.load_data()
+        start_warmup()
+    app.run(host='127.0.0.1', port=8055, debug=debug)
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+Approximate Answers
+Ford GoBike Interactive Dashboard
+
+Stratified samples of the trips for interactive exploration
+(GOBIKE_APPROX=1): while the user is still dragging or the exact summary
+is being computed, the KPIs and summary charts are answered from a sample
+and scaled up, with 95% confidence intervals on the estimated KPIs.
+
+The strata are the filter cells (user type × gender × age group × start
+hour), so every filter selects whole strata. Each trip draws a uniform
+priority; at rate r a cell keeps its trips with priority below r, and at
+least MIN_STRATUM_ROWS of them (or all, when fewer). Within a cell that
+is a simple random sample, and the rates are nested: one array of sampled
+trips, sorted by cell then priority, serves every rate. A query uses the
+smallest rate that gives it MIN_SAMPLE_ROWS sampled trips.
+
+Trip counts per cell are kept exactly, so the total, the subscriber share
+and the user, gender and hour breakdowns are exact. The weekday and
+station breakdowns and the average duration are estimated; the number of
+distinct start stations comes from a HyperLogLog sketch per cell, merged
+over the selected cells.
+
+Like the flow matrix, the samples are saved next to the partitions by
+`scripts/preprocessing.py` (SAMPLES_FILE) and built from the loaded trips
+(or the out-of-core engine's aggregates) when that file is missing or stale.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+from cube import HOURS, TOP_STATIONS, WEEKDAYS, Summary, _factorize, _ranked, _time_codes, short_label
+from flows import CELL_COLUMNS, encode_cells, group_sum, select_cells
+from instrumentation import stage
+
+SAMPLE_RATES     = (0.001, 0.01, 0.1)
+MIN_STRATUM_ROWS = 32     # small cells are kept whole
+MIN_SAMPLE_ROWS  = 20_000
+HLL_BITS = 10           # 1,024 registers per cell: ±3.3% standard error past small counts
+Z = 1.96                # 95% confidence intervals
+SAMPLES_FILE = '_samples.npz'
+
+# Read from the partitions (weekday falls back to start_time)
+SAMPLE_COLUMNS = CELL_COLUMNS + ['day_of_week', 'duration_mins', 'start_station_name']
+_PAIR_KEYS = CELL_COLUMNS + ['start_station_name']
+
+
+# ── Aggregation ───────────────────────────────────────────────────────────────
+def _candidates(rows):
+    """Rows with a priority under the largest rate, plus the MIN_STRATUM_ROWS lowest of each cell."""
+    if not len(rows):
+        return rows
+    key = np.zeros(len(rows), dtype=np.int64)
+    for col in CELL_COLUMNS:
+        codes, labels = pd.factorize(rows[col])
+        key = key * (len(labels) + 1) + codes + 1
+    priority = rows['priority'].to_numpy()
+    order = np.lexsort((priority, key))
+    first = np.flatnonzero(np.r_[True, key[order][1:] != key[order][:-1]])
+    rank = np.arange(len(order)) - np.repeat(first, np.diff(np.r_[first, len(order)]))
+    keep = order[(rank < MIN_STRATUM_ROWS) | (priority[order] < max(SAMPLE_RATES))]
+    return rows.iloc[np.sort(keep)].reset_index(drop=True)
+
+
+def aggregate_trips(df, rng=None):
+    """
+    Exact trips per cell, the sample candidates and the distinct (cell,
+    start station) pairs of `df`. Pass one `rng` for all batches of a
+    partition so reruns draw the same sample.
+    """
+    rng = rng or np.random.default_rng(0)
+    ones = np.ones(len(df))
+    _, weekday = _time_codes(df)
+    rows = df[_PAIR_KEYS].assign(day_of_week=weekday,
+                                 duration_mins=df['duration_mins'].to_numpy(np.float64),
+                                 priority=rng.random(len(df)))
+    return (group_sum(df, CELL_COLUMNS, {'trips': ones}), _candidates(rows),
+            group_sum(df, _PAIR_KEYS, {'trips': ones}))
+
+
+def merge_aggregates(parts):
+    """Combine `aggregate_trips` results of several partitions or batches."""
+    strata, candidates, pairs = (pd.concat(frames, ignore_index=True) for frames in zip(*parts))
+    return (group_sum(strata, CELL_COLUMNS, {'trips': strata['trips'].to_numpy(np.float64)}),
+            _candidates(candidates),
+            group_sum(pairs, _PAIR_KEYS, {'trips': pairs['trips'].to_numpy(np.float64)}))
+
+
+# ── HyperLogLog ───────────────────────────────────────────────────────────────
+def hll_registers(cells, values, ncells, bits=HLL_BITS):
+    """One HyperLogLog sketch of the distinct `values` per cell, as (ncells, 2**bits) registers."""
+    registers = np.zeros((ncells, 1 << bits), dtype=np.uint8)
+    hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+    low = hashes & np.uint64((1 << (64 - bits)) - 1)
+    # Trailing zeros + 1, from the lowest set bit (an exact power of two)
+    lowest = (low & (~low + np.uint64(1))).astype(np.float64)
+    rho = np.where(low == 0, 64 - bits + 1, np.log2(np.maximum(lowest, 1)).astype(np.int64) + 1)
+    np.maximum.at(registers, (cells, (hashes >> np.uint64(64 - bits)).astype(np.int64)), rho.astype(np.uint8))
+    return registers
+
+
+def hll_estimate(registers):
+    """Distinct count of merged registers and the half-width of its 95% interval."""
+    m = registers.size
+    zeros = int(np.count_nonzero(registers == 0))
+    raw = 0.7213 / (1 + 1.079 / m) * m * m / np.exp2(-registers.astype(np.float64)).sum()
+    if raw <= 2.5 * m and zeros:
+        # Linear counting, far more accurate at small cardinalities
+        estimate = m * np.log(m / zeros)
+        t = estimate / m
+        return estimate, Z * np.sqrt(m * (np.exp(t) - t - 1))
+    return raw, Z * 1.04 / np.sqrt(m) * raw
+
+
+# ── Sample ────────────────────────────────────────────────────────────────────
+class TripSample:
+    """Nested stratified samples per filter cell, with exact cell counts and HyperLogLog sketches."""
+
+    ARRAYS = ('user_types', 'genders', 'age_groups', 'stations', 'cell_trips',
+              'offsets', 'take', 'weekday', 'duration', 'station', 'registers')
+
+    def __init__(self, arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.user_types = [str(v) for v in self.user_types]
+        self.genders    = [str(v) for v in self.genders]
+        self.age_groups = [str(v) for v in self.age_groups]
+        self.stations   = [str(v) for v in self.stations]
+        self.short_stations = [short_label(name) for name in self.stations]
+        self.shape = (len(self.user_types) + 1, len(self.genders) + 1, len(self.age_groups) + 1, HOURS + 1)
+
+    @classmethod
+    def from_aggregates(cls, aggregated):
+        """Encode an `aggregate_trips` / `merge_aggregates` result."""
+        strata, candidates, pairs = aggregated
+        cells, (user_types, genders, age_groups) = encode_cells(
+            pd.concat([frame[CELL_COLUMNS] for frame in aggregated], ignore_index=True))
+        bounds = np.cumsum([0] + [len(frame) for frame in aggregated])
+        strata_cell, row_cell, pair_cell = (cells[lo:hi] for lo, hi in zip(bounds, bounds[1:]))
+        ncells = (len(user_types) + 1) * (len(genders) + 1) * (len(age_groups) + 1) * (HOURS + 1)
+
+        # Sampled trips by cell, then priority: rate i keeps the first take[i, c] of cell c
+        priority = candidates['priority'].to_numpy(np.float64)
+        order = np.lexsort((priority, row_cell))
+        row_cell, priority = row_cell[order], priority[order]
+        offsets = np.searchsorted(row_cell, np.arange(ncells + 1))
+        available = np.diff(offsets)
+        take = np.array([np.minimum(np.maximum(np.bincount(row_cell[priority < rate], minlength=ncells),
+                                               MIN_STRATUM_ROWS), available)
+                         for rate in SAMPLE_RATES])
+
+        station, stations = _factorize(candidates['start_station_name'].astype(object))
+        named = pairs['start_station_name'].notna().to_numpy()
+        return cls({
+            'user_types': user_types, 'genders': genders, 'age_groups': age_groups,
+            'stations': stations,
+            'cell_trips': np.bincount(strata_cell, weights=strata['trips'].to_numpy(np.float64),
+                                      minlength=ncells).astype(np.int64),
+            'offsets': offsets,
+            'take': take,
+            'weekday': pd.to_numeric(candidates['day_of_week']).fillna(WEEKDAYS).to_numpy(np.int8)[order],
+            'duration': candidates['duration_mins'].to_numpy(np.float32)[order],
+            'station': station.astype(np.int32)[order],
+            'registers': hll_registers(pair_cell[named],
+                                       pairs['start_station_name'].astype(str).to_numpy()[named], ncells),
+        })
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls.from_aggregates(aggregate_trips(df))
+
+    # ── Storage ───────────────────────────────────────────────────────────────
+    def save(self, path):
+        """Write the arrays to an `.npz` file, replacing `path` atomically."""
+        tmp = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp, **{name: np.asarray(getattr(self, name)) for name in self.ARRAYS})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in cls.ARRAYS})
+
+    # ── Selection ─────────────────────────────────────────────────────────────
+    def summarize(self, sel_user, sel_gender, sel_age, sel_hour):
+        """Estimated :class:`cube.Summary` under the sidebar filters, with `margins`."""
+        with stage('filter'):
+            cells = select_cells(self.user_types, self.genders, self.age_groups,
+                                 sel_user, sel_gender, sel_age, sel_hour)
+            c = np.flatnonzero(cells & (self.cell_trips > 0))
+            take = next((t for t in self.take if t[c].sum() >= MIN_SAMPLE_ROWS), self.take[-1])
+            n = take[c]
+            rows = np.repeat(self.offsets[c] - np.cumsum(n) + n, n) + np.arange(n.sum())
+            local = np.repeat(np.arange(len(c)), n)
+        with stage('aggregate'):
+            return self._aggregate(cells, c, n, rows, local)
+
+    def _aggregate(self, cells, c, n, rows, local):
+        block = np.where(cells, self.cell_trips, 0).reshape(self.shape)
+        total = int(block.sum())
+        N = self.cell_trips[c]
+        weight = (N / np.maximum(n, 1))[local]
+
+        users, genders = block.sum(axis=(1, 2, 3)), block.sum(axis=(0, 2, 3))
+        sub = users[self.user_types.index('Subscriber')] if 'Subscriber' in self.user_types else 0
+        by_hour = block.sum(axis=(0, 1, 2))
+        hours   = np.arange(HOURS + 1)
+        present = (by_hour > 0) & (hours < HOURS)
+
+        weekday = np.bincount(self.weekday[rows], weights=weight, minlength=WEEKDAYS + 1)[:WEEKDAYS]
+        st_trips = np.bincount(self.station[rows], weights=weight,
+                               minlength=len(self.stations) + 1)[:len(self.stations)]
+        stations, station_trips = _ranked(self.short_stations, np.rint(st_trips).astype(np.int64))
+        duration_mean, duration_margin = self._duration(N, n, rows, local)
+        registers = self.registers[c].max(axis=0) if len(c) else np.zeros(self.registers.shape[1], np.uint8)
+        distinct, distinct_margin = hll_estimate(registers)
+        user_types, user_trips = _ranked(self.user_types, users)
+        gender_labels, gender_trips = _ranked(self.genders, genders)
+
+        return Summary(
+            total=total,
+            duration_mean=duration_mean,
+            subscriber_share=sub / total if total else 0.0,
+            distinct_stations=int(round(distinct)),
+            weekday=np.rint(weekday).astype(np.int64),
+            hours=hours[present].astype(np.int32),
+            hour_trips=by_hour[present],
+            user_types=user_types, user_trips=user_trips,
+            genders=gender_labels, gender_trips=gender_trips,
+            stations=stations[:TOP_STATIONS], station_trips=station_trips[:TOP_STATIONS],
+            margins={'duration_mean': duration_margin, 'distinct_stations': distinct_margin},
+        )
+
+    def _duration(self, N, n, rows, local):
+        """Stratified mean duration and its 95% margin (with the finite-population correction)."""
+        d = self.duration[rows].astype(np.float64)
+        has = ~np.isnan(d)
+        k = np.bincount(local[has], minlength=len(N))
+        if not k.sum():
+            return None, None
+        s1 = np.bincount(local[has], weights=d[has], minlength=len(N))
+        s2 = np.bincount(local[has], weights=d[has] ** 2, minlength=len(N))
+        kk = np.maximum(k, 1)
+        mean = s1 / kk
+        var = np.where(k > 1, np.maximum(s2 - k * mean ** 2, 0) / np.maximum(k - 1, 1), 0.0)
+        share = N * k / np.maximum(n, 1)        # trips with a duration, per cell
+        w = share / share.sum()
+        variance = np.sum(w ** 2 * (1 - n / N) * var / kk)
+        return float(np.sum(w * mean)), float(Z * np.sqrt(variance))
+
+
+def load_samples(source):
+    """
+    The samples saved by the preprocessing next to the partitions, or ones
+    drawn from `source` when that file is missing or stale: the loaded
+    trips, or a function returning their `aggregate_trips` result (as the
+    out-of-core engine computes it; that one is saved for the next start).
+    """
+    from data import keep_aggregate, saved_aggregate
+
+    path = saved_aggregate(SAMPLES_FILE)
+    if path:
+        return TripSample.load(path)
+    if callable(source):
+        return keep_aggregate(SAMPLES_FILE, TripSample.from_aggregates(source()))
+    return TripSample.from_aggregates(aggregate_trips(source))
@@ -0,0 +1,212 @@
+/*
+ * Clientside dashboard updates (GOBIKE_CALLBACK_MODE=clientside)
+ * Ford GoBike Interactive Dashboard
+ *
+ * Mirrors TripCube.summarize and figures.py in the browser over the
+ * pre-aggregated payload from TripCube.payload, so filter changes never
+ * leave the page. Only the distinct-station KPI is still computed on the
+ * server.
+ */
+(function () {
+    var HOURS = 24, WEEKDAYS = 7, TOP_STATIONS = 8;
+    var TYPED = {
+        u1: Uint8Array, u2: Uint16Array, u4: Uint32Array,
+        i1: Int8Array, i2: Int16Array, i4: Int32Array,
+        f4: Float32Array, f8: Float64Array
+    };
+
+    // ── Payload decoding (once per payload) ──────────────────────────────────
+    function decode(spec) {
+        var raw = atob(spec.bdata);
+        var bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+        return new TYPED[spec.dtype](bytes.buffer);
+    }
+
+    var cached = {source: null, cube: null};
+    function cubeFor(tensor) {
+        if (cached.source !== tensor) {
+            cached.source = tensor;
+            cached.cube = {
+                shape: tensor.shape,
+                trips: decode(tensor.trips),
+                durSum: decode(tensor.dur_sum),
+                durN: decode(tensor.dur_n),
+                stOffsets: decode(tensor.station_offsets),
+                stIds: decode(tensor.station_ids),
+                stTrips: decode(tensor.station_trips)
+            };
+        }
+        return cached.cube;
+    }
+
+    // ── Selection ────────────────────────────────────────────────────────────
+    function range(lo, hi) {
+        var out = [];
+        for (var i = lo; i < hi; i++) out.push(i);
+        return out;
+    }
+
+    // 'All' keeps every slot including the trailing missing-value slot
+    function pick(labels, value, size) {
+        if (value === 'All') return range(0, size);
+        var i = labels.indexOf(value);
+        return i < 0 ? [] : [i];
+    }
+
+    // Labels with a non-zero count, by count descending then label order
+    function ranked(labels, counts) {
+        var keep = [];
+        for (var i = 0; i < labels.length; i++) if (counts[i] > 0) keep.push(i);
+        keep.sort(function (a, b) { return counts[b] - counts[a] || a - b; });
+        return {
+            labels: keep.map(function (i) { return labels[i]; }),
+            counts: keep.map(function (i) { return counts[i]; })
+        };
+    }
+
+    function summarize(tensor, user, gender, age, hour) {
+        var c = cubeFor(tensor);
+        var U = c.shape[0], G = c.shape[1], A = c.shape[2], H = c.shape[3], D = c.shape[4], S = c.shape[5];
+        var us = pick(tensor.user_types, user, U);
+        var gs = pick(tensor.genders, gender, G);
+        var as = pick(tensor.age_groups, age, A);
+        var hs = (hour && hour.length)
+            ? range(Math.max(hour[0], 0), Math.min(hour[1], HOURS - 1) + 1)
+            : range(0, H);
+
+        var total = 0, durSum = 0, durN = 0;
+        var users = new Float64Array(U), genders = new Float64Array(G);
+        var byHour = new Float64Array(H), weekday = new Float64Array(D);
+        var stations = new Float64Array(S);
+
+        us.forEach(function (u) { gs.forEach(function (g) { as.forEach(function (a) {
+            hs.forEach(function (h) {
+                var cell = ((u * G + g) * A + a) * H + h;
+                for (var d = 0; d < D; d++) {
+                    var n = c.trips[cell * D + d];
+                    total += n; users[u] += n; genders[g] += n;
+                    byHour[h] += n; weekday[d] += n;
+                }
+                durSum += c.durSum[cell];
+                durN += c.durN[cell];
+                for (var k = c.stOffsets[cell]; k < c.stOffsets[cell + 1]; k++) {
+                    stations[c.stIds[k]] += c.stTrips[k];
+                }
+            });
+        }); }); });
+
+        var hours = [], hourTrips = [];
+        for (var h = 0; h < HOURS; h++) {
+            if (byHour[h] > 0) { hours.push(h); hourTrips.push(byHour[h]); }
+        }
+        var sub = tensor.user_types.indexOf('Subscriber');
+        var top = ranked(tensor.stations, stations);
+        return {
+            total: total,
+            durationMean: durN ? durSum / durN : null,
+            subscriberShare: total ? (sub < 0 ? 0 : users[sub]) / total : 0,
+            weekday: Array.prototype.slice.call(weekday, 0, WEEKDAYS),
+            hours: hours,
+            hourTrips: hourTrips,
+            users: ranked(tensor.user_types, users),
+            genders: ranked(tensor.genders, genders),
+            stations: {labels: top.labels.slice(0, TOP_STATIONS), counts: top.counts.slice(0, TOP_STATIONS)}
+        };
+    }
+
+    // ── Figures (same templates as figures.py) ───────────────────────────────
+    function timeFigure(t, s) {
+        return {
+            data: [
+                Object.assign({}, t.time.data[0], {y: s.weekday}),
+                Object.assign({}, t.time.data[1], {x: s.hours, y: s.hourTrips})
+            ],
+            layout: t.time.layout
+        };
+    }
+
+    function userFigure(t, s) {
+        var donut = t.user.data[0], gender = t.user.data[1];
+        var legend = s.users.labels.slice(0, t.donut_colors.length).map(function (lbl, i) {
+            return {
+                font: {color: t.donut_colors[i], family: 'Inter', size: 16},
+                showarrow: false,
+                text: '<span style="font-size: 16px;">●</span> ' + lbl,
+                x: 0.03 + i * 0.22, xref: 'paper',
+                y: -0.16, yref: 'paper'
+            };
+        });
+        return {
+            data: [
+                Object.assign({}, donut, {labels: s.users.labels, values: s.users.counts}),
+                Object.assign({}, gender, {
+                    marker: Object.assign({
+                        color: s.genders.labels.map(function (g) {
+                            return t.gender_colors[g] || t.other_color;
+                        })
+                    }, gender.marker),
+                    x: s.genders.labels,
+                    y: s.genders.counts
+                })
+            ],
+            layout: Object.assign({}, t.user.layout, {
+                annotations: t.user.layout.annotations.concat(legend)
+            })
+        };
+    }
+
+    function stationFigure(t, s) {
+        var bars = t.station.data[0];
+        return {
+            data: [Object.assign({}, bars, {
+                marker: Object.assign({}, bars.marker, {color: s.stations.counts}),
+                x: s.stations.counts,
+                y: s.stations.labels
+            })],
+            layout: t.station.layout
+        };
+    }
+
+    // ── KPIs ─────────────────────────────────────────────────────────────────
+    // Python's '.1f': exact ties (only possible for multiples of 1/4) go to even
+    function fixed1(x) {
+        var t = x * 10;
+        if (Number.isInteger(x * 4) && t - Math.floor(t) === 0.5) {
+            var n = Math.floor(t);
+            return ((n % 2 ? n + 1 : n) / 10).toFixed(1);
+        }
+        return x.toFixed(1);
+    }
+
+    function kpis(s) {
+        return [
+            s.total.toLocaleString('en-US'),
+            s.durationMean === null ? '–' : fixed1(s.durationMean) + ' min',
+            fixed1(s.subscriberShare * 100) + '%'
+        ];
+    }
+
+    if (typeof window === 'undefined') {
+        // Loaded outside the browser (e.g. by a parity check under node)
+        module.exports = {summarize: summarize, kpis: kpis};
+        return;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        gobike: {
+            update: function (user, gender, age, hour, tensor, templates) {
+                if (!tensor || !templates) throw window.dash_clientside.PreventUpdate;
+                var s = summarize(tensor, user, gender, age, hour);
+                if (s.total === 0) {
+                    return ['0', '–', '0%', templates.empty, templates.empty, templates.empty];
+                }
+                return kpis(s).concat([
+                    timeFigure(templates, s),
+                    userFigure(templates, s),
+                    stationFigure(templates, s)
+                ]);
+            }
+        }
+    });
+})();
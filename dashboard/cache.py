@@ -0,0 +1,221 @@
+"""
+Dashboard Result Cache
+Ford GoBike Interactive Dashboard
+
+The sidebar filters have a small, finite domain, so results are cached
+per normalized filter state (see callbacks.py): the summary behind the
+KPIs and summary charts, the other selections, and every figure, keyed
+by a signature of the data it is drawn from. Entries live in an
+in-process LRU (bounded by count and optionally by age). When
+GOBIKE_CACHE_DIR is set, a shared directory behind the summary and figure
+caches lets every worker process (and the warm-up CLI) reuse what the
+others already computed. The other selections hold references to a
+process's own tables, so they are kept per process.
+
+Keys always include the dataset fingerprint, so results computed from an
+older processed file are never served after the data changes.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+# ── Settings ──────────────────────────────────────────────────────────────────
+CACHE_SIZE = int(os.environ.get('GOBIKE_CACHE_SIZE', '2048'))
+CACHE_TTL  = float(os.environ.get('GOBIKE_CACHE_TTL', '0'))   # seconds, 0 = no expiry
+CACHE_DIR  = os.environ.get('GOBIKE_CACHE_DIR', '')           # '' = no shared store
+
+# JSON-lines file of requested filter states, used to pick warm-up views
+REQUEST_LOG = os.environ.get('GOBIKE_REQUEST_LOG', '')
+_log_lock = threading.Lock()
+
+
+def normalize_filters(sel_user, sel_gender, sel_age, sel_hour):
+    """
+    Hashable, canonical form of the four sidebar inputs. Hour ranges are
+    clamped to 0–23 the same way the cube slices them, so equivalent
+    slider positions share one entry.
+    """
+    hours = None
+    if sel_hour:
+        hours = (max(int(sel_hour[0]), 0), min(int(sel_hour[1]), 23))
+    return (sel_user, sel_gender, sel_age, hours)
+
+
+def log_request(filters, path=REQUEST_LOG):
+    """Append one normalized filter state to the request log (if enabled)."""
+    if not path:
+        return
+    line = json.dumps(filters) + '\n'
+    with _log_lock, open(path, 'a') as fh:
+        fh.write(line)
+
+
+def top_requests(n, path=REQUEST_LOG):
+    """The `n` most frequently requested filter states in the request log."""
+    if not path or not os.path.exists(path):
+        return []
+    counts = {}
+    with open(path) as fh:
+        for line in fh:
+            try:
+                user, gender, age, hours = json.loads(line)
+            except ValueError:
+                continue  # partially written line
+            key = (user, gender, age, tuple(hours) if hours else None)
+            counts[key] = counts.get(key, 0) + 1
+    return sorted(counts, key=counts.get, reverse=True)[:n]
+
+
+class FileStore:
+    """
+    Shared store with one pickle file per key. Writes go through a temporary
+    file and an atomic rename, so concurrent workers never read half a value.
+    """
+
+    def __init__(self, path, max_entries, ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha1(repr(key).encode()).hexdigest() + '.pkl')
+
+    def get(self, key):
+        path = self._file(key)
+        try:
+            if self.ttl and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'rb') as fh:
+                stored_key, value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if stored_key == key else None
+
+    def set(self, key, value):
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as fh:
+            pickle.dump((key, value), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self._evict()
+
+    def _evict(self):
+        """Keep at most `max_entries` files, dropping the least recently written."""
+        try:
+            files = [os.path.join(self.path, f) for f in os.listdir(self.path) if f.endswith('.pkl')]
+            files.sort(key=os.path.getmtime)
+            for path in files[:max(len(files) - self.max_entries, 0)]:
+                os.remove(path)
+        except OSError:
+            pass  # another worker is evicting at the same time
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+
+_caches = weakref.WeakSet()   # every ResultCache, for _after_fork
+
+
+class ResultCache:
+    """Thread-safe LRU with optional TTL, hit/miss counters and shared store."""
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL, shared_dir=CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = FileStore(shared_dir, max_entries, ttl) if shared_dir else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.shared_hits = self.evictions = 0
+        _caches.add(self)
+
+    def get(self, key):
+        """Cached value for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self.ttl or time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._remember(key, value)
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self._remember(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for `key`, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for monitoring."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared_hits': self.shared_hits,
+                'evictions': self.evictions,
+            }
+
+
+def _after_fork():
+    """
+    A forked process (a background job) starts with only the thread that
+    forked it: a lock some other thread held at that moment would never be
+    released there.
+    """
+    global _log_lock
+    _log_lock = threading.Lock()
+    for cache in list(_caches):
+        cache._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -1,212 +1,593 @@
-import os
-import os
-import pandas as pd  # type: ignore
-import plotly.graph_objects as go  # type: ignore
-from plotly.subplots import make_subplots  # type: ignore
-from dash import Input, Output, callback  # type: ignore
-
-# ── Elegant Palette ───────────────────────────────────────────────────────────
-P = {
-    'indigo':   '#6366f1',
-    'cyan':     '#06b6d4',
-    'pink':     '#ec4899',
-    'amber':    '#f59e0b',
-    'emerald':  '#10b981',
-    'slate':    '#475569',
-    'light':    '#f8fafc',
-    'grid':     '#f1f5f9',
-    'text':     '#1e293b',
-}
-
-# ── Load data ─────────────────────────────────────────────────────────────────
-_BASE      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-_DATA_PATH = os.path.join(_BASE, 'data', 'processed', 'cleaned_fordgobike_data.csv')
-
-df = pd.read_csv(_DATA_PATH)
-df['start_time']  = pd.to_datetime(df['start_time'], errors='coerce')
-df['start_hour']  = df['start_time'].dt.hour
-df['day_of_week'] = df['start_time'].dt.day_name()
-
-WDAY = ['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday']
-WDAY_SHORT = ['Mon','Tue','Wed','Thu','Fri','Sat','Sun']
-
-
-@callback(
-    [
-        Output('total-trips-kpi',       'children'),
-        Output('avg-duration-kpi',      'children'),
-        Output('subscribers-kpi',       'children'),
-        Output('active-stations-kpi',   'children'),
-        Output('time-analysis-chart',   'figure'),
-        Output('user-behavior-chart',   'figure'),
-        Output('station-analysis-chart','figure'),
-    ],
-    [
-        Input('user-type-filter', 'value'),
-        Input('gender-filter',    'value'),
-        Input('age-group-filter', 'value'),
-        Input('hour-slider',      'value'),
-    ]
-)
-def update_dashboard(sel_user, sel_gender, sel_age, sel_hour):
-
-    fdf = df.copy()
-    if sel_user   != 'All': fdf = fdf[fdf['user_type']     == sel_user]
-    if sel_gender != 'All': fdf = fdf[fdf['member_gender'] == sel_gender]
-    if sel_age    != 'All': fdf = fdf[fdf['age_group'].astype(str) == sel_age]
-    if sel_hour:
-        fdf = fdf[(fdf['start_hour'] >= sel_hour[0]) & (fdf['start_hour'] <= sel_hour[1])]
-
-    # ── Shared layout: clean, minimal, no clutter ─────────────────────────────
-    LY = {
-        'paper_bgcolor': 'rgba(0,0,0,0)',
-        'plot_bgcolor': 'rgba(0,0,0,0)',
-        'font': {'family': 'Inter, sans-serif', 'color': P['slate'], 'size': 14},
-        'margin': {'l': 35, 'r': 15, 't': 30, 'b': 50}, # increased bottom margin for dots
-    }
-    AXIS = {
-        'showgrid': True,
-        'gridcolor': P['grid'],
-        'gridwidth': 1,
-        'zeroline': False,
-        'showline': False,
-    }
-
-    # ── Empty state ───────────────────────────────────────────────────────────
-    if fdf.empty:
-        empty = go.Figure()
-        empty.update_layout(
-            title={'text': "No data matches filters", 'font': {'size': 16, 'color': P['slate']}},
-            **LY
-        )
-        return "0", "–", "0%", "0", empty, empty, empty
-
-    # ── KPIs ──────────────────────────────────────────────────────────────────
-    total    = f"{len(fdf):,}"
-    avg_dur  = f"{fdf['duration_mins'].mean():.1f} min" if 'duration_mins' in fdf.columns else "–"
-    subs     = f"{(fdf['user_type'] == 'Subscriber').mean() * 100:.1f}%"  # type: ignore
-    stations = f"{fdf['start_station_name'].nunique():,}" if 'start_station_name' in fdf.columns else "–"
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # CHART 1 – Time Analysis (Weekday bar + Hour area, side by side)
-    # ══════════════════════════════════════════════════════════════════════════
-    fig_time = make_subplots(
-        rows=1, cols=2,
-        column_widths=[0.48, 0.52],
-        horizontal_spacing=0.1,
-        subplot_titles=("By Weekday", "By Hour")
-    )
-
-    wd = fdf.groupby('day_of_week').size().reindex(WDAY, fill_value=0).reset_index(name='trips')
-    bar_colors = [P['pink'] if d in ['Saturday','Sunday'] else P['indigo'] for d in wd['day_of_week']]
-
-    fig_time.add_trace(go.Bar(
-        x=WDAY_SHORT, y=wd['trips'],
-        marker={'color': bar_colors, 'cornerradius': 4},
-        hovertemplate='%{x}: <b>%{y:,}</b><extra></extra>',
-        showlegend=False,
-    ), row=1, col=1)
-
-    hr = fdf.groupby('start_hour').size().reset_index(name='trips')
-    fig_time.add_trace(go.Scatter(
-        x=hr['start_hour'], y=hr['trips'],
-        mode='lines',
-        line={'color': P['cyan'], 'width': 2.5, 'shape': 'spline'},
-        fill='tozeroy',
-        fillcolor='rgba(6,182,212,0.08)',
-        hovertemplate='%{x}:00 → <b>%{y:,}</b><extra></extra>',
-        showlegend=False,
-    ), row=1, col=2)
-
-    fig_time.update_layout(**LY, showlegend=False)
-    fig_time.update_xaxes(**AXIS)
-    fig_time.update_yaxes(**AXIS)
-    fig_time.update_annotations(font={'size': 14, 'color': P['slate'], 'family': 'Inter'})
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # CHART 2 – User Analysis (Donut + Gender bar, side by side)
-    # ══════════════════════════════════════════════════════════════════════════
-    fig_user = make_subplots(
-        rows=1, cols=2,
-        column_widths=[0.45, 0.55],
-        horizontal_spacing=0.08,
-        subplot_titles=("User Type", "Gender"),
-        specs=[[{"type": "pie"}, {"type": "bar"}]]
-    )
-
-    uc = fdf['user_type'].value_counts()
-    donut_colors = [P['indigo'], P['cyan']]
-    fig_user.add_trace(go.Pie(
-        labels=uc.index, values=uc.values,
-        hole=0.62,
-        marker={'colors': donut_colors, 'line': {'width': 0}},
-        textinfo='percent',
-        textfont={'size': 14, 'color': '#ffffff'},
-        insidetextorientation='horizontal',
-        hovertemplate='<b>%{label}</b><br>%{value:,} (%{percent})<extra></extra>',
-        showlegend=False,
-    ), row=1, col=1)
-
-    gc = fdf['member_gender'].value_counts().reset_index()
-    gc.columns = ['gender','count']
-    gender_colors = {'Male': P['indigo'], 'Female': P['pink'], 'Other': P['amber']}
-    fig_user.add_trace(go.Bar(
-        x=gc['gender'], y=gc['count'],
-        marker={
-            'color': [gender_colors.get(g, P['emerald']) for g in gc['gender']],
-            'cornerradius': 4
-        },
-        width=0.35,
-        hovertemplate='<b>%{x}</b>: %{y:,}<extra></extra>',
-        showlegend=False,
-    ), row=1, col=2)
-
-    # Build legend-dot annotations below the donut
-    legend_annotations = []
-    # Center them vertically and spread them out horizontally to avoid overlap
-    for i, (lbl, clr) in enumerate(zip(uc.index, donut_colors)):
-        x_pos = 0.03 + i * 0.22  # Shifted left slightly more
-        legend_annotations.append({
-            'x': x_pos, 'y': -0.16, 'xref': 'paper', 'yref': 'paper',
-            'text': f'<span style="font-size: 16px;">●</span> {lbl}',
-            'showarrow': False,
-            'font': {'size': 16, 'color': clr, 'family': 'Inter'},
-        })
-
-    fig_user.update_layout(**LY, showlegend=False, annotations=[
-        *fig_user.layout.annotations,
-        *legend_annotations,
-    ])
-    fig_user.update_xaxes(**AXIS)
-    fig_user.update_yaxes(**AXIS)
-    # Style only the subplot title annotations (first two)
-    for i, ann in enumerate(fig_user.layout.annotations):
-        if i < 2:
-            ann.font = {'size': 14, 'color': P['slate'], 'family': 'Inter'}
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # CHART 3 – Station Analysis (Top 8 horizontal bar)
-    # ══════════════════════════════════════════════════════════════════════════
-    ts = fdf['start_station_name'].value_counts().head(8).reset_index()
-    ts.columns = ['station','trips']
-    ts['short'] = ts['station'].apply(lambda s: (s[:30] + '…') if len(s) > 30 else s)
-
-    fig_station = go.Figure(go.Bar(
-        x=ts['trips'], y=ts['short'],
-        orientation='h',
-        marker={
-            'color': ts['trips'],
-            'colorscale': [[0, '#e0e7ff'], [1, P['indigo']]],
-            'cornerradius': 4,
-            'line': {'width': 0},
-        },
-        hovertemplate='<b>%{y}</b><br>Trips: %{x:,}<extra></extra>',
-    ))
-    fig_station.update_layout(
-        yaxis={'categoryorder': 'total ascending', 'tickfont': {'size': 13}},
-        **LY
-    )
-    fig_station.update_xaxes(**AXIS)
-    fig_station.update_yaxes(showgrid=False, zeroline=False, showline=False)
-
-    return total, avg_dur, subs, stations, fig_time, fig_user, fig_station
\ No newline at end of file
+import functools
+import hashlib
+import os
+import threading
+from dash import (  # type: ignore
+    ClientsideFunction, Input, Output, State, callback, clientside_callback, ctx, no_update, set_props,
+)
+from approx import load_samples
+from cache import ResultCache, log_request, normalize_filters
+from cube import TripCube
+from data import trips
+from duckdb_engine import DuckDBEngine
+from filter_index import FilterIndex
+from figures import (
+    balance_figure, empty_figure, flows_figure, ranking_figure, station_figure, station_map_figure,
+    templates, time_figure, timeline_figure, user_figure,
+)
+from flows import load_flows
+from instrumentation import add_collector, stage, timed
+from jobs import POLL_INTERVAL, background_manager, no_progress
+from stations import METRICS, TOP_K, load_stations, map_bounds
+from timeseries import RESOLUTION_LABELS, coarser, day_after, load_rollups, to_seconds, zoom_range
+
+# server: every filter change is a request | clientside: see assets/clientside.js
+CALLBACK_MODE = os.environ.get('GOBIKE_CALLBACK_MODE', 'server')
+
+# cube: pre-aggregated cells (default) | index: bitmap row selection |
+# duckdb: SQL over the Parquet files, without loading the trips (out of core)
+ENGINE  = os.environ.get('GOBIKE_ENGINE', 'cube')
+ENGINES = {'cube': TripCube, 'index': FilterIndex, 'duckdb': DuckDBEngine}
+OUT_OF_CORE = {'duckdb'}
+
+# Server mode only: answer the summary from stratified samples first (approx.py)
+APPROX = os.environ.get('GOBIKE_APPROX', '0') == '1' and CALLBACK_MODE == 'server'
+
+# ── Data ──────────────────────────────────────────────────────────────────────
+# Follows data.trips, which loads on first use or when a server preloads it
+# before forking its workers (see wsgi.py). Every filter combination is
+# answered from `engine` (the station views from `station_index`, the
+# origin–destination views from `flows`, trips over time from `rollups`,
+# estimates from `samples` in approximate mode), never from `df` itself.
+# Out-of-core engines read the files themselves: `df` stays None and the
+# other views are built from their aggregates.
+df = None
+engine = None
+station_index = None
+flows = None
+rollups = None
+samples = None
+data_version = None
+
+# ── Result cache ──────────────────────────────────────────────────────────────
+# Figures keyed by (data version, chart, data signature) and summaries by
+# filters, both shared through GOBIKE_CACHE_DIR when it is set. The other
+# selections reference this process's own tables, so they are kept per
+# process.
+result_cache = ResultCache()
+summary_cache = ResultCache()
+selection_cache = ResultCache(shared_dir='')
+
+
+def cache_metrics():
+    """Result-cache counters for /metrics (GOBIKE_METRICS=1)."""
+    for name, cache in (('result', result_cache), ('summary', summary_cache), ('selection', selection_cache)):
+        stats = cache.stats()
+        yield 'gobike_cache_entries', 'gauge', 'Entries held by a result cache.', {'cache': name}, stats['entries']
+        for key in ('hits', 'misses', 'shared_hits', 'evictions'):
+            yield (f'gobike_cache_{key}_total', 'counter', f"Result cache {key.replace('_', ' ')}.",
+                   {'cache': name}, stats[key])
+
+
+add_collector(cache_metrics)
+
+_reload_lock = threading.Lock()
+
+
+def load_data():
+    """Load the processed trips and build the query engine now (preload hook)."""
+    if ENGINE not in OUT_OF_CORE:
+        trips.load()
+    refresh_data()
+
+
+def refresh_data():
+    """
+    Build the engine for the current trips, the first time and whenever
+    they are reloaded, dropping results cached from older data.
+    """
+    global df, engine, station_index, flows, rollups, samples, data_version
+    version, frame = (trips.version(), None) if ENGINE in OUT_OF_CORE else trips.get()
+    if version == data_version:
+        return
+    with _reload_lock:
+        if version != data_version:
+            df = frame
+            if frame is None:
+                engine = ENGINES[ENGINE]()
+                station_index = load_stations(engine.station_aggregates)
+                flows = load_flows(engine.flow_aggregates)
+                rollups = load_rollups(engine.rollup_aggregates)
+                samples = load_samples(engine.sample_aggregates) if APPROX else None
+            else:
+                engine = ENGINES[ENGINE](frame)
+                station_index = load_stations(frame)
+                flows = load_flows(frame)
+                rollups = load_rollups(frame)
+                samples = load_samples(frame) if APPROX else None
+            data_version = version
+            result_cache.clear()
+            summary_cache.clear()
+            selection_cache.clear()
+
+
+# Inputs shared by every callback
+FILTERS = [
+    Input('user-type-filter', 'value'),
+    Input('gender-filter',    'value'),
+    Input('age-group-filter', 'value'),
+    Input('hour-slider',      'value'),
+]
+
+# Charts drawn from a Summary (builders in CHARTS, at the end)
+SUMMARY_CHARTS = ['time-analysis-chart', 'user-behavior-chart', 'station-analysis-chart']
+
+
+# ── Shared selection ──────────────────────────────────────────────────────────
+def selection(*filters):
+    """
+    Summary for normalized `filters`. The KPI and chart callbacks of one
+    interaction all ask for the same state: the first computes it, the
+    others reuse it.
+    """
+    refresh_data()
+    with stage('selection'):
+        return summary_cache.get_or_compute((data_version,) + filters,
+                                            lambda: engine.summarize(*filters))
+
+
+def station_stats(*filters):
+    """Per-station totals for normalized `filters`, shared by the map and the ranking."""
+    refresh_data()
+    with stage('selection'):
+        return selection_cache.get_or_compute((data_version, 'stations') + filters,
+                                              lambda: station_index.stats(*filters))
+
+
+def flow_views(*filters):
+    """Top flows and station balance for normalized `filters`."""
+    refresh_data()
+    with stage('selection'):
+        return selection_cache.get_or_compute((data_version, 'flows') + filters,
+                                              lambda: flows.views(*filters))
+
+
+def timeline(start, end, *filters, level=None):
+    """
+    Trips over time between epoch seconds `start` and `end` for normalized
+    `filters`, at `level` if given instead of the range's own resolution.
+    """
+    refresh_data()
+    with stage('selection'):
+        return selection_cache.get_or_compute((data_version, 'timeline', start, end, level) + filters,
+                                              lambda: rollups.series(*filters, start, end, level))
+
+
+def _signature(*parts):
+    """Short digest of the data a chart is drawn from."""
+    h = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        h.update(repr(part.tolist() if hasattr(part, 'tolist') else part).encode())
+    return h.hexdigest()
+
+
+def render(chart_id, s, shown):
+    """
+    Figure and signature for `chart_id`. Returns `no_update` for both when
+    the client already shows a figure drawn from the same data (`shown`).
+    """
+    data, build = CHARTS[chart_id]
+
+    def draw():
+        with stage('figure'):
+            return empty_figure() if s.total == 0 else build(s)
+
+    with stage('render'):
+        sig = 'empty' if s.total == 0 else _signature(*data(s))
+        if sig == shown:
+            return no_update, no_update
+        return result_cache.get_or_compute((data_version, chart_id, sig), draw), sig
+
+
+def cached_dashboard(*filters):
+    """All KPI texts and figures for normalized `filters` (used by the warm-up)."""
+    s = selection(*filters)
+    figures = [render(chart_id, s, None)[0] for chart_id in SUMMARY_CHARTS]
+    station_map = render('station-map-chart', station_stats(*filters), None)[0]
+    return (*kpi_texts(s), *figures, station_map)
+
+
+# ── Callbacks ─────────────────────────────────────────────────────────────────
+def server_callback(*args, **kwargs):
+    """
+    `callback` in server mode. In clientside mode the browser owns these
+    outputs; in approximate mode `update_summary_live` serves them.
+    """
+    if CALLBACK_MODE == 'clientside' or APPROX:
+        return lambda fn: fn
+    register = callback(*args, **kwargs)
+    return lambda fn: register(timed(fn))
+
+
+# ── Background jobs ───────────────────────────────────────────────────────────
+# With GOBIKE_BACKGROUND=1 (jobs.py) the station, flow and timeline views run
+# as background jobs: forked processes whose progress shows in the chart
+# card and which Dash kills when the filters change before they finish.
+def current_version():
+    """Fingerprint of the data the next job forks with (a job result cache key)."""
+    refresh_data()
+    return data_version
+
+
+MANAGER = background_manager(cache_by=[current_version])
+
+
+def view_callback(chart_id, *args):
+    """
+    `callback` for an expensive view of `chart_id`, whose function takes a
+    `progress(text)` reporter first. As a background job, the text shows
+    under the card title and the chart is dimmed until the result arrives;
+    without a job manager the view runs in its request and reports nowhere.
+    """
+    if MANAGER is None:
+        def in_request(fn):
+            @functools.wraps(fn)
+            def run(*values):
+                return fn(no_progress, *values)
+            return run
+        register = callback(*args)
+        return lambda fn: register(timed(in_request(fn)))
+    return callback(
+        *args,
+        background=True,
+        manager=MANAGER,
+        interval=POLL_INTERVAL,
+        progress=Output(f'{chart_id}-progress', 'children'),
+        running=[(Output(chart_id, 'className'), 'chart-busy', '')],
+    )
+
+
+def _after_fork():
+    # A job starts with only the forking thread; the caches, the trip store
+    # and the other modules reset their own locks the same way
+    global _reload_lock
+    _reload_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+@server_callback(
+    [
+        Output('total-trips-kpi',       'children'),
+        Output('avg-duration-kpi',      'children'),
+        Output('subscribers-kpi',       'children'),
+        Output('active-stations-kpi',   'children'),
+        Output('kpi-shown',             'data'),
+    ],
+    FILTERS,
+    State('kpi-shown', 'data'),
+)
+def update_kpis(sel_user, sel_gender, sel_age, sel_hour, shown):
+    filters = normalize_filters(sel_user, sel_gender, sel_age, sel_hour)
+    log_request(filters)
+    texts = list(kpi_texts(selection(*filters)))
+    if texts == shown:
+        return [no_update] * 5
+    return (*texts, texts)
+
+
+@server_callback(
+    [
+        Output('time-analysis-chart',       'figure'),
+        Output('time-analysis-chart-shown', 'data'),
+    ],
+    FILTERS,
+    State('time-analysis-chart-shown', 'data'),
+)
+def update_time_chart(sel_user, sel_gender, sel_age, sel_hour, shown):
+    s = selection(*normalize_filters(sel_user, sel_gender, sel_age, sel_hour))
+    return render('time-analysis-chart', s, shown)
+
+
+@server_callback(
+    [
+        Output('user-behavior-chart',       'figure'),
+        Output('user-behavior-chart-shown', 'data'),
+    ],
+    FILTERS,
+    State('user-behavior-chart-shown', 'data'),
+)
+def update_user_chart(sel_user, sel_gender, sel_age, sel_hour, shown):
+    s = selection(*normalize_filters(sel_user, sel_gender, sel_age, sel_hour))
+    return render('user-behavior-chart', s, shown)
+
+
+@server_callback(
+    [
+        Output('station-analysis-chart',       'figure'),
+        Output('station-analysis-chart-shown', 'data'),
+    ],
+    FILTERS,
+    State('station-analysis-chart-shown', 'data'),
+)
+def update_station_chart(sel_user, sel_gender, sel_age, sel_hour, shown):
+    s = selection(*normalize_filters(sel_user, sel_gender, sel_age, sel_hour))
+    return render('station-analysis-chart', s, shown)
+
+
+# ── Trips over time ───────────────────────────────────────────────────────────
+# The date picker sets the range; zooming the chart narrows it, and the
+# finer range is re-queried at a finer resolution. Resetting the zoom goes
+# back to the picked dates.
+@callback(
+    [
+        Output('timeline-dates', 'min_date_allowed'),
+        Output('timeline-dates', 'max_date_allowed'),
+        Output('timeline-dates', 'initial_visible_month'),
+    ],
+    Input('timeline-dates', 'id'),
+)
+@timed
+def init_date_range(_):
+    refresh_data()
+    first, last = (str(day) for day in rollups.date_range())
+    return first, last, first
+
+
+@callback(
+    Output('timeline-window', 'data'),
+    [
+        Input('timeline-dates', 'start_date'),
+        Input('timeline-dates', 'end_date'),
+        Input('timeline-chart', 'relayoutData'),
+    ],
+)
+def update_timeline_window(start_date, end_date, view):
+    zoom = zoom_range(view) if ctx.triggered_id == 'timeline-chart' else None
+    return list(zoom) if zoom else [start_date, day_after(end_date)]
+
+
+@view_callback(
+    'timeline-chart',
+    [
+        Output('timeline-chart',       'figure'),
+        Output('timeline-chart-shown', 'data'),
+    ],
+    FILTERS + [Input('timeline-window', 'data')],
+    State('timeline-chart-shown', 'data'),
+)
+def update_timeline_chart(progress, sel_user, sel_gender, sel_age, sel_hour, window, shown):
+    start, end = (to_seconds(value) for value in (window or [None, None]))
+    filters = normalize_filters(sel_user, sel_gender, sel_age, sel_hour)
+    if MANAGER is not None:
+        # Partial result: the next coarser resolution, drawn while the job goes on
+        refresh_data()
+        preview = coarser(rollups.span(start, end)[2])
+        if preview:
+            progress(f'Drawing a {RESOLUTION_LABELS[preview]} preview…')
+            t = timeline(start, end, *filters, level=preview)
+            set_props('timeline-chart', {'figure': render('timeline-chart', t, None)[0]})
+            shown = None   # what the client shows is no longer what `shown` describes
+    progress('Summing trips over time…')
+    t = timeline(start, end, *filters)
+    return render('timeline-chart', t, shown)
+
+
+# ── Station analytics ─────────────────────────────────────────────────────────
+# Served by the station index in both callback modes. The ranking follows
+# the map: once it has been panned or zoomed, only stations in view count.
+@view_callback(
+    'station-map-chart',
+    [
+        Output('station-map-chart',       'figure'),
+        Output('station-map-chart-shown', 'data'),
+    ],
+    FILTERS,
+    State('station-map-chart-shown', 'data'),
+)
+def update_station_map(progress, sel_user, sel_gender, sel_age, sel_hour, shown):
+    progress('Totalling trips per station…')
+    st = station_stats(*normalize_filters(sel_user, sel_gender, sel_age, sel_hour))
+    return render('station-map-chart', st, shown)
+
+
+@view_callback(
+    'station-ranking-chart',
+    [
+        Output('station-ranking-chart',       'figure'),
+        Output('station-ranking-chart-shown', 'data'),
+    ],
+    FILTERS + [
+        Input('station-metric',    'value'),
+        Input('station-map-chart', 'relayoutData'),
+    ],
+    State('station-ranking-chart-shown', 'data'),
+)
+def update_station_ranking(progress, sel_user, sel_gender, sel_age, sel_hour, metric, view, shown):
+    progress('Totalling trips per station…')
+    st = station_stats(*normalize_filters(sel_user, sel_gender, sel_age, sel_hour))
+    metric = metric if metric in METRICS else 'trips'
+    progress('Ranking the stations in view…')
+    with stage('aggregate'):
+        ranking = station_index.top_k(st, metric, TOP_K, map_bounds(view))
+    return render('station-ranking-chart', ranking, shown)
+
+
+# ── Origin–destination flows ──────────────────────────────────────────────────
+# From the sparse flow matrix, in both callback modes.
+@view_callback(
+    'flows-chart',
+    [
+        Output('flows-chart',       'figure'),
+        Output('flows-chart-shown', 'data'),
+    ],
+    FILTERS,
+    State('flows-chart-shown', 'data'),
+)
+def update_flows_chart(progress, sel_user, sel_gender, sel_age, sel_hour, shown):
+    progress('Summing origin–destination flows…')
+    top, _ = flow_views(*normalize_filters(sel_user, sel_gender, sel_age, sel_hour))
+    return render('flows-chart', top, shown)
+
+
+@view_callback(
+    'balance-chart',
+    [
+        Output('balance-chart',       'figure'),
+        Output('balance-chart-shown', 'data'),
+    ],
+    FILTERS,
+    State('balance-chart-shown', 'data'),
+)
+def update_balance_chart(progress, sel_user, sel_gender, sel_age, sel_hour, shown):
+    progress('Summing origin–destination flows…')
+    _, balance = flow_views(*normalize_filters(sel_user, sel_gender, sel_age, sel_hour))
+    return render('balance-chart', balance, shown)
+
+
+# ── Approximate mode ──────────────────────────────────────────────────────────
+# One callback serves the KPIs and summary charts and also follows the hour
+# slider while it is dragged. Until the exact summary of a filter state is
+# cached, it answers from the samples; a settled state is then handed to
+# `fill_exact`, whose completion runs it again with the exact summary.
+def summary(*filters):
+    """(Summary, exact?) for normalized `filters`: the cached exact summary, else an estimate."""
+    refresh_data()
+    if samples is None:
+        return selection(*filters), True
+    exact = summary_cache.get((data_version,) + filters)
+    if exact is not None:
+        return exact, True
+    with stage('selection'):
+        return selection_cache.get_or_compute((data_version, 'approx') + filters,
+                                              lambda: samples.summarize(*filters)), False
+
+
+if APPROX:
+    @callback(
+        [
+            Output('total-trips-kpi',       'children'),
+            Output('avg-duration-kpi',      'children'),
+            Output('subscribers-kpi',       'children'),
+            Output('active-stations-kpi',   'children'),
+            Output('kpi-shown',             'data'),
+        ] + [
+            output for chart_id in SUMMARY_CHARTS
+            for output in (Output(chart_id, 'figure'), Output(f'{chart_id}-shown', 'data'))
+        ] + [
+            Output('exact-pending', 'data'),
+        ],
+        FILTERS + [
+            Input('hour-slider', 'drag_value'),
+            Input('exact-ready', 'data'),
+        ],
+        [State('kpi-shown', 'data')] + [State(f'{chart_id}-shown', 'data') for chart_id in SUMMARY_CHARTS],
+    )
+    @timed
+    def update_summary_live(sel_user, sel_gender, sel_age, sel_hour, drag, ready, kpis_shown, *charts_shown):
+        dragging = set(ctx.triggered_prop_ids) == {'hour-slider.drag_value'}
+        filters = normalize_filters(sel_user, sel_gender, sel_age, (drag or sel_hour) if dragging else sel_hour)
+        if not dragging:
+            log_request(filters)
+        s, exact = summary(*filters)
+        texts = list(kpi_texts(s))
+        kpis = [no_update] * 5 if texts == kpis_shown else [*texts, texts]
+        charts = [part for chart_id, shown in zip(SUMMARY_CHARTS, charts_shown)
+                  for part in render(chart_id, s, shown)]
+        return (*kpis, *charts, no_update if exact or dragging else list(filters))
+
+    @callback(
+        Output('exact-ready', 'data'),
+        Input('exact-pending', 'data'),
+        prevent_initial_call=True,
+    )
+    @timed
+    def fill_exact(pending):
+        selection(*normalize_filters(*pending))
+        return pending
+
+
+# ── Clientside mode ───────────────────────────────────────────────────────────
+# The cube and figure templates are shipped once per page load; the browser
+# then answers every filter change itself. The distinct-station count needs
+# the station bitmaps, so it stays on the server.
+if CALLBACK_MODE == 'clientside':
+    clientside_callback(
+        ClientsideFunction(namespace='gobike', function_name='update'),
+        [
+            Output('total-trips-kpi',       'children'),
+            Output('avg-duration-kpi',      'children'),
+            Output('subscribers-kpi',       'children'),
+            Output('time-analysis-chart',   'figure'),
+            Output('user-behavior-chart',   'figure'),
+            Output('station-analysis-chart','figure'),
+        ],
+        FILTERS + [
+            Input('trip-tensor',      'data'),
+            Input('figure-templates', 'data'),
+        ],
+    )
+
+    @callback(
+        [
+            Output('trip-tensor',      'data'),
+            Output('figure-templates', 'data'),
+        ],
+        Input('trip-tensor', 'id'),
+    )
+    @timed
+    def send_payload(_):
+        refresh_data()
+        cube = engine if isinstance(engine, TripCube) else None
+        payload = result_cache.get_or_compute(
+            (data_version, 'payload'), lambda: (cube or TripCube(trips.get()[1])).payload())
+        return payload, templates()
+
+    @callback(
+        Output('active-stations-kpi', 'children'),
+        FILTERS,
+    )
+    @timed
+    def update_station_kpi(sel_user, sel_gender, sel_age, sel_hour):
+        filters = normalize_filters(sel_user, sel_gender, sel_age, sel_hour)
+        log_request(filters)
+        return kpi_texts(selection(*filters))[3]
+
+
+# ── KPIs ──────────────────────────────────────────────────────────────────────
+def kpi_texts(s):
+    """
+    Total trips, average duration, subscriber share and active stations.
+    Estimates carry their 95% margin (approximate mode), unless it rounds
+    to zero at the precision shown.
+    """
+    if s.total == 0:
+        return "0", "–", "0%", "0"
+    margins  = s.margins or {}
+    total    = f"{s.total:,}"
+    avg_dur  = f"{s.duration_mean:.1f} min" if s.duration_mean is not None else "–"
+    dur_margin = round(margins.get('duration_mean') or 0.0, 1)
+    if s.duration_mean is not None and dur_margin:
+        avg_dur = f"{s.duration_mean:.1f} ± {dur_margin:.1f} min"
+    subs     = f"{s.subscriber_share * 100:.1f}%"
+    stations = f"{s.distinct_stations:,}"
+    station_margin = round(margins.get('distinct_stations') or 0.0)
+    if station_margin:
+        stations += f" ± {station_margin:,}"
+    return total, avg_dur, subs, stations
+
+
+# chart id → (data the figure is drawn from, builder)
+CHARTS = {
+    'time-analysis-chart':    (lambda s: (s.weekday, s.hours, s.hour_trips), time_figure),
+    'user-behavior-chart':    (lambda s: (s.user_types, s.user_trips, s.genders, s.gender_trips), user_figure),
+    'station-analysis-chart': (lambda s: (s.stations, s.station_trips), station_figure),
+    # Drawn from StationStats and Ranking rather than a Summary
+    'station-map-chart':      (lambda st: (st.departures,), station_map_figure),
+    'station-ranking-chart':  (lambda r: (r.metric, r.stations, r.values), ranking_figure),
+    'timeline-chart':         (lambda t: (t.resolution, t.times.view('i8'), t.trips), timeline_figure),
+    'flows-chart':            (lambda f: (f.origins, f.destinations, f.trips, f.duration), flows_figure),
+    'balance-chart':          (lambda b: (b.stations, b.net), balance_figure),
+}
\ No newline at end of file
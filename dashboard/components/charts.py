@@ -1,24 +1,36 @@
 from dash import html, dcc
 
+from stations import METRICS
+
 
 def create_charts():
     """
     New layout:
     - Row 1: Time Analysis (full width)
     - Row 2: User Analysis (donut + gender) | Station Analysis (side by side)
+    - Row 3: Trips over Time with a date range (below the fold)
+    - Row 4: Station Map | Station Ranking
+    - Row 5: Top Flows | Station Balance
     """
-    def chart_card(title, chart_id, class_extra=""):
+    def chart_card(title, chart_id, class_extra="", controls=None):
         cls = "card-custom"
         if class_extra:
             cls += " " + class_extra
+        header = html.H4(title)
+        if controls is not None:
+            header = html.Div([header, controls], className="card-header-row")
         return html.Div([
-            html.H4(title),
+            header,
             html.Hr(),
+            # Progress of the view's background job (GOBIKE_BACKGROUND=1)
+            html.Div(id=f"{chart_id}-progress", className="chart-progress"),
             dcc.Graph(
                 id=chart_id,
                 style={'height': '100%'},
                 config={'displayModeBar': False}
-            )
+            ),
+            # Signature of the data currently drawn; unchanged data skips the update
+            dcc.Store(id=f"{chart_id}-shown"),
         ], className=cls,
            style={"display": "flex", "flexDirection": "column", "flex": "1"})
 
@@ -33,4 +45,40 @@ def create_charts():
             chart_card("👥 User Analysis – Subscriber vs Customer & Gender", "user-behavior-chart"),
             chart_card("📍 Station Analysis – Top Start Stations", "station-analysis-chart"),
         ], className="chart-bottom-row"),
+
+        # ── Row 3: Trips over Time ────────────────────────────────────────
+        html.Div([
+            chart_card(
+                "📈 Trips over Time – Zoom In to Drill Down", "timeline-chart",
+                controls=dcc.DatePickerRange(
+                    id='timeline-dates',
+                    display_format='MMM D, YYYY',
+                    clearable=True,
+                    className="timeline-dates",
+                ),
+            ),
+            # Range the chart currently covers: the picked dates or the zoomed area
+            dcc.Store(id='timeline-window'),
+        ], className="chart-map-row chart-timeline-row"),
+
+        # ── Row 4: Station Map + Station Ranking ──────────────────────────
+        html.Div([
+            chart_card("🗺️ Station Map – Trips Started per Station", "station-map-chart"),
+            chart_card(
+                "🏆 Station Ranking – Top Stations in View", "station-ranking-chart",
+                controls=dcc.Dropdown(
+                    id='station-metric',
+                    options=[{'label': label, 'value': key} for key, label in METRICS.items()],
+                    value='trips',
+                    clearable=False,
+                    className="metric-dropdown",
+                ),
+            ),
+        ], className="chart-map-row"),
+
+        # ── Row 5: Origin–Destination Flows ───────────────────────────────
+        html.Div([
+            chart_card("🔀 Top Flows – Busiest Origin → Destination Pairs", "flows-chart"),
+            chart_card("⚖️ Station Balance – Bikes Gained & Lost", "balance-chart"),
+        ], className="chart-map-row chart-flow-row"),
     ]
\ No newline at end of file
@@ -103,4 +103,29 @@ def create_sidebar():
             ], className="sidebar-footer"),
         ],
         className="sidebar"
-    )
\ No newline at end of file
+    )
+
+
+def _walk(component):
+    """Yield `component` and every component nested in its children."""
+    yield component
+    children = getattr(component, 'children', None)
+    if not isinstance(children, (list, tuple)):
+        children = [children]
+    for child in children:
+        if hasattr(child, 'to_plotly_json'):
+            yield from _walk(child)
+
+
+def filter_space():
+    """
+    Values each sidebar filter can take, read from the layout itself:
+    every option of a dropdown and the default position of a slider.
+    """
+    space = {}
+    for comp in _walk(create_sidebar()):
+        if isinstance(comp, dcc.Dropdown):
+            space[comp.id] = [opt['value'] for opt in comp.options]
+        elif isinstance(comp, dcc.RangeSlider):
+            space[comp.id] = [comp.value]
+    return space
\ No newline at end of file
@@ -1,4 +1,4 @@
-from dash import html
+from dash import html, dcc
 
 def create_kpi_cards():
     """4 KPI cards with icons."""
@@ -8,7 +8,8 @@ def create_kpi_cards():
         ("👥", "Subscribers",     "subscribers-kpi",    "–"),
         ("📍", "Active Stations", "active-stations-kpi","–"),
     ]
-    return [
+    # KPI texts currently shown; unchanged values skip the update
+    return [dcc.Store(id='kpi-shown')] + [
         html.Div([
             html.Div([
                 html.Span(icon, style={"fontSize": "1.4rem"}),
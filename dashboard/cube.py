@@ -0,0 +1,240 @@
+"""
+Pre-aggregated Filter Cube
+Ford GoBike Interactive Dashboard
+
+Rolls the trip table up once at startup over
+user_type × member_gender × age_group × start_hour × day_of_week, plus a
+per-station slice for every (user, gender, age, hour) cell. The dashboard
+callback answers a filter combination by summing a few hundred cube cells
+instead of scanning the raw trips.
+"""
+
+import base64
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+from instrumentation import stage
+
+HOURS    = 24
+WEEKDAYS = 7
+TOP_STATIONS  = 8
+STATION_CHARS = 30
+
+
+def _factorize(values):
+    """
+    Codes in order of first appearance (matching pandas' value_counts tie
+    order) with missing values moved to one extra trailing slot.
+    """
+    codes, uniques = pd.factorize(values)
+    codes = codes.astype(np.int64)
+    codes[codes < 0] = len(uniques)
+    return codes, [str(u) for u in uniques]
+
+
+def _time_codes(df):
+    """
+    Start hour and weekday (0 = Monday) codes, missing values moved to the
+    trailing slot. The columns precomputed by the preprocessing are used
+    when present; `start_time` is only parsed for files without them.
+    """
+    start, codes = None, []
+    for col, field, missing in (('start_hour', 'hour', HOURS), ('day_of_week', 'dayofweek', WEEKDAYS)):
+        if col in df.columns:
+            values = df[col]
+        else:
+            if start is None:
+                start = pd.to_datetime(df['start_time'], errors='coerce')
+            values = getattr(start.dt, field)
+        codes.append(values.fillna(missing).to_numpy(np.int64))
+    return codes
+
+
+def _ranked(labels, counts, first=None):
+    """
+    Drop empty and missing slots, then sort by count descending the same way
+    ``Series.value_counts`` does (first-appearance order, reversed quicksort),
+    so ties land in the same order as they did on the raw rows.
+    """
+    counts = counts[:len(labels)]
+    keep   = np.flatnonzero(counts > 0)
+    if first is not None:
+        keep = keep[np.argsort(first[keep], kind='stable')]
+    order = keep[::-1][counts[keep][::-1].argsort(kind='quicksort')][::-1]
+    return [labels[i] for i in order], counts[order]
+
+
+def _typed(values):
+    """
+    Array as a plotly-style typed array ``{'dtype', 'bdata'}`` (little-endian
+    base64). Counts use the smallest unsigned type that holds them.
+    """
+    values = np.asarray(values)
+    dtype = np.float64
+    if values.dtype.kind in 'iu':
+        top = int(values.max()) if values.size else 0
+        dtype = next(t for t in (np.uint8, np.uint16, np.uint32) if top <= np.iinfo(t).max)
+    arr = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {'dtype': arr.dtype.str[1:], 'bdata': base64.b64encode(arr).decode('ascii')}
+
+
+def short_label(name):
+    """Truncate long station names for the bar chart axis."""
+    return (name[:STATION_CHARS] + '…') if len(name) > STATION_CHARS else name
+
+
+@dataclass
+class Summary:
+    """Everything the KPI cards and the three charts need for one filter state."""
+    total: int
+    duration_mean: Optional[float]
+    subscriber_share: float
+    distinct_stations: int
+    weekday: np.ndarray
+    hours: np.ndarray
+    hour_trips: np.ndarray
+    user_types: list
+    user_trips: np.ndarray
+    genders: list
+    gender_trips: np.ndarray
+    stations: list
+    station_trips: np.ndarray
+    # 95% half-widths of estimated values (approx.py); None for exact answers
+    margins: Optional[dict] = None
+
+
+class TripCube:
+    """
+    Dense aggregate arrays over the dashboard's filter dimensions.
+
+    Every dimension carries one trailing slot for missing values so that the
+    'All' selections still count those trips, exactly like the row filters.
+    """
+
+    def __init__(self, df):
+        hour, wday = _time_codes(df)
+
+        u, self.user_types = _factorize(df['user_type'])
+        g, self.genders    = _factorize(df['member_gender'])
+        a, self.age_groups = _factorize(df['age_group'].astype(object))
+        s, self.stations   = _factorize(df['start_station_name'])
+        self.short_stations = [short_label(name) for name in self.stations]
+
+        U, G, A, S = (len(self.user_types) + 1, len(self.genders) + 1,
+                      len(self.age_groups) + 1, len(self.stations))
+        H, D = HOURS + 1, WEEKDAYS + 1
+
+        # ── Trip counts and duration sums per filter cell ────────────────────
+        cell = (((u * G + g) * A + a) * H + hour) * D + wday
+        dur  = df['duration_mins'].to_numpy(np.float64)
+        has  = ~np.isnan(dur)
+        size = U * G * A * H * D
+        self.trips    = np.bincount(cell, minlength=size).reshape(U, G, A, H, D)
+        self.dur_sum  = np.bincount(cell[has], weights=dur[has], minlength=size).reshape(U, G, A, H, D)
+        self.dur_n    = np.bincount(cell[has], minlength=size).reshape(U, G, A, H, D)
+
+        # ── Per-station counts, first row seen and presence bitmap ───────────
+        valid = s < S
+        key   = (cell[valid] // D) * S + s[valid]
+        size  = U * G * A * H * S
+        self.station_trips = np.bincount(key, minlength=size).reshape(U, G, A, H, S)
+        first = np.full(size, np.iinfo(np.int64).max, dtype=np.int64)
+        seen, at = np.unique(key, return_index=True)
+        first[seen] = np.flatnonzero(valid)[at]
+        self.station_first = first.reshape(U, G, A, H, S)
+        self.station_bits  = np.packbits(self.station_trips > 0, axis=-1)
+
+    # ── Selection ─────────────────────────────────────────────────────────────
+    @staticmethod
+    def _pick(labels, value):
+        if value == 'All':
+            return slice(None)
+        if value in labels:
+            i = labels.index(value)
+            return slice(i, i + 1)
+        return slice(0, 0)
+
+    def cells(self, sel_user, sel_gender, sel_age, sel_hour):
+        """Cube slice matching the four sidebar filters."""
+        hours = slice(None)
+        if sel_hour:
+            hours = slice(max(sel_hour[0], 0), min(sel_hour[1], HOURS - 1) + 1)
+        return (self._pick(self.user_types, sel_user),
+                self._pick(self.genders,    sel_gender),
+                self._pick(self.age_groups, sel_age),
+                hours)
+
+    def summarize(self, sel_user, sel_gender, sel_age, sel_hour):
+        """Aggregate the selected cells into a :class:`Summary`."""
+        with stage('filter'):
+            sel = self.cells(sel_user, sel_gender, sel_age, sel_hour)
+        with stage('aggregate'):
+            return self._aggregate(sel)
+
+    def _aggregate(self, sel):
+        block  = self.trips[sel]
+        total  = int(block.sum())
+        dur_n  = int(self.dur_n[sel].sum())
+
+        users = np.zeros(self.trips.shape[0], dtype=np.int64)
+        users[sel[0]] = block.sum(axis=(1, 2, 3, 4))
+        genders = np.zeros(self.trips.shape[1], dtype=np.int64)
+        genders[sel[1]] = block.sum(axis=(0, 2, 3, 4))
+        sub = users[self.user_types.index('Subscriber')] if 'Subscriber' in self.user_types else 0
+
+        by_hour = block.sum(axis=(0, 1, 2, 4))
+        hours   = np.arange(HOURS + 1)[sel[3]]
+        present = (by_hour > 0) & (hours < HOURS)
+
+        st_trips = self.station_trips[sel].sum(axis=(0, 1, 2, 3))
+        st_first = self.station_first[sel].min(axis=(0, 1, 2, 3), initial=np.iinfo(np.int64).max)
+        stations, station_trips = _ranked(self.short_stations, st_trips, st_first)
+
+        bits = self.station_bits[sel].reshape(-1, self.station_bits.shape[-1])
+        seen = np.bitwise_or.reduce(bits, axis=0)
+        user_types, user_trips = _ranked(self.user_types, users)
+        gender_labels, gender_trips = _ranked(self.genders, genders)
+
+        return Summary(
+            total=total,
+            duration_mean=float(self.dur_sum[sel].sum() / dur_n) if dur_n else None,
+            subscriber_share=sub / total if total else 0.0,
+            distinct_stations=int(np.unpackbits(seen).sum()),
+            weekday=block.sum(axis=(0, 1, 2, 3))[:WEEKDAYS],
+            hours=hours[present].astype(np.int32),
+            hour_trips=by_hour[present],
+            user_types=user_types, user_trips=user_trips,
+            genders=gender_labels, gender_trips=gender_trips,
+            stations=stations[:TOP_STATIONS], station_trips=station_trips[:TOP_STATIONS],
+        )
+
+    # ── Browser payload ───────────────────────────────────────────────────────
+    def payload(self):
+        """
+        The cube in a compact form for the clientside callbacks: dense trip
+        counts, duration sums per (user, gender, age, hour) cell, and the
+        non-zero station counts of each cell in CSR layout (offsets into
+        station ids and counts). Station ties are broken by first appearance
+        in the whole table rather than in the selection.
+        """
+        U, G, A, H, S = self.station_trips.shape
+        per_cell = self.station_trips.reshape(-1, S)
+        cell, station = np.nonzero(per_cell)
+        offsets = np.zeros(len(per_cell) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell, minlength=len(per_cell)), out=offsets[1:])
+        return {
+            'shape':         [U, G, A, H, self.trips.shape[-1], S],
+            'user_types':    self.user_types,
+            'genders':       self.genders,
+            'age_groups':    self.age_groups,
+            'stations':      self.short_stations,
+            'trips':         _typed(self.trips),
+            'dur_sum':       _typed(self.dur_sum.sum(axis=-1)),
+            'dur_n':         _typed(self.dur_n.sum(axis=-1)),
+            'station_offsets': _typed(offsets),
+            'station_ids':     _typed(station),
+            'station_trips':   _typed(per_cell[cell, station]),
+        }
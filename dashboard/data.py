@@ -0,0 +1,299 @@
+"""
+Data Access Layer
+Ford GoBike Interactive Dashboard
+
+Loads the processed trip table written by `scripts/preprocessing.py`.
+The partitioned Parquet dataset is preferred: it keeps categories and
+compact dtypes (schema.py) and lets us read only the columns the
+dashboard uses; files of another schema version are refused. The single
+Parquet file of `scripts/preprocessing_stream.py`, then the CSV export,
+are accepted as fallbacks when no dataset (or Parquet engine) is
+available. A single file left by a run from before the schema versions
+gives way to the CSV export when there is one.
+
+With GOBIKE_DATA_MODE=mmap the table is served from a column store of
+`.npy` files opened with mmap, so every worker process shares the same
+physical pages and categories are held as integer codes.
+
+Nothing is read at import time: `trips` loads the table on first use (or
+when a server preloads it) and reloads it when the files change.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+import pandas as pd  # type: ignore
+
+from schema import SCHEMA_VERSION, check_schema, file_version
+
+_BASE         = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# GOBIKE_DATA_DIR points the dashboard at another processed directory (e.g. benchmarks)
+PROCESSED_DIR = os.environ.get('GOBIKE_DATA_DIR') or os.path.join(_BASE, 'data', 'processed')
+DATASET_DIR   = os.path.join(PROCESSED_DIR, 'trips')
+PARQUET_PATH  = os.path.join(PROCESSED_DIR, 'cleaned_fordgobike_data.parquet')
+CSV_PATH      = os.path.join(PROCESSED_DIR, 'cleaned_fordgobike_data.csv')
+COLUMNS_DIR   = os.path.join(PROCESSED_DIR, 'columns')
+
+# auto (Parquet, else CSV) | parquet | csv | mmap
+DATA_MODE = os.environ.get('GOBIKE_DATA_MODE', 'auto')
+
+# How often (seconds) to check whether the processed files changed on disk
+CHECK_INTERVAL = 30
+
+# Columns read by the dashboard; everything else stays on disk
+COLUMNS = [
+    'start_time',
+    'start_hour',
+    'day_of_week',
+    'user_type',
+    'member_gender',
+    'age_group',
+    'start_station_name',
+    'duration_mins',
+    # Station analytics (stations.py) and flows (flows.py)
+    'start_station_id',
+    'end_station_id',
+    'end_station_name',
+    'start_station_latitude',
+    'start_station_longitude',
+    'end_station_latitude',
+    'end_station_longitude',
+]
+
+
+def load_trips(columns=COLUMNS, mode=None):
+    """Load the processed trips in the configured mode (see module docstring)."""
+    mode = mode or DATA_MODE
+    if mode == 'mmap':
+        return load_column_store(columns)
+    return _read_table(columns, prefer_parquet=(mode != 'csv'))
+
+
+def partition_files():
+    """Partition files of the processed dataset, in a stable order."""
+    if not os.path.isdir(DATASET_DIR):
+        return []
+    return sorted(os.path.join(DATASET_DIR, name) for name in os.listdir(DATASET_DIR)
+                  if name.startswith('part-') and name.endswith('.parquet'))
+
+
+def saved_aggregate(name):
+    """
+    Path of an aggregate file the preprocessing saved next to the
+    partitions (e.g. the flow matrix), or None when it is missing or older
+    than any partition.
+    """
+    parts, path = partition_files(), os.path.join(DATASET_DIR, name)
+    if not parts or not os.path.exists(path):
+        return None
+    if os.path.getmtime(path) < max(os.path.getmtime(p) for p in parts):
+        return None
+    return path
+
+
+def keep_aggregate(name, view):
+    """
+    Save `view` (anything with `save(path)`) next to the partitions as
+    aggregate file `name`, so the next start loads it instead of building
+    it again; a read-only dataset just keeps building it.
+    """
+    if not partition_files():
+        return view
+    try:
+        view.save(os.path.join(DATASET_DIR, name))
+    except OSError:
+        pass
+    return view
+
+
+def source_files():
+    """The processed files `load_trips` reads from, most preferred first."""
+    parts = partition_files()
+    if parts:
+        return parts
+    if os.path.exists(PARQUET_PATH) and not (_outdated(PARQUET_PATH) and os.path.exists(CSV_PATH)):
+        return [PARQUET_PATH]
+    return [CSV_PATH]
+
+
+def _outdated(path):
+    """Whether a Parquet file has another schema version (False when it can't be read)."""
+    try:
+        return file_version(path) != SCHEMA_VERSION
+    except ImportError:
+        return False
+
+
+def _read_table(columns=None, prefer_parquet=True):
+    """
+    Read the processed data, preferring Parquet over the CSV export.
+    `columns=None` reads every column.
+    """
+    paths = source_files()
+    if prefer_parquet and paths[0].endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq  # type: ignore
+            check_schema(paths)
+            available = pq.read_schema(paths[0]).names
+            if columns is not None:
+                columns = [c for c in columns if c in available]
+            # Arrow unifies the category dictionaries of the partitions
+            return pq.ParquetDataset(paths).read(columns=columns).to_pandas()
+        except ImportError:
+            pass
+
+    df = pd.read_csv(CSV_PATH, usecols=(lambda c: c in columns) if columns is not None else None)
+    # pandas writes ISO timestamps, so an explicit format skips per-row inference
+    for col in ('start_time', 'end_time'):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce')
+    return df
+
+
+# ── Memory-mapped column store ───────────────────────────────────────────────
+def source_fingerprint():
+    """Identity (names, sizes, mtimes) of the processed files currently on disk."""
+    parts = []
+    for path in source_files():
+        st = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}")
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:16]
+
+
+def write_column_store(df, path):
+    """
+    Write `df` as one `.npy` file per column plus a `meta.json` describing
+    dtypes and category labels. Strings are stored as category codes.
+    """
+    os.makedirs(path, exist_ok=True)
+    meta = {'rows': len(df), 'columns': {}}
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object or isinstance(series.dtype, pd.StringDtype):
+            series = series.astype('category')
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(path, f"{col}.npy"), series.cat.codes.to_numpy())
+            meta['columns'][col] = {
+                'kind': 'category',
+                'categories': [str(c) for c in series.cat.categories],
+                'ordered': bool(series.cat.ordered),
+            }
+        else:
+            np.save(os.path.join(path, f"{col}.npy"), series.to_numpy())
+            meta['columns'][col] = {'kind': 'array'}
+    return meta
+
+
+def _build_column_store(fingerprint):
+    """
+    Convert the whole processed file into a store in a private directory,
+    then publish it with an atomic rename and drop stores of older files.
+    """
+    target = os.path.join(COLUMNS_DIR, fingerprint)
+    tmp    = f"{target}.tmp-{os.getpid()}"
+    meta   = write_column_store(_read_table(), tmp)
+    meta['source'] = fingerprint
+    with open(os.path.join(tmp, 'meta.json'), 'w') as fh:
+        json.dump(meta, fh)
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # Another worker published the same store first; use theirs
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Workers still mapping an old store keep their pages until they exit
+    for name in os.listdir(COLUMNS_DIR):
+        if name != os.path.basename(target) and '.tmp-' not in name:
+            shutil.rmtree(os.path.join(COLUMNS_DIR, name), ignore_errors=True)
+    return target
+
+
+def load_column_store(columns=COLUMNS):
+    """
+    Open the column store with `np.load(mmap_mode='r')` and wrap the arrays
+    in a DataFrame without copying them. The store is (re)built from the
+    processed file when it is missing or stale.
+    """
+    fingerprint = source_fingerprint()
+    path = os.path.join(COLUMNS_DIR, fingerprint)
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        path = _build_column_store(fingerprint)
+    with open(os.path.join(path, 'meta.json')) as fh:
+        meta = json.load(fh)
+
+    data = {}
+    for col in columns:
+        info = meta['columns'].get(col)
+        if info is None:
+            continue
+        arr = np.load(os.path.join(path, f"{col}.npy"), mmap_mode='r')
+        if info['kind'] == 'category':
+            dtype = pd.CategoricalDtype(info['categories'], ordered=info['ordered'])
+            arr = pd.Categorical.from_codes(arr, dtype=dtype, validate=False)
+        data[col] = pd.Series(arr, name=col, copy=False)
+    return pd.DataFrame(data, copy=False)
+
+
+# ── Lazy, shared trip table ──────────────────────────────────────────────────
+class TripStore:
+    """
+    The processed trips, loaded on first use. Threads asking at the same
+    time wait for one load; afterwards `get` only re-checks the files'
+    fingerprint every `check_interval` seconds and reloads when it changed.
+    """
+
+    def __init__(self, columns=COLUMNS, check_interval=CHECK_INTERVAL):
+        self.columns = columns
+        self.check_interval = check_interval
+        self._current = None   # (fingerprint, DataFrame)
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """`(fingerprint, DataFrame)` of the current processed files."""
+        current = self._current
+        if current is not None and time.monotonic() - self._checked < self.check_interval:
+            return current
+        with self._lock:
+            if self._current is not None and time.monotonic() - self._checked < self.check_interval:
+                return self._current
+            version = source_fingerprint()
+            if self._current is None or self._current[0] != version:
+                self._current = (version, load_trips(self.columns))
+            self._checked = time.monotonic()
+            return self._current
+
+    def version(self):
+        """
+        Fingerprint of the current processed files, checked as often as
+        `get` checks it, without loading them (for the out-of-core engine).
+        """
+        with self._lock:
+            if self._version is None or time.monotonic() - self._checked >= self.check_interval:
+                self._version = source_fingerprint()
+                self._checked = time.monotonic()
+            return self._version
+
+    def load(self):
+        """Load now (e.g. in a server's preload hook) instead of on first use."""
+        with self._lock:
+            self._current = (source_fingerprint(), load_trips(self.columns))
+            self._checked = time.monotonic()
+            return self._current
+
+
+trips = TripStore()
+
+
+def _after_fork():
+    # The thread loading the trips when a job was forked does not exist in the job
+    trips._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,292 @@
+"""
+Out-of-Core Query Engine
+Ford GoBike Interactive Dashboard
+
+Answers the dashboard's queries with DuckDB straight from the processed
+Parquet files, so the trip table never has to fit in memory: the sidebar
+filters become a WHERE clause and the KPIs and chart breakdowns one
+GROUPING SETS query, so only aggregated rows reach Python. Parquet
+row-group statistics and column projection keep each scan to the columns
+and row groups a query needs.
+
+Results match the in-memory engines (cube.py, filter_index.py) exactly,
+ties included: every trip carries its position in the loaded table
+(partition, then row), and orderings that pandas takes from first
+appearance use the smallest position instead.
+
+The station, flow and timeline views and the samples of the approximate
+mode are built from aggregates this engine computes (`station_aggregates`,
+`flow_aggregates`, `rollup_aggregates`, `sample_aggregates`) when their
+saved files are missing, again without loading the trips, and saved in
+their place for the next start.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from cube import HOURS, TOP_STATIONS, WEEKDAYS, Summary, _ranked, short_label
+from data import source_files
+from instrumentation import stage
+from schema import check_schema
+
+# DuckDB worker threads and memory limit per process (defaults: DuckDB's own);
+# past the limit, large aggregations spill to a temporary directory
+THREADS      = int(os.environ.get('GOBIKE_DUCKDB_THREADS') or 0)
+MEMORY_LIMIT = os.environ.get('GOBIKE_DUCKDB_MEMORY', '')
+
+# Row positions: partition number in the high bits, row within it below
+_ROW_BITS = 40
+
+# Sidebar filter → column, in callback argument order
+FILTER_COLUMNS = ['user_type', 'member_gender', 'age_group']
+
+
+def _literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+class DuckDBEngine:
+    """SQL over the processed Parquet files; the same interface as :class:`cube.TripCube`."""
+
+    def __init__(self, paths=None, threads=THREADS, memory_limit=MEMORY_LIMIT):
+        import duckdb  # type: ignore
+
+        paths = paths or source_files()
+        if not all(p.endswith('.parquet') for p in paths):
+            raise FileNotFoundError(
+                "the duckdb engine reads the Parquet output of scripts/preprocessing.py; "
+                f"found only {paths}")
+        check_schema(paths)
+        self._con = duckdb.connect()
+        if threads:
+            self._con.execute(f"SET threads = {int(threads)}")
+        if memory_limit:
+            self._con.execute(f"SET memory_limit = {_literal(memory_limit)}")
+        self._local = threading.local()
+
+        files = '[' + ', '.join(_literal(p) for p in paths) + ']'
+        scan = f"read_parquet({files}, filename = true, file_row_number = true)"
+        names = [row[0] for row in self._con.execute(f"DESCRIBE SELECT * FROM {scan}").fetchall()]
+        hour = 'start_hour' if 'start_hour' in names else 'hour(start_time)'
+        weekday = 'day_of_week' if 'day_of_week' in names else 'isodow(start_time) - 1'
+        self._con.execute(f"""
+            CREATE VIEW trips AS
+            SELECT * EXCLUDE (filename, file_row_number),
+                   {hour} AS trip_hour,
+                   {weekday} AS trip_weekday,
+                   CASE WHEN isnan(duration_mins::DOUBLE) THEN NULL ELSE duration_mins::DOUBLE END AS trip_duration,
+                   (list_position({files}, filename)::BIGINT - 1) << {_ROW_BITS} | file_row_number AS trip_row
+            FROM {scan}
+        """)
+
+        # Label order of the in-memory engines: first appearance in the table
+        self.rows = self._scalar("SELECT count(*) FROM trips")
+        self.labels = {col: self._first_seen(col) for col in FILTER_COLUMNS}
+        self.user_types = self.labels['user_type']
+        self.genders = self.labels['member_gender']
+        self.age_groups = self.labels['age_group']
+
+        self.everything = self._summarize('', [])
+
+    # ── SQL helpers ───────────────────────────────────────────────────────────
+    def _cursor(self):
+        """One cursor per thread: a DuckDB connection must not be shared between threads."""
+        cur = getattr(self._local, 'cursor', None)
+        if cur is None:
+            cur = self._local.cursor = self._con.cursor()
+        return cur
+
+    def _scalar(self, sql, params=()):
+        return self._cursor().execute(sql, params).fetchone()[0]
+
+    def _frame(self, sql, params=()):
+        return self._cursor().execute(sql, params).df()
+
+    def _first_seen(self, col):
+        rows = self._cursor().execute(
+            f"SELECT {col}::VARCHAR FROM trips WHERE {col} IS NOT NULL "
+            f"GROUP BY ALL ORDER BY min(trip_row)").fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _where(sel_user, sel_gender, sel_age, sel_hour):
+        """WHERE clause and parameters for the four sidebar filters."""
+        terms, params = [], []
+        for col, value in zip(FILTER_COLUMNS, (sel_user, sel_gender, sel_age)):
+            if value != 'All':
+                terms.append(f"{col}::VARCHAR = ?")
+                params.append(value)
+        if sel_hour:
+            terms.append("trip_hour BETWEEN ? AND ?")
+            params += [max(sel_hour[0], 0), min(sel_hour[1], HOURS - 1)]
+        return ('WHERE ' + ' AND '.join(terms)) if terms else '', params
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+    def summarize(self, sel_user, sel_gender, sel_age, sel_hour):
+        """Aggregate the matching trips into a :class:`Summary`."""
+        with stage('filter'):
+            where, params = self._where(sel_user, sel_gender, sel_age, sel_hour)
+        if not where:
+            return self.everything
+        with stage('aggregate'):
+            return self._summarize(where, params)
+
+    def _summarize(self, where, params):
+        rows = self._frame(f"""
+            SELECT GROUPING(user_type, member_gender, trip_hour, trip_weekday, start_station_name) AS grp,
+                   user_type::VARCHAR AS user_type, member_gender::VARCHAR AS member_gender,
+                   trip_hour, trip_weekday, start_station_name,
+                   count(*) AS trips, sum(trip_duration) AS dur_sum, count(trip_duration) AS dur_n,
+                   count(DISTINCT start_station_name) AS stations, min(trip_row) AS first
+            FROM trips {where}
+            GROUP BY GROUPING SETS ((), (user_type), (member_gender), (trip_hour), (trip_weekday),
+                                    (start_station_name))
+        """, params)
+        # GROUPING() sets a bit per column left out, first column highest
+        sets = {name: rows[rows['grp'] == 31 - (1 << bit)]
+                for bit, name in enumerate(['station', 'weekday', 'hour', 'gender', 'user'])}
+        overall = rows[rows['grp'] == 31]
+        total = int(overall['trips'].sum())
+        dur_n = int(overall['dur_n'].sum())
+
+        def counts(part, col, labels):
+            found = dict(zip(part[col], part['trips']))
+            return np.array([found.get(label, 0) for label in labels], dtype=np.int64)
+
+        users = counts(sets['user'], 'user_type', self.user_types)
+        genders = counts(sets['gender'], 'member_gender', self.genders)
+        sub = users[self.user_types.index('Subscriber')] if 'Subscriber' in self.user_types else 0
+
+        by_hour = sets['hour'].dropna(subset=['trip_hour'])
+        by_hour = by_hour[by_hour['trip_hour'].between(0, HOURS - 1)].sort_values('trip_hour')
+        weekday = np.zeros(WEEKDAYS, dtype=np.int64)
+        by_day = sets['weekday'].dropna(subset=['trip_weekday'])
+        weekday[by_day['trip_weekday'].to_numpy(np.int64)] = by_day['trips'].to_numpy(np.int64)
+
+        by_station = sets['station'].dropna(subset=['start_station_name'])
+        stations, station_trips = _ranked(
+            [short_label(name) for name in by_station['start_station_name']],
+            by_station['trips'].to_numpy(np.int64), by_station['first'].to_numpy(np.int64))
+        user_types, user_trips = _ranked(self.user_types, users)
+        gender_labels, gender_trips = _ranked(self.genders, genders)
+
+        return Summary(
+            total=total,
+            duration_mean=float(overall['dur_sum'].sum() / dur_n) if dur_n else None,
+            subscriber_share=sub / total if total else 0.0,
+            distinct_stations=int(overall['stations'].sum()),
+            weekday=weekday,
+            hours=by_hour['trip_hour'].to_numpy(np.int32),
+            hour_trips=by_hour['trips'].to_numpy(np.int64),
+            user_types=user_types, user_trips=user_trips,
+            genders=gender_labels, gender_trips=gender_trips,
+            stations=stations[:TOP_STATIONS], station_trips=station_trips[:TOP_STATIONS],
+        )
+
+    # ── Aggregates for the other views ────────────────────────────────────────
+    def station_aggregates(self):
+        """
+        The result of `stations.aggregate_trips` over every trip; stations
+        on each side are ordered by their first trip.
+        """
+        cell = """user_type::VARCHAR AS user_type, member_gender::VARCHAR AS member_gender,
+                  age_group::VARCHAR AS age_group, trip_hour AS start_hour"""
+        departures = self._frame(f"""
+            SELECT {cell}, start_station_name::VARCHAR AS start_station_name,
+                   count(*)::DOUBLE AS trips, coalesce(sum(trip_duration), 0) AS dur_sum,
+                   count(trip_duration)::DOUBLE AS dur_n
+            FROM trips
+            GROUP BY ALL
+        """)
+        arrivals = self._frame(f"""
+            SELECT {cell}, end_station_name::VARCHAR AS end_station_name, count(*)::DOUBLE AS trips
+            FROM trips
+            GROUP BY ALL
+        """)
+        places = self._frame("""
+            SELECT side, station, sum(lat) FILTER (WHERE valid) AS lat_sum,
+                   sum(lon) FILTER (WHERE valid) AS lon_sum, count(*) FILTER (WHERE valid)::DOUBLE AS n
+            FROM (SELECT *, isfinite(lat) AND isfinite(lon) AND lat <> 0 AND lon <> 0 AS valid
+                  FROM (SELECT 0 AS side, start_station_name::VARCHAR AS station, trip_row,
+                               start_station_latitude::DOUBLE AS lat, start_station_longitude::DOUBLE AS lon
+                        FROM trips
+                        UNION ALL
+                        SELECT 1, end_station_name::VARCHAR, trip_row,
+                               end_station_latitude::DOUBLE, end_station_longitude::DOUBLE
+                        FROM trips))
+            WHERE station IS NOT NULL
+            GROUP BY side, station
+            ORDER BY side, min(trip_row)
+        """)
+        places[['lat_sum', 'lon_sum']] = places[['lat_sum', 'lon_sum']].fillna(0.0)
+        return departures, arrivals, places
+
+    def flow_aggregates(self):
+        """The result of `flows.aggregate_trips` over every trip."""
+        grouped = self._frame("""
+            SELECT user_type::VARCHAR AS user_type, member_gender::VARCHAR AS member_gender,
+                   age_group::VARCHAR AS age_group, trip_hour AS start_hour,
+                   start_station_id, end_station_id,
+                   count(*)::DOUBLE AS trips, coalesce(sum(trip_duration), 0) AS dur_sum,
+                   count(trip_duration)::DOUBLE AS dur_n
+            FROM trips
+            WHERE start_station_id IS NOT NULL AND end_station_id IS NOT NULL
+            GROUP BY ALL
+        """)
+        names = self._frame("""
+            SELECT id, arg_min(name, side << 62 | trip_row) AS name
+            FROM (SELECT start_station_id AS id, start_station_name AS name, 0::BIGINT AS side, trip_row
+                  FROM trips WHERE start_station_id IS NOT NULL AND end_station_id IS NOT NULL
+                  UNION ALL
+                  SELECT end_station_id, end_station_name, 1::BIGINT, trip_row
+                  FROM trips WHERE start_station_id IS NOT NULL AND end_station_id IS NOT NULL)
+            GROUP BY id
+        """)
+        return grouped, names
+
+    def rollup_aggregates(self):
+        """The result of `timeseries.aggregate_trips` over every trip."""
+        return self._frame("""
+            SELECT user_type::VARCHAR AS user_type, member_gender::VARCHAR AS member_gender,
+                   age_group::VARCHAR AS age_group, trip_hour AS start_hour,
+                   epoch_ms(start_time) // 300000 * 300 AS bucket,
+                   count(*)::DOUBLE AS trips
+            FROM trips
+            WHERE start_time IS NOT NULL
+            GROUP BY ALL
+        """)
+
+    def sample_aggregates(self):
+        """
+        The result of `approx.aggregate_trips` over every trip; priorities
+        are a hash of each trip's position instead of random draws.
+        """
+        from approx import MIN_STRATUM_ROWS, SAMPLE_RATES
+
+        cell = """user_type::VARCHAR AS user_type, member_gender::VARCHAR AS member_gender,
+                  age_group::VARCHAR AS age_group, trip_hour AS start_hour"""
+        strata = self._frame(f"SELECT {cell}, count(*)::DOUBLE AS trips FROM trips GROUP BY ALL")
+        pairs = self._frame(f"""
+            SELECT {cell}, start_station_name::VARCHAR AS start_station_name, count(*)::DOUBLE AS trips
+            FROM trips
+            GROUP BY ALL
+        """)
+        candidates = self._frame(f"""
+            SELECT user_type, member_gender, age_group, start_hour, start_station_name,
+                   day_of_week, duration_mins, priority
+            FROM (SELECT {cell}, start_station_name::VARCHAR AS start_station_name,
+                         trip_weekday AS day_of_week, trip_duration AS duration_mins,
+                         hash(trip_row) / 18446744073709551616.0 AS priority, trip_row
+                  FROM trips)
+            QUALIFY priority < {max(SAMPLE_RATES)}
+                 OR row_number() OVER (PARTITION BY user_type, member_gender, age_group, start_hour
+                                       ORDER BY priority) <= {MIN_STRATUM_ROWS}
+            ORDER BY trip_row
+        """)
+        return strata, candidates, pairs
+
+    def close(self):
+        self._con.close()
+
@@ -0,0 +1,495 @@
+"""
+Figure Builders
+Ford GoBike Interactive Dashboard
+
+Everything static about the charts (subplot grid, axes, titles,
+colors, hover templates) is laid out once with graph_objects, the first
+time it is needed, and kept as a plain dict. Per request the builders
+only swap the data arrays into those templates, so the hot path never
+touches plotly's validators. The dicts serialize to the same JSON the
+graph_objects figures produced.
+
+graph_objects is only imported to lay out the templates, which keeps it
+out of the app's import time.
+"""
+
+import base64
+from functools import lru_cache
+
+import numpy as np
+
+from cube import short_label
+from stations import METRICS
+from timeseries import RESOLUTION_LABELS
+
+# ── Elegant Palette ───────────────────────────────────────────────────────────
+P = {
+    'indigo':   '#6366f1',
+    'cyan':     '#06b6d4',
+    'pink':     '#ec4899',
+    'amber':    '#f59e0b',
+    'emerald':  '#10b981',
+    'slate':    '#475569',
+    'light':    '#f8fafc',
+    'grid':     '#f1f5f9',
+    'text':     '#1e293b',
+}
+
+WDAY = ['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday']
+WDAY_SHORT = ['Mon','Tue','Wed','Thu','Fri','Sat','Sun']
+
+# ── Shared layout: clean, minimal, no clutter ─────────────────────────────────
+LY = {
+    'paper_bgcolor': 'rgba(0,0,0,0)',
+    'plot_bgcolor': 'rgba(0,0,0,0)',
+    'font': {'family': 'Inter, sans-serif', 'color': P['slate'], 'size': 14},
+    'margin': {'l': 35, 'r': 15, 't': 30, 'b': 50}, # increased bottom margin for dots
+}
+AXIS = {
+    'showgrid': True,
+    'gridcolor': P['grid'],
+    'gridwidth': 1,
+    'zeroline': False,
+    'showline': False,
+}
+
+DONUT_COLORS  = [P['indigo'], P['cyan']]
+GENDER_COLORS = {'Male': P['indigo'], 'Female': P['pink'], 'Other': P['amber']}
+
+# Station map center when no station has coordinates (downtown San Francisco)
+MAP_CENTER = {'lat': 37.7749, 'lon': -122.4194}
+
+
+# Numeric dtypes plotly.js decodes from typed arrays, with their codes
+TYPED_ARRAYS = {'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+                'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8'}
+
+
+def _array(values):
+    """
+    Data array in the form graph_objects emits it: numbers as a typed
+    base64 array, 64-bit integers narrowed to the smallest type that holds
+    them (kept as a list when none does), anything else as a list.
+    """
+    values = np.asarray(values)
+    if values.size and values.dtype.kind in 'iu' and values.dtype.itemsize == 8:
+        lo, hi = values.min(), values.max()
+        types = (np.int8, np.int16, np.int32) if values.dtype.kind == 'i' else (np.uint8, np.uint16, np.uint32)
+        fits = [t for t in types if np.iinfo(t).min <= lo and hi <= np.iinfo(t).max]
+        values = values.astype(fits[0]) if fits else values
+    if not values.size or values.dtype.name not in TYPED_ARRAYS:
+        return values.tolist()
+    data = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+    return {'dtype': TYPED_ARRAYS[values.dtype.name], 'bdata': base64.b64encode(data).decode('ascii')}
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# Static templates (built once, on first use)
+# ══════════════════════════════════════════════════════════════════════════════
+def _empty_template():
+    import plotly.graph_objects as go  # type: ignore
+
+    empty = go.Figure()
+    empty.update_layout(
+        title={'text': "No data matches filters", 'font': {'size': 16, 'color': P['slate']}},
+        **LY
+    )
+    return empty.to_plotly_json()
+
+
+def _time_template():
+    import plotly.graph_objects as go  # type: ignore
+    from plotly.subplots import make_subplots  # type: ignore
+
+    fig_time = make_subplots(
+        rows=1, cols=2,
+        column_widths=[0.48, 0.52],
+        horizontal_spacing=0.1,
+        subplot_titles=("By Weekday", "By Hour")
+    )
+
+    bar_colors = [P['pink'] if d in ['Saturday','Sunday'] else P['indigo'] for d in WDAY]
+
+    fig_time.add_trace(go.Bar(
+        x=WDAY_SHORT,
+        marker={'color': bar_colors, 'cornerradius': 4},
+        hovertemplate='%{x}: <b>%{y:,}</b><extra></extra>',
+        showlegend=False,
+    ), row=1, col=1)
+
+    fig_time.add_trace(go.Scatter(
+        mode='lines',
+        line={'color': P['cyan'], 'width': 2.5, 'shape': 'spline'},
+        fill='tozeroy',
+        fillcolor='rgba(6,182,212,0.08)',
+        hovertemplate='%{x}:00 → <b>%{y:,}</b><extra></extra>',
+        showlegend=False,
+    ), row=1, col=2)
+
+    fig_time.update_layout(**LY, showlegend=False)
+    fig_time.update_xaxes(**AXIS)
+    fig_time.update_yaxes(**AXIS)
+    fig_time.update_annotations(font={'size': 14, 'color': P['slate'], 'family': 'Inter'})
+    return fig_time.to_plotly_json()
+
+
+def _user_template():
+    import plotly.graph_objects as go  # type: ignore
+    from plotly.subplots import make_subplots  # type: ignore
+
+    fig_user = make_subplots(
+        rows=1, cols=2,
+        column_widths=[0.45, 0.55],
+        horizontal_spacing=0.08,
+        subplot_titles=("User Type", "Gender"),
+        specs=[[{"type": "pie"}, {"type": "bar"}]]
+    )
+
+    fig_user.add_trace(go.Pie(
+        hole=0.62,
+        marker={'colors': DONUT_COLORS, 'line': {'width': 0}},
+        textinfo='percent',
+        textfont={'size': 14, 'color': '#ffffff'},
+        insidetextorientation='horizontal',
+        hovertemplate='<b>%{label}</b><br>%{value:,} (%{percent})<extra></extra>',
+        showlegend=False,
+    ), row=1, col=1)
+
+    fig_user.add_trace(go.Bar(
+        marker={'cornerradius': 4},
+        width=0.35,
+        hovertemplate='<b>%{x}</b>: %{y:,}<extra></extra>',
+        showlegend=False,
+    ), row=1, col=2)
+
+    fig_user.update_layout(**LY, showlegend=False)
+    fig_user.update_xaxes(**AXIS)
+    fig_user.update_yaxes(**AXIS)
+    # Style only the subplot title annotations; legend dots are added per request
+    for ann in fig_user.layout.annotations:
+        ann.font = {'size': 14, 'color': P['slate'], 'family': 'Inter'}
+    return fig_user.to_plotly_json()
+
+
+def _station_template():
+    import plotly.graph_objects as go  # type: ignore
+
+    fig_station = go.Figure(go.Bar(
+        orientation='h',
+        marker={
+            'colorscale': [[0, '#e0e7ff'], [1, P['indigo']]],
+            'cornerradius': 4,
+            'line': {'width': 0},
+        },
+        hovertemplate='<b>%{y}</b><br>Trips: %{x:,}<extra></extra>',
+    ))
+    fig_station.update_layout(
+        yaxis={'categoryorder': 'total ascending', 'tickfont': {'size': 13}},
+        **LY
+    )
+    fig_station.update_xaxes(**AXIS)
+    fig_station.update_yaxes(showgrid=False, zeroline=False, showline=False)
+    return fig_station.to_plotly_json()
+
+
+def _station_map_template():
+    import plotly.graph_objects as go  # type: ignore
+
+    fig_map = go.Figure(go.Scattermap(
+        mode='markers',
+        marker={
+            'colorscale': [[0, '#c7d2fe'], [1, P['indigo']]],
+            'opacity': 0.75,
+            'sizemode': 'diameter',
+        },
+        hovertemplate='<b>%{text}</b><br>Trips: %{marker.color:,}<extra></extra>',
+    ))
+    fig_map.update_layout(
+        map={'style': 'carto-positron', 'zoom': 11},
+        # Keep the user's pan and zoom when the filters change
+        uirevision='stations',
+        **{**LY, 'margin': {'l': 0, 'r': 0, 't': 0, 'b': 0}}
+    )
+    return fig_map.to_plotly_json()
+
+
+def _ranking_template():
+    import plotly.graph_objects as go  # type: ignore
+
+    fig_rank = go.Figure(go.Bar(
+        orientation='h',
+        marker={
+            'colorscale': [[0, '#cffafe'], [1, P['cyan']]],
+            'cornerradius': 4,
+            'line': {'width': 0},
+        },
+    ))
+    fig_rank.update_layout(
+        yaxis={'autorange': 'reversed', 'tickfont': {'size': 13}},
+        **{**LY, 'margin': {'l': 35, 'r': 15, 't': 10, 'b': 40}}
+    )
+    fig_rank.update_xaxes(**AXIS)
+    fig_rank.update_yaxes(showgrid=False, zeroline=False, showline=False)
+    return fig_rank.to_plotly_json()
+
+
+def _timeline_template():
+    import plotly.graph_objects as go  # type: ignore
+
+    fig_timeline = go.Figure(go.Scatter(
+        mode='lines',
+        line={'color': P['indigo'], 'width': 1.8},
+        fill='tozeroy',
+        fillcolor='rgba(99,102,241,0.08)',
+        hovertemplate='%{x|%a %b %d, %H:%M} → <b>%{y:,}</b><extra></extra>',
+    ))
+    fig_timeline.update_layout(
+        xaxis={'type': 'date'},
+        **{**LY, 'margin': {'l': 45, 'r': 15, 't': 24, 'b': 30}}
+    )
+    fig_timeline.update_xaxes(**AXIS)
+    fig_timeline.update_yaxes(**AXIS)
+    return fig_timeline.to_plotly_json()
+
+
+def _flows_template():
+    import plotly.graph_objects as go  # type: ignore
+
+    fig_flows = go.Figure(go.Sankey(
+        arrangement='snap',
+        node={'pad': 10, 'thickness': 12, 'line': {'width': 0},
+              'hovertemplate': '<b>%{label}</b><br>%{value:,} trips<extra></extra>'},
+        link={'color': 'rgba(99,102,241,0.22)'},
+        textfont={'family': 'Inter, sans-serif', 'size': 12, 'color': P['text']},
+    ))
+    fig_flows.update_layout(**{**LY, 'margin': {'l': 10, 'r': 10, 't': 10, 'b': 10}})
+    return fig_flows.to_plotly_json()
+
+
+def _balance_template():
+    import plotly.graph_objects as go  # type: ignore
+
+    fig_balance = go.Figure(go.Bar(
+        orientation='h',
+        marker={'cornerradius': 4, 'line': {'width': 0}},
+        hovertemplate='<b>%{y}</b><br>Net bikes: %{x:+,}<extra></extra>',
+    ))
+    fig_balance.update_layout(
+        yaxis={'autorange': 'reversed', 'tickfont': {'size': 13}},
+        xaxis={'title': {'text': 'Net bikes (arrivals − departures)'}},
+        **{**LY, 'margin': {'l': 35, 'r': 15, 't': 10, 'b': 40}}
+    )
+    fig_balance.update_xaxes(**{**AXIS, 'zeroline': True, 'zerolinecolor': P['slate']})
+    fig_balance.update_yaxes(showgrid=False, zeroline=False, showline=False)
+    return fig_balance.to_plotly_json()
+
+
+TEMPLATES = {
+    'empty':   _empty_template,
+    'time':    _time_template,
+    'user':    _user_template,
+    'station': _station_template,
+    'station_map': _station_map_template,
+    'ranking': _ranking_template,
+    'timeline': _timeline_template,
+    'flows':   _flows_template,
+    'balance': _balance_template,
+}
+
+
+@lru_cache(maxsize=None)
+def template(name):
+    """The laid-out template `name` as a plain dict (built on first call)."""
+    return TEMPLATES[name]()
+
+
+def templates():
+    """The static templates and colors, for the clientside builders in assets/."""
+    return {
+        **{name: template(name) for name in TEMPLATES},
+        'donut_colors': DONUT_COLORS,
+        'gender_colors': GENDER_COLORS,
+        'other_color': P['emerald'],
+    }
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# Per-request builders
+# ══════════════════════════════════════════════════════════════════════════════
+def empty_figure():
+    return template('empty')
+
+
+# CHART 1 – Time Analysis (Weekday bar + Hour area, side by side)
+def time_figure(s):
+    tpl = template('time')
+    weekday, hourly = tpl['data']
+    return {
+        'data': [
+            {**weekday, 'y': _array(s.weekday)},
+            {**hourly, 'x': _array(s.hours), 'y': _array(s.hour_trips)},
+        ],
+        'layout': tpl['layout'],
+    }
+
+
+# CHART 2 – User Analysis (Donut + Gender bar, side by side)
+def user_figure(s):
+    tpl = template('user')
+    donut, gender = tpl['data']
+
+    # Legend dots below the donut, spread out horizontally to avoid overlap
+    legend_annotations = [
+        {
+            'font': {'color': clr, 'family': 'Inter', 'size': 16},
+            'showarrow': False,
+            'text': f'<span style="font-size: 16px;">●</span> {lbl}',
+            'x': 0.03 + i * 0.22, 'xref': 'paper',
+            'y': -0.16, 'yref': 'paper',
+        }
+        for i, (lbl, clr) in enumerate(zip(s.user_types, DONUT_COLORS))
+    ]
+
+    return {
+        'data': [
+            {**donut, 'labels': list(s.user_types), 'values': _array(s.user_trips)},
+            {
+                **gender,
+                'marker': {
+                    'color': [GENDER_COLORS.get(g, P['emerald']) for g in s.genders],
+                    **gender['marker'],
+                },
+                'x': list(s.genders),
+                'y': _array(s.gender_trips),
+            },
+        ],
+        'layout': {
+            **tpl['layout'],
+            'annotations': [*tpl['layout']['annotations'], *legend_annotations],
+        },
+    }
+
+
+# CHART 3 – Station Analysis (Top 8 horizontal bar)
+def station_figure(s):
+    tpl = template('station')
+    (bars,) = tpl['data']
+    return {
+        'data': [{
+            **bars,
+            'marker': {**bars['marker'], 'color': _array(s.station_trips)},
+            'x': _array(s.station_trips),
+            'y': list(s.stations),
+        }],
+        'layout': tpl['layout'],
+    }
+
+
+# CHART 4 – Station Map (one marker per station, sized and colored by trips)
+def station_map_figure(st):
+    tpl = template('station_map')
+    (points,) = tpl['data']
+    table = st.table
+    keep = np.flatnonzero((st.departures > 0) & table['lat'].notna().to_numpy())
+    trips = st.departures[keep]
+    size = 6 + 22 * np.sqrt(trips / trips.max()) if len(keep) else trips
+    # The center of every located station, so it stays put as the filters change
+    lat, lon = table['lat'].mean(), table['lon'].mean()
+    center = ({'lat': round(float(lat), 4), 'lon': round(float(lon), 4)}
+              if np.isfinite(lat) and np.isfinite(lon) else MAP_CENTER)
+    return {
+        'data': [{
+            **points,
+            'lat': _array(table['lat'].to_numpy()[keep]),
+            'lon': _array(table['lon'].to_numpy()[keep]),
+            'text': table['station'].to_numpy()[keep].tolist(),
+            'marker': {**points['marker'], 'color': _array(trips), 'size': _array(size.round(1))},
+        }],
+        'layout': {
+            **tpl['layout'],
+            'map': {**tpl['layout']['map'], 'center': center},
+        },
+    }
+
+
+# CHART 5 – Station Ranking (top stations by the chosen metric)
+def ranking_figure(r):
+    tpl = template('ranking')
+    (bars,) = tpl['data']
+    label = METRICS[r.metric]
+    return {
+        'data': [{
+            **bars,
+            'marker': {**bars['marker'], 'color': _array(r.values)},
+            'x': _array(r.values),
+            'y': list(r.stations),
+            'hovertemplate': f'<b>%{{y}}</b><br>{label}: %{{x:,.1f}}<extra></extra>',
+        }],
+        'layout': {**tpl['layout'], 'xaxis': {**tpl['layout']['xaxis'], 'title': {'text': label}}},
+    }
+
+
+# CHART 6 – Trips over Time (zoom in to drill down to finer buckets)
+def timeline_figure(t):
+    tpl = template('timeline')
+    (line,) = tpl['data']
+    note = f"{RESOLUTION_LABELS[t.resolution]} buckets"
+    if t.downsampled:
+        note += f", {len(t.trips):,} points (LTTB)"
+    return {
+        'data': [{
+            **line,
+            'x': np.datetime_as_string(t.times, unit='m').tolist(),
+            'y': _array(t.trips),
+        }],
+        'layout': {
+            **tpl['layout'],
+            'annotations': [{
+                'text': note, 'showarrow': False,
+                'x': 1, 'xref': 'paper', 'xanchor': 'right', 'y': 1.06, 'yref': 'paper',
+                'font': {'size': 12, 'color': P['slate']},
+            }],
+        },
+    }
+
+
+# CHART 7 – Top Flows (Sankey: origins on the left, destinations on the right)
+def flows_figure(f):
+    tpl = template('flows')
+    (sankey,) = tpl['data']
+    origins = list(dict.fromkeys(f.origins))
+    destinations = list(dict.fromkeys(f.destinations))
+    labels = [short_label(name) for name in origins + destinations]
+    colors = [P['indigo']] * len(origins) + [P['cyan']] * len(destinations)
+    source = [origins.index(name) for name in f.origins]
+    target = [len(origins) + destinations.index(name) for name in f.destinations]
+    return {
+        'data': [{
+            **sankey,
+            'node': {**sankey['node'], 'label': labels, 'color': colors},
+            'link': {
+                **sankey['link'],
+                'source': source, 'target': target, 'value': _array(f.trips),
+                'customdata': _array(f.duration.round(1)),
+                'hovertemplate': '%{source.label} → %{target.label}<br>'
+                                 '<b>%{value:,}</b> trips, avg %{customdata} min<extra></extra>',
+            },
+        }],
+        'layout': tpl['layout'],
+    }
+
+
+# CHART 8 – Station Balance (stations gaining and losing the most bikes)
+def balance_figure(b):
+    tpl = template('balance')
+    (bars,) = tpl['data']
+    return {
+        'data': [{
+            **bars,
+            'marker': {**bars['marker'],
+                       'color': [P['emerald'] if n > 0 else P['pink'] for n in b.net]},
+            'x': _array(b.net),
+            'y': [short_label(name) for name in b.stations],
+        }],
+        'layout': tpl['layout'],
+    }
@@ -0,0 +1,139 @@
+"""
+Bitmap Filter Index
+Ford GoBike Interactive Dashboard
+
+Row-level alternative to the cube: one packed bitmap per value of every
+filter column, built once at load time. A filter combination is answered
+by AND-ing (and, for the hour range, OR-ing) bitmaps, and the selected row
+ids feed the aggregations directly, without building a filtered frame.
+
+Unlike the cube, whose size multiplies with every dimension, each new
+filter column only adds one bitmap per distinct value.
+"""
+
+import numpy as np
+
+from cube import HOURS, TOP_STATIONS, WEEKDAYS, Summary, _factorize, _ranked, _time_codes, short_label
+from instrumentation import stage
+
+# Sidebar filter → column it selects on, in callback argument order
+FILTER_COLUMNS = ['user_type', 'member_gender', 'age_group']
+
+
+def _small(codes):
+    """Codes in the narrowest signed integer type that holds them."""
+    top = int(codes.max()) if len(codes) else 0
+    return codes.astype(np.int8 if top < 2**7 else np.int16 if top < 2**15 else np.int32)
+
+
+class FilterIndex:
+    """Packed bitmaps per filter value plus compact code columns for aggregation."""
+
+    def __init__(self, df, columns=FILTER_COLUMNS):
+        self.rows = len(df)
+        hour, wday = _time_codes(df)
+
+        # ── Code columns (missing → one trailing slot) ───────────────────────
+        self.labels = {}
+        self.codes  = {}
+        for col in columns:
+            codes, self.labels[col] = _factorize(df[col].astype(object))
+            self.codes[col] = _small(codes)
+        self.hour = _small(hour)
+        self.wday = _small(wday)
+        station, self.stations = _factorize(df['start_station_name'])
+        self.station = _small(station)
+        self.short_stations = [short_label(name) for name in self.stations]
+        self.duration = df['duration_mins'].to_numpy(np.float64)
+
+        # ── Bitmaps: one per value; 'All' needs none ──────────────────────────
+        self.bitmaps = {
+            col: [np.packbits(self.codes[col] == i) for i in range(len(self.labels[col]))]
+            for col in columns
+        }
+        self.hour_bitmaps = [np.packbits(self.hour == h) for h in range(HOURS)]
+        # Without missing hours the full 0–23 range selects every row
+        self.hours_complete = not (self.hour == HOURS).any()
+
+        # Wide-open filters are answered without touching the rows again
+        self.everything = self._aggregate(slice(None))
+
+    # ── Selection ─────────────────────────────────────────────────────────────
+    def mask(self, *values, hours=None):
+        """
+        Packed bitmap of the rows matching `values` (one per filter column,
+        'All' for no filter) and the hour range. None means every row.
+        """
+        mask = None
+        for col, value in zip(self.bitmaps, values):
+            if value == 'All':
+                continue
+            labels = self.labels[col]
+            bits = (self.bitmaps[col][labels.index(value)] if value in labels
+                    else np.zeros((self.rows + 7) // 8, dtype=np.uint8))
+            mask = bits.copy() if mask is None else np.bitwise_and(mask, bits, out=mask)
+        if hours:
+            lo, hi = max(hours[0], 0), min(hours[1], HOURS - 1)
+            if lo == 0 and hi == HOURS - 1 and self.hours_complete:
+                return mask
+            in_range = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+            for h in range(lo, hi + 1):
+                np.bitwise_or(in_range, self.hour_bitmaps[h], out=in_range)
+            mask = in_range if mask is None else np.bitwise_and(mask, in_range, out=mask)
+        return mask
+
+    def select(self, *values, hours=None):
+        """Selected row ids in table order (a slice when nothing is filtered)."""
+        mask = self.mask(*values, hours=hours)
+        if mask is None:
+            return slice(None)
+        return np.flatnonzero(np.unpackbits(mask, count=self.rows))
+
+    def summarize(self, sel_user, sel_gender, sel_age, sel_hour):
+        """Aggregate the selected rows into a :class:`cube.Summary`."""
+        with stage('filter'):
+            rows = self.select(sel_user, sel_gender, sel_age, hours=sel_hour)
+        if isinstance(rows, slice):
+            return self.everything
+        with stage('aggregate'):
+            return self._aggregate(rows)
+
+    def _aggregate(self, rows):
+        total = self.rows if isinstance(rows, slice) else len(rows)
+
+        dur = self.duration[rows]
+        has = ~np.isnan(dur)
+        dur_n = int(has.sum())
+
+        user_labels, gender_labels = self.labels['user_type'], self.labels['member_gender']
+        users   = np.bincount(self.codes['user_type'][rows], minlength=len(user_labels) + 1)
+        genders = np.bincount(self.codes['member_gender'][rows], minlength=len(gender_labels) + 1)
+        sub = users[user_labels.index('Subscriber')] if 'Subscriber' in user_labels else 0
+
+        by_hour = np.bincount(self.hour[rows], minlength=HOURS + 1)
+        hours   = np.arange(HOURS + 1)
+        present = (by_hour > 0) & (hours < HOURS)
+
+        # First selected row per station keeps value_counts' tie order
+        station = self.station[rows]
+        S = len(self.stations)
+        st_trips = np.bincount(station, minlength=S + 1)
+        st_first = np.full(S + 1, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(st_first, station, np.arange(len(station)))
+        stations, station_trips = _ranked(self.short_stations, st_trips, st_first)
+
+        user_types, user_trips = _ranked(user_labels, users)
+        gender_labels, gender_trips = _ranked(gender_labels, genders)
+
+        return Summary(
+            total=total,
+            duration_mean=float(dur[has].sum() / dur_n) if dur_n else None,
+            subscriber_share=sub / total if total else 0.0,
+            distinct_stations=int((st_trips[:S] > 0).sum()),
+            weekday=np.bincount(self.wday[rows], minlength=WEEKDAYS + 1)[:WEEKDAYS],
+            hours=hours[present].astype(np.int32),
+            hour_trips=by_hour[present],
+            user_types=user_types, user_trips=user_trips,
+            genders=gender_labels, gender_trips=gender_trips,
+            stations=stations[:TOP_STATIONS], station_trips=station_trips[:TOP_STATIONS],
+        )
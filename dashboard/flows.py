@@ -0,0 +1,267 @@
+"""
+Origin–Destination Flows
+Ford GoBike Interactive Dashboard
+
+Trips between station pairs, kept as a sparse matrix per filter cell
+(user type × gender × age group × start hour, the cube's cells): for each
+cell, the (origin, destination) pairs that have trips, with their trip
+count and duration sums, in CSR layout over the cells. A filter
+combination adds up the entries of its cells with one bincount over the
+distinct station pairs, never touching the trips.
+
+`scripts/preprocessing.py` builds the matrix from the partitions and saves
+it next to them (FLOWS_FILE); the dashboard loads that file, or builds the
+matrix from the loaded trips when the file is missing or older than the
+partitions.
+"""
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+HOURS = 24
+TOP_FLOWS = 10
+BALANCE_STATIONS = 5    # per side: most bikes gained and most bikes lost
+FLOWS_FILE = '_flows.npz'
+
+# Filter dimensions of a flow cell, then origin and destination
+CELL_COLUMNS = ['user_type', 'member_gender', 'age_group', 'start_hour']
+FLOW_COLUMNS = CELL_COLUMNS + [
+    'start_station_id', 'end_station_id', 'start_station_name', 'end_station_name', 'duration_mins',
+]
+_KEYS = CELL_COLUMNS + ['start_station_id', 'end_station_id']
+
+
+# ── Aggregation ───────────────────────────────────────────────────────────────
+def group_sum(frame, keys, values):
+    """
+    Sum `values` (name → array) over the distinct rows of `frame[keys]`.
+    Missing keys form a group of their own.
+    """
+    key = np.zeros(len(frame), dtype=np.int64)
+    uniques = []
+    for col in keys:
+        codes, labels = pd.factorize(frame[col])
+        key = key * (len(labels) + 1) + codes + 1
+        uniques.append(labels)
+    combined, inverse = np.unique(key, return_inverse=True)
+
+    out = {}
+    for col, labels in zip(reversed(keys), reversed(uniques)):
+        combined, codes = np.divmod(combined, len(labels) + 1)
+        out[col] = pd.Series(np.asarray(labels, dtype=object)).reindex(codes - 1).to_numpy()
+    grouped = pd.DataFrame({col: out[col] for col in keys})
+    for name, array in values.items():
+        grouped[name] = np.bincount(inverse, weights=array, minlength=len(grouped))
+    return grouped
+
+
+def encode_cells(grouped):
+    """
+    Flat filter-cell index of every row of `grouped` (by CELL_COLUMNS),
+    with the labels of each dimension; missing values take a trailing slot.
+    """
+    labels = []
+    cell = np.zeros(len(grouped), dtype=np.int64)
+    for col in CELL_COLUMNS[:-1]:
+        codes, uniques = pd.factorize(grouped[col])
+        codes = codes.astype(np.int64)
+        codes[codes < 0] = len(uniques)
+        cell = cell * (len(uniques) + 1) + codes
+        labels.append([str(v) for v in uniques])
+    hour = pd.to_numeric(grouped['start_hour']).fillna(HOURS).to_numpy(np.int64)
+    return cell * (HOURS + 1) + hour, labels
+
+
+def _pick(labels, value):
+    if value == 'All':
+        return slice(None)
+    if value in labels:
+        i = labels.index(value)
+        return slice(i, i + 1)
+    return slice(0, 0)
+
+
+def select_cells(user_types, genders, age_groups, sel_user, sel_gender, sel_age, sel_hour):
+    """Flat boolean mask of the filter cells matching the four sidebar filters."""
+    hours = slice(None)
+    if sel_hour:
+        hours = slice(max(sel_hour[0], 0), min(sel_hour[1], HOURS - 1) + 1)
+    mask = np.zeros((len(user_types) + 1, len(genders) + 1, len(age_groups) + 1, HOURS + 1), dtype=bool)
+    mask[_pick(user_types, sel_user), _pick(genders, sel_gender), _pick(age_groups, sel_age), hours] = True
+    return mask.ravel()
+
+
+def aggregate_trips(df):
+    """
+    Trip counts and duration sums per (cell, origin id, destination id) of
+    `df`, plus the name of every station id. Trips without both station ids
+    have no flow and are left out.
+    """
+    df = df[df['start_station_id'].notna() & df['end_station_id'].notna()]
+    dur = df['duration_mins'].to_numpy(np.float64)
+    has = ~np.isnan(dur)
+    grouped = group_sum(df, _KEYS, {'trips': np.ones(len(df)), 'dur_sum': np.where(has, dur, 0.0),
+                                    'dur_n': has.astype(np.float64)})
+    names = pd.concat([
+        pd.DataFrame({'id': df['start_station_id'].to_numpy(np.float64),
+                      'name': df['start_station_name'].astype(object).to_numpy()}),
+        pd.DataFrame({'id': df['end_station_id'].to_numpy(np.float64),
+                      'name': df['end_station_name'].astype(object).to_numpy()}),
+    ]).drop_duplicates('id')
+    return grouped, names
+
+
+def merge_aggregates(parts):
+    """Combine `aggregate_trips` results of several partitions or batches."""
+    frames, names = zip(*parts)
+    frame = pd.concat(frames, ignore_index=True)
+    grouped = group_sum(frame, _KEYS, {name: frame[name].to_numpy(np.float64)
+                                       for name in ('trips', 'dur_sum', 'dur_n')})
+    return grouped, pd.concat(names).drop_duplicates('id')
+
+
+# ── Query results ─────────────────────────────────────────────────────────────
+@dataclass
+class TopFlows:
+    """The busiest origin → destination pairs, busiest first."""
+    origins: list
+    destinations: list
+    trips: np.ndarray
+    duration: np.ndarray    # average minutes per trip
+
+    @property
+    def total(self):
+        return len(self.origins)
+
+
+@dataclass
+class Balance:
+    """Net bikes (arrivals − departures) of the stations gaining and losing most."""
+    stations: list
+    net: np.ndarray
+
+    @property
+    def total(self):
+        return len(self.stations)
+
+
+class FlowMatrix:
+    """Sparse (filter cell × origin × destination) trip counts."""
+
+    ARRAYS = ('user_types', 'genders', 'age_groups', 'station_ids', 'station_names',
+              'pair_origin', 'pair_dest', 'offsets', 'pair', 'trips', 'dur_sum', 'dur_n')
+
+    def __init__(self, arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.user_types = [str(v) for v in self.user_types]
+        self.genders    = [str(v) for v in self.genders]
+        self.age_groups = [str(v) for v in self.age_groups]
+        self.station_names = [str(v) for v in self.station_names]
+        self.shape = (len(self.user_types) + 1, len(self.genders) + 1, len(self.age_groups) + 1, HOURS + 1)
+        self.S, self.P = len(self.station_ids), len(self.pair_origin)
+        self.round_trip = self.pair_origin == self.pair_dest
+        self.everything = self._views(np.ones(int(np.prod(self.shape)), dtype=bool))
+
+    @classmethod
+    def from_aggregates(cls, aggregated):
+        """Encode an `aggregate_trips` / `merge_aggregates` result."""
+        grouped, names = aggregated
+        cell, (user_types, genders, age_groups) = encode_cells(grouped)
+        ncells = (len(user_types) + 1) * (len(genders) + 1) * (len(age_groups) + 1) * (HOURS + 1)
+
+        station_ids = np.unique(np.concatenate([grouped['start_station_id'].to_numpy(np.float64),
+                                                grouped['end_station_id'].to_numpy(np.float64)]))
+        origin = np.searchsorted(station_ids, grouped['start_station_id'].to_numpy(np.float64))
+        dest   = np.searchsorted(station_ids, grouped['end_station_id'].to_numpy(np.float64))
+        S = len(station_ids)
+        pairs, pair = np.unique(origin * S + dest, return_inverse=True)
+
+        order = np.argsort(cell, kind='stable')
+        name_of = dict(zip(names['id'], names['name']))
+        return cls({
+            'user_types': user_types, 'genders': genders, 'age_groups': age_groups,
+            'station_ids': station_ids.astype(np.int64),
+            'station_names': [str(name_of.get(i, int(i))) for i in station_ids],
+            'pair_origin': (pairs // S).astype(np.int32),
+            'pair_dest': (pairs % S).astype(np.int32),
+            'offsets': np.searchsorted(cell[order], np.arange(ncells + 1)),
+            'pair': pair[order].astype(np.int32),
+            'trips': grouped['trips'].to_numpy()[order].astype(np.int32),
+            'dur_sum': grouped['dur_sum'].to_numpy()[order],
+            'dur_n': grouped['dur_n'].to_numpy()[order].astype(np.int32),
+        })
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls.from_aggregates(aggregate_trips(df))
+
+    # ── Storage ───────────────────────────────────────────────────────────────
+    def save(self, path):
+        """Write the arrays to an `.npz` file, replacing `path` atomically."""
+        tmp = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp, **{name: np.asarray(getattr(self, name)) for name in self.ARRAYS})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in cls.ARRAYS})
+
+    # ── Selection ─────────────────────────────────────────────────────────────
+    def _views(self, cells):
+        entries = np.repeat(cells, np.diff(self.offsets))
+        pair = self.pair[entries]
+        trips = np.bincount(pair, weights=self.trips[entries], minlength=self.P)
+        dur_sum = np.bincount(pair, weights=self.dur_sum[entries], minlength=self.P)
+        dur_n = np.bincount(pair, weights=self.dur_n[entries], minlength=self.P)
+        return self._top_flows(trips, dur_sum, dur_n), self._balance(trips)
+
+    def views(self, sel_user, sel_gender, sel_age, sel_hour):
+        """Top flows and station balance under the sidebar filters."""
+        cells = select_cells(self.user_types, self.genders, self.age_groups,
+                             sel_user, sel_gender, sel_age, sel_hour)
+        return self.everything if cells.all() else self._views(cells)
+
+    def _top_flows(self, trips, dur_sum, dur_n, k=TOP_FLOWS):
+        # Round trips move no bikes between stations
+        moving = np.where(self.round_trip, 0, trips)
+        ids = np.flatnonzero(moving)
+        top = ids[np.argsort(-moving[ids], kind='stable')[:k]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            duration = dur_sum[top] / dur_n[top]
+        return TopFlows(
+            origins=[self.station_names[i] for i in self.pair_origin[top]],
+            destinations=[self.station_names[i] for i in self.pair_dest[top]],
+            trips=trips[top].astype(np.int64),
+            duration=duration,
+        )
+
+    def _balance(self, trips, k=BALANCE_STATIONS):
+        net = (np.bincount(self.pair_dest, weights=trips, minlength=self.S)
+               - np.bincount(self.pair_origin, weights=trips, minlength=self.S)).astype(np.int64)
+        order = np.argsort(-net, kind='stable')
+        gain, loss = order[:k], order[::-1][:k][::-1]
+        pick = np.concatenate([gain[net[gain] > 0], loss[net[loss] < 0]])
+        pick = pick[np.argsort(-net[pick], kind='stable')]
+        return Balance(stations=[self.station_names[i] for i in pick], net=net[pick])
+
+
+def load_flows(source):
+    """
+    The flow matrix saved by the preprocessing next to the partitions, or
+    one built from `source` when that file is missing or stale: the loaded
+    trips, or a function returning their `aggregate_trips` result (as the
+    out-of-core engine computes it; that one is saved for the next start).
+    """
+    from data import keep_aggregate, saved_aggregate
+
+    path = saved_aggregate(FLOWS_FILE)
+    if path:
+        return FlowMatrix.load(path)
+    if callable(source):
+        return keep_aggregate(FLOWS_FILE, FlowMatrix.from_aggregates(source()))
+    return FlowMatrix.from_aggregates(aggregate_trips(source))
@@ -0,0 +1,35 @@
+"""
+Gunicorn Settings
+Ford GoBike Interactive Dashboard
+
+    cd dashboard && gunicorn wsgi:server
+
+Worker and thread counts come from serving.py (GOBIKE_WORKERS,
+GOBIKE_THREADS; by default one worker per core with 4 threads each).
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from serving import HOST, PORT, THREADS, WORKERS  # noqa: E402
+
+chdir        = os.path.dirname(os.path.abspath(__file__))
+bind         = f'{HOST}:{PORT}'
+workers      = WORKERS
+threads      = THREADS
+worker_class = 'gthread'
+
+# Import wsgi.py (and load the data) once in the master, then fork
+preload_app = True
+
+timeout          = 120
+graceful_timeout = 30
+keepalive        = 5
+
+
+def post_fork(server, worker):
+    """Each worker warms its own result cache; /ready reports when it is done."""
+    from warmup import start_warmup
+    start_warmup()
@@ -0,0 +1,304 @@
+"""
+Request Instrumentation
+Ford GoBike Interactive Dashboard
+
+Opt-in (GOBIKE_METRICS=1) timings of the callback path. Each callback
+request records how long it spent in its stages: the callback itself,
+`selection` (with `filter` and `aggregate` in the query engine on a cache
+miss), `render` (with `figure` when a chart is built), and `serialize`
+for what Dash does after the callback returns (response preparation and
+JSON encoding). Cache hits and misses follow from which stages ran. The
+timings are sent back as a `Server-Timing` header, so they show up in the
+browser's network panel, and summed into histograms served at `/metrics`
+in the Prometheus text format.
+
+With GOBIKE_PROFILE_SLOW_MS set as well, a sampling profiler records the
+stacks of every request thread and writes the samples of requests slower
+than the threshold to GOBIKE_PROFILE_DIR, in the collapsed-stack format
+flamegraph.pl and speedscope read.
+
+When disabled nothing is registered or wrapped: `stage()` returns a shared
+no-op context manager and `timed()` returns the callback unchanged.
+"""
+
+import bisect
+import contextlib
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# ── Settings ──────────────────────────────────────────────────────────────────
+ENABLED          = os.environ.get('GOBIKE_METRICS', '0') == '1'
+PROFILE_SLOW_MS  = float(os.environ.get('GOBIKE_PROFILE_SLOW_MS', '0'))   # 0 = no profiler
+PROFILE_DIR      = os.environ.get('GOBIKE_PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.environ.get('GOBIKE_PROFILE_INTERVAL_MS', '5')) / 1000
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Cache → (stage that looks it up, stage that only runs on a miss)
+CACHE_STAGES = {'selection': ('selection', 'filter'), 'figure': ('render', 'figure')}
+
+_NULL = contextlib.nullcontext()
+_request = threading.local()   # .timings (stage → seconds) and .callback while serving one
+
+
+# ── Metric store ──────────────────────────────────────────────────────────────
+class Histogram:
+    """Cumulative-bucket latency histogram, Prometheus style."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def samples(self, name, labels):
+        total = 0
+        for bound, count in zip((*BUCKETS, '+Inf'), self.counts):
+            total += count
+            yield f'{name}_bucket', {**labels, 'le': str(bound)}, total
+        yield f'{name}_sum', labels, round(self.sum, 6)
+        yield f'{name}_count', labels, total
+
+
+_lock = threading.Lock()
+_requests = {}              # callback → Histogram of whole requests
+_stages = {}                # (callback, stage) → Histogram
+_lookups = Counter()        # (callback, cache, hit|miss) → requests
+_slow = Counter()           # callback → slow requests profiled
+_collectors = []
+
+
+def add_collector(collect):
+    """
+    Register `collect()`, called on every scrape, yielding
+    `(name, type, help, labels, value)` samples (e.g. cache counters).
+    """
+    _collectors.append(collect)
+
+
+# ── Recording ─────────────────────────────────────────────────────────────────
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        timings = getattr(_request, 'timings', None)
+        if timings is not None:
+            timings[self.name] = timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+def stage(name):
+    """Context manager timing `name` within the current callback request."""
+    return _Stage(name) if ENABLED else _NULL
+
+
+def timed(fn):
+    """Wrap a callback so its request knows its name and its own duration."""
+    if not ENABLED:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        _request.callback = fn.__name__
+        with _Stage('callback'):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+# ── Sampling profiler ─────────────────────────────────────────────────────────
+def _collapse(frame):
+    """`module:function;…` from the outermost frame to `frame`."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Samples the stack of every thread serving a request, every `interval` seconds."""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._active = {}   # thread id → Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self, thread_id):
+        with self._lock:
+            self._active[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='gobike-sampler', daemon=True)
+                self._thread.start()
+
+    def end(self, thread_id):
+        """The stacks sampled since `begin`."""
+        with self._lock:
+            return self._active.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_collapse(frame)] += 1
+
+
+def dump_profile(stacks, callback, seconds, directory=PROFILE_DIR):
+    """Write sampled stacks in collapsed-stack format; returns the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{callback}-{seconds * 1000:.0f}ms.folded')
+    with open(path, 'w') as fh:
+        for stack, count in stacks.most_common():
+            fh.write(f'{stack} {count}\n')
+    return path
+
+
+sampler = Sampler() if ENABLED and PROFILE_SLOW_MS > 0 else None
+
+
+def _after_fork():
+    """
+    Fresh locks in a forked process: the threads that may have held them
+    at the fork, the sampling thread among them, are not copied into it.
+    """
+    global _lock
+    _lock = threading.Lock()
+    if sampler:
+        sampler._lock, sampler._active, sampler._thread = threading.Lock(), {}, None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+# ── Flask hooks ───────────────────────────────────────────────────────────────
+def server_timing(timings, total):
+    """`Server-Timing` header value for one request."""
+    parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items()]
+    if 'callback' in timings:
+        serialize = max(total - timings['callback'], 0.0)
+        parts.append(f'serialize;dur={serialize * 1000:.2f};desc="response + JSON"')
+    parts.append(f'total;dur={total * 1000:.2f}')
+    cache = [f'{name}={"miss" if miss in timings else "hit"}'
+             for name, (lookup, miss) in CACHE_STAGES.items() if lookup in timings]
+    if cache:
+        parts.append(f'cache;desc="{" ".join(cache)}"')
+    return ', '.join(parts)
+
+
+def _observe(callback, timings, total):
+    with _lock:
+        _requests.setdefault(callback, Histogram()).observe(total)
+        for name, seconds in timings.items():
+            _stages.setdefault((callback, name), Histogram()).observe(seconds)
+        if 'callback' in timings:
+            _stages.setdefault((callback, 'serialize'), Histogram()).observe(
+                max(total - timings['callback'], 0.0))
+        for name, (lookup, miss) in CACHE_STAGES.items():
+            if lookup in timings:
+                _lookups[(callback, name, 'miss' if miss in timings else 'hit')] += 1
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def metrics_text():
+    """Every metric in the Prometheus text exposition format."""
+    families = {}   # name → (type, help, [(sample name, labels, value)])
+
+    def family(name, kind, help_text):
+        return families.setdefault(name, (kind, help_text, []))[2]
+
+    with _lock:
+        out = family('gobike_request_seconds', 'histogram', 'Callback request latency.')
+        for callback, hist in _requests.items():
+            out.extend(hist.samples('gobike_request_seconds', {'callback': callback}))
+        out = family('gobike_stage_seconds', 'histogram', 'Time per stage of a callback request.')
+        for (callback, name), hist in _stages.items():
+            out.extend(hist.samples('gobike_stage_seconds', {'callback': callback, 'stage': name}))
+        out = family('gobike_cache_lookups_total', 'counter', 'Cache lookups by callback requests.')
+        out.extend(('gobike_cache_lookups_total', {'callback': callback, 'cache': name, 'result': result}, count)
+                   for (callback, name, result), count in _lookups.items())
+        out = family('gobike_slow_requests_total', 'counter',
+                     'Requests over GOBIKE_PROFILE_SLOW_MS whose profile was written.')
+        out.extend(('gobike_slow_requests_total', {'callback': callback}, count)
+                   for callback, count in _slow.items())
+    for collect in _collectors:
+        for name, kind, help_text, labels, value in collect():
+            family(name, kind, help_text).append((name, labels, value))
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        lines += [f'{sample}{_label_text(labels)} {value}' for sample, labels, value in samples]
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics(server):
+    """Time callback requests on the Flask server and serve `/metrics` (when enabled)."""
+    if not ENABLED:
+        return None
+    from flask import request  # type: ignore
+
+    def is_callback():
+        return request.path.endswith('/_dash-update-component')
+
+    @server.before_request
+    def start_timing():
+        if is_callback():
+            _request.timings, _request.callback = {}, 'unknown'
+            _request.start = time.perf_counter()
+            if sampler:
+                sampler.begin(threading.get_ident())
+
+    @server.after_request
+    def finish_timing(response):
+        timings = getattr(_request, 'timings', None)
+        if timings is None or not is_callback():
+            return response
+        total = time.perf_counter() - _request.start
+        _request.timings = None
+        response.headers['Server-Timing'] = server_timing(timings, total)
+        _observe(_request.callback, timings, total)
+        return response
+
+    @server.teardown_request
+    def finish_sampling(_error):
+        # Always runs, also when a raising callback skipped after_request
+        if not sampler or not is_callback():
+            return
+        stacks = sampler.end(threading.get_ident())
+        total = time.perf_counter() - _request.start
+        if total * 1000 >= PROFILE_SLOW_MS and stacks:
+            dump_profile(stacks, _request.callback, total)
+            with _lock:
+                _slow[_request.callback] += 1
+
+    @server.route('/metrics')
+    def metrics():
+        return metrics_text(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    return metrics
@@ -0,0 +1,50 @@
+"""
+Background Jobs
+Ford GoBike Interactive Dashboard
+
+With GOBIKE_BACKGROUND=1 the expensive views (station map and ranking,
+origin–destination flows, trips over time) run as Dash background
+callbacks instead of inside the request that asked for them, so a slow
+view no longer holds a worker thread that fast views need.
+
+The job queue is local: each job is a process forked from the worker (it
+starts with the loaded trips, engine and warmed caches), and its progress,
+partial figures and result go through a diskcache directory that every
+worker on the host shares. No broker is needed. The browser polls for the
+result every POLL_INTERVAL ms; when the filters change while a job runs,
+the new request names the old job and Dash kills it.
+
+Finished results stay in the directory for JOBS_EXPIRE seconds after their
+last use, keyed by the callback inputs and the dataset fingerprint, so a
+filter state any worker has already computed is answered on the first poll.
+"""
+
+import os
+import tempfile
+
+# ── Settings ──────────────────────────────────────────────────────────────────
+BACKGROUND    = os.environ.get('GOBIKE_BACKGROUND', '0') == '1'
+JOBS_DIR      = os.environ.get('GOBIKE_JOBS_DIR', '') or os.path.join(tempfile.gettempdir(), 'gobike-jobs')
+POLL_INTERVAL = int(os.environ.get('GOBIKE_JOBS_INTERVAL', '250'))    # ms
+JOBS_EXPIRE   = float(os.environ.get('GOBIKE_JOBS_EXPIRE', '3600'))   # seconds
+
+
+def background_manager(cache_by=None):
+    """
+    Diskcache job manager over JOBS_DIR, keying results by the callback
+    inputs and the values of the `cache_by` functions; None when background
+    mode is off or `dash[diskcache]` is not installed.
+    """
+    if not BACKGROUND:
+        return None
+    try:
+        import diskcache  # type: ignore
+        from dash import DiskcacheManager  # type: ignore
+
+        return DiskcacheManager(diskcache.Cache(JOBS_DIR), cache_by=cache_by, expire=JOBS_EXPIRE)
+    except ImportError:
+        return None
+
+
+def no_progress(*_):
+    """Stand-in for `set_progress` when a view runs inside its request."""
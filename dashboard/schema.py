@@ -0,0 +1,88 @@
+"""
+Processed Data Schema
+Ford GoBike Interactive Dashboard
+
+The columns and dtypes `scripts/preprocessing.py` writes, shared with the
+loaders so both sides agree on one schema version.
+
+The serving table (data/processed/trips) holds only what the dashboard
+reads, in compact types: hour and weekday as int8 codes, duration as
+uint16 minutes, age as uint8, labels as categories. Training-only features
+(encodings, scaled values, raw identifiers) go to a separate, row-aligned
+artifact (data/processed/features): row i of a features partition is row
+i of the serving partition with the same name.
+
+Every Parquet file carries its schema version in the file metadata;
+`check_schema` refuses files of another version instead of serving
+columns with the wrong types.
+"""
+
+SCHEMA_VERSION = 2
+SCHEMA_KEY = b'gobike_schema'
+
+# Serving table, in column order
+SERVING_DTYPES = {
+    'start_time':              'datetime64[ns]',
+    'start_hour':              'int8',
+    'day_of_week':             'int8',      # 0 = Monday
+    'user_type':               'category',
+    'member_gender':           'category',
+    'age':                     'uint8',
+    'age_group':               'category',
+    'duration_mins':           'uint16',
+    'start_station_id':        'category',
+    'start_station_name':      'category',
+    'start_station_latitude':  'float64',
+    'start_station_longitude': 'float64',
+    'end_station_id':          'category',
+    'end_station_name':        'category',
+    'end_station_latitude':    'float64',
+    'end_station_longitude':   'float64',
+}
+
+# Training-only features, row-aligned with the serving table
+FEATURE_DTYPES = {
+    'end_time':                'datetime64[ns]',
+    'bike_id':                 'category',
+    'bike_share_for_all_trip': 'category',
+    'member_birth_year':       'int16',
+    'weekend_flag':            'int8',
+    'member_gender_encoded':   'int8',
+    'user_type_encoded':       'int8',
+    'duration_mins_scaled':    'float64',
+    'age_scaled':              'float64',
+}
+
+_UINT16_MAX = 65535
+
+
+def split_serving(df):
+    """(serving table, training features) of a cleaned, feature-engineered frame."""
+    df = df.assign(duration_mins=df['duration_mins'].clip(0, _UINT16_MAX))
+    serving = df[list(SERVING_DTYPES)].astype(SERVING_DTYPES)
+    features = df[list(FEATURE_DTYPES)].astype(FEATURE_DTYPES)
+    return serving, features
+
+
+def stamp(table):
+    """Arrow `table` with the schema version added to its metadata."""
+    return table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                          SCHEMA_KEY: str(SCHEMA_VERSION).encode()})
+
+
+def file_version(path):
+    """Schema version of a Parquet file (files written before versioning are 1)."""
+    import pyarrow.parquet as pq  # type: ignore
+
+    metadata = pq.read_schema(path).metadata or {}
+    return int(metadata.get(SCHEMA_KEY, b'1'))
+
+
+def check_schema(paths):
+    """Raise if any Parquet file in `paths` was written with another schema version."""
+    for path in paths:
+        if path.endswith('.parquet') and file_version(path) != SCHEMA_VERSION:
+            raise RuntimeError(
+                f"{path} has schema version {file_version(path)}, expected {SCHEMA_VERSION}; "
+                "rebuild it by rerunning `python scripts/preprocessing.py`")
+
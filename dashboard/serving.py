@@ -0,0 +1,64 @@
+"""
+HTTP Serving Settings
+Ford GoBike Interactive Dashboard
+
+Response compression, browser caching and worker sizing for the Flask
+server behind the Dash app, shared by the development server and the
+production entry point (`wsgi.py`, `gunicorn.conf.py`).
+
+Figure JSON compresses well (brotli or gzip, whichever the browser
+accepts), so compression is on whenever Flask-Compress is installed.
+Dash appends each asset's modification time (`?m=…`) to its URL, so those
+URLs can be cached for a year: a changed file gets a new URL.
+"""
+
+import os
+
+from flask import request  # type: ignore
+
+# ── Production server sizing (gunicorn.conf.py, wsgi.py) ──────────────────────
+HOST = os.environ.get('GOBIKE_HOST', '0.0.0.0')
+PORT = int(os.environ.get('GOBIKE_PORT', '8055'))
+# Callbacks are CPU-bound numpy work under the GIL: one process per core,
+# with a few threads each to overlap request I/O and JSON encoding
+WORKERS = int(os.environ.get('GOBIKE_WORKERS', '0')) or os.cpu_count() or 1
+THREADS = int(os.environ.get('GOBIKE_THREADS', '4'))
+
+# ── Compression and caching ───────────────────────────────────────────────────
+COMPRESS          = os.environ.get('GOBIKE_COMPRESS', '1') != '0'
+COMPRESS_MIN_SIZE = int(os.environ.get('GOBIKE_COMPRESS_MIN_SIZE', '1024'))   # bytes
+ASSET_MAX_AGE     = int(os.environ.get('GOBIKE_ASSET_MAX_AGE', str(365 * 24 * 3600)))   # seconds
+
+
+def enable_compression(server):
+    """Brotli/gzip responses via Flask-Compress; False when it is not installed."""
+    if not COMPRESS:
+        return False
+    try:
+        from flask_compress import Compress  # type: ignore
+    except ImportError:
+        return False
+    server.config.update(
+        COMPRESS_ALGORITHM=['br', 'gzip'],
+        COMPRESS_BR_LEVEL=4,
+        COMPRESS_LEVEL=6,
+        COMPRESS_MIN_SIZE=COMPRESS_MIN_SIZE,
+    )
+    Compress(server)
+    return True
+
+
+def register_asset_caching(app):
+    """Long-lived Cache-Control on fingerprinted `assets/` URLs, revalidation otherwise."""
+    prefix = app.config.routes_pathname_prefix + app.config.assets_url_path.strip('/') + '/'
+
+    @app.server.after_request
+    def cache_assets(response):
+        if request.path.startswith(prefix) and response.status_code == 200:
+            if 'm' in request.args:
+                response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+            else:
+                response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return cache_assets
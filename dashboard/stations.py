@@ -0,0 +1,348 @@
+"""
+Station Analytics
+Ford GoBike Interactive Dashboard
+
+Per-station partial sums over the cube's filter cells (user type × gender
+× age group × start hour): trips started, trips ended and duration sums.
+They are stored sparsely, cell by cell, keeping only the stations that
+have trips in a cell. A filter combination adds up the entries of the
+selected cells with one bincount, so a query costs the non-zero
+(cell, station) pairs it touches, whatever the number of trips.
+
+Stations form a dimension table (name, short label, coordinates, totals)
+with a uniform lat/lon grid over it as the spatial index, used to rank
+only the stations inside the map's visible area.
+
+Like the flow matrix, the index is built from per-station aggregates:
+(cell, start station) and (cell, end station) sums and the coordinate sums
+of every station, all bounded by cells × stations, never by trips.
+`scripts/preprocessing.py` saves the index next to the partitions
+(STATIONS_FILE); the dashboard loads that file, or builds the index from
+the loaded trips or the out-of-core engine's aggregates
+(duckdb_engine.py) when the file is missing or stale.
+"""
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+from cube import short_label
+from flows import CELL_COLUMNS, HOURS, encode_cells, group_sum, select_cells
+
+# Ranking metrics: key → axis label
+METRICS = {
+    'trips':    'Trips started',
+    'duration': 'Avg duration (min)',
+    'inflow':   'Net inflow (arrivals − departures)',
+    'outflow':  'Net outflow (departures − arrivals)',
+}
+
+# Stations shown in the ranking
+TOP_K = 10
+
+# Stations with fewer departures are left out of the average-duration ranking
+MIN_DURATION_TRIPS = 5
+
+# Grid cell size in degrees (~1 km in the Bay Area)
+GRID_CELL = 0.01
+
+STATIONS_FILE = '_stations.npz'
+STATION_COLUMNS = CELL_COLUMNS + [
+    'start_station_name', 'end_station_name', 'duration_mins',
+    'start_station_latitude', 'start_station_longitude', 'end_station_latitude', 'end_station_longitude',
+]
+_DEPARTURES = CELL_COLUMNS + ['start_station_name']
+_ARRIVALS = CELL_COLUMNS + ['end_station_name']
+
+
+def map_bounds(view):
+    """
+    (south, north, west, east) of the map area in a map's `relayoutData`,
+    or None until the map has been panned or zoomed.
+    """
+    corners = ((view or {}).get('map._derived') or {}).get('coordinates')
+    if not corners:
+        return None
+    lons, lats = zip(*corners)
+    return (round(min(lats), 4), round(max(lats), 4), round(min(lons), 4), round(max(lons), 4))
+
+
+def _column(df, name):
+    return df[name].to_numpy(np.float64) if name in df.columns else np.full(len(df), np.nan)
+
+
+def _places(df, side, code):
+    """
+    Coordinate sums per `side` ('start' or 'end') station of `df`, in order
+    of first appearance, over the trips with usable coordinates.
+    """
+    codes, names = pd.factorize(df[f'{side}_station_name'])
+    lat, lon = _column(df, f'{side}_station_latitude'), _column(df, f'{side}_station_longitude')
+    ok = (codes >= 0) & np.isfinite(lat) & np.isfinite(lon) & (lat != 0) & (lon != 0)
+    n = len(names)
+    return pd.DataFrame({
+        'side': np.full(n, code),
+        'station': np.asarray(names, dtype=object),
+        'lat_sum': np.bincount(codes[ok], weights=lat[ok], minlength=n),
+        'lon_sum': np.bincount(codes[ok], weights=lon[ok], minlength=n),
+        'n': np.bincount(codes[ok], minlength=n).astype(np.float64),
+    })
+
+
+def aggregate_trips(df):
+    """
+    Trip counts and duration sums per (cell, start station), trip counts
+    per (cell, end station), and the coordinate sums of every station
+    (`side` 0 as a start, 1 as an end), start stations first.
+    """
+    dur = _column(df, 'duration_mins')
+    has = ~np.isnan(dur)
+    ones = np.ones(len(df))
+    departures = group_sum(df, _DEPARTURES, {'trips': ones, 'dur_sum': np.where(has, dur, 0.0),
+                                             'dur_n': has.astype(np.float64)})
+    if 'end_station_name' in df.columns:
+        arrivals = group_sum(df, _ARRIVALS, {'trips': ones})
+        places = pd.concat([_places(df, 'start', 0), _places(df, 'end', 1)], ignore_index=True)
+    else:
+        arrivals = pd.DataFrame({col: [] for col in _ARRIVALS + ['trips']})
+        places = _places(df, 'start', 0)
+    return departures, arrivals, places
+
+
+def merge_aggregates(parts):
+    """Combine `aggregate_trips` results of several partitions or batches."""
+    departures, arrivals, places = (pd.concat(frames, ignore_index=True) for frames in zip(*parts))
+    departures = group_sum(departures, _DEPARTURES, {name: departures[name].to_numpy(np.float64)
+                                                     for name in ('trips', 'dur_sum', 'dur_n')})
+    arrivals = group_sum(arrivals, _ARRIVALS, {'trips': arrivals['trips'].to_numpy(np.float64)})
+    places = places.groupby(['side', 'station'], sort=False, as_index=False).sum()
+    return departures, arrivals, places.sort_values('side', kind='stable', ignore_index=True)
+
+
+def _partial_sums(cell, station, ncells, **values):
+    """
+    CSR over filter cells: `offsets[c]:offsets[c+1]` are cell c's entries,
+    each a station id with its `values`. Rows without a station are dropped.
+    """
+    ok = station >= 0
+    order = np.argsort(cell[ok], kind='stable')
+    sums = {'offsets': np.searchsorted(cell[ok][order], np.arange(ncells + 1)),
+            'ids': station[ok][order].astype(np.int32)}
+    for name, array in values.items():
+        sums[name] = array[ok][order]
+    return sums
+
+
+class GridIndex:
+    """Stations bucketed into a uniform lat/lon grid, for bounding-box lookups."""
+
+    def __init__(self, lat, lon, cell=GRID_CELL):
+        self.lat, self.lon, self.cell = lat, lon, cell
+        ids = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        self.lat0 = float(lat[ids].min()) if len(ids) else 0.0
+        self.lon0 = float(lon[ids].min()) if len(ids) else 0.0
+        rows = ((lat[ids] - self.lat0) // cell).astype(np.int64)
+        cols = ((lon[ids] - self.lon0) // cell).astype(np.int64)
+        self.rows = int(rows.max()) + 1 if len(ids) else 0
+        self.cols = int(cols.max()) + 1 if len(ids) else 0
+        keys = rows * self.cols + cols
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.ids = keys[order], ids[order]
+
+    def _clip(self, value, origin, top):
+        return min(max(int((value - origin) // self.cell), 0), top - 1)
+
+    def within(self, south, north, west, east):
+        """Station ids inside the box, in id order."""
+        if not self.rows or north < self.lat0 or east < self.lon0:
+            return np.empty(0, dtype=np.int64)
+        r0, r1 = self._clip(south, self.lat0, self.rows), self._clip(north, self.lat0, self.rows)
+        c0, c1 = self._clip(west, self.lon0, self.cols), self._clip(east, self.lon0, self.cols)
+        # Each grid row's cells c0..c1 are one contiguous run of sorted keys
+        starts = np.searchsorted(self.keys, np.arange(r0, r1 + 1) * self.cols + c0, side='left')
+        stops  = np.searchsorted(self.keys, np.arange(r0, r1 + 1) * self.cols + c1, side='right')
+        found = np.concatenate([self.ids[a:b] for a, b in zip(starts, stops)] or [np.empty(0, np.int64)])
+        lat, lon = self.lat[found], self.lon[found]
+        return np.sort(found[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)])
+
+
+@dataclass
+class StationStats:
+    """Per-station totals for one filter state, indexed by station id."""
+    departures: np.ndarray
+    arrivals: np.ndarray
+    dur_sum: np.ndarray
+    dur_n: np.ndarray
+    table: pd.DataFrame     # the engine's dimension table (shared, not copied)
+
+    @property
+    def total(self):
+        return int(self.departures.sum())
+
+    def metric(self, name):
+        """Value of metric `name` per station (NaN where it is undefined)."""
+        if name == 'trips':
+            return self.departures.astype(np.float64)
+        if name == 'duration':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = self.dur_sum / self.dur_n
+            return np.where(self.departures >= MIN_DURATION_TRIPS, mean, np.nan)
+        if name == 'inflow':
+            return (self.arrivals - self.departures).astype(np.float64)
+        if name == 'outflow':
+            return (self.departures - self.arrivals).astype(np.float64)
+        raise ValueError(f"unknown station metric {name!r}")
+
+
+@dataclass
+class Ranking:
+    """Top stations by one metric, best first."""
+    metric: str
+    stations: list
+    values: np.ndarray
+
+    @property
+    def total(self):
+        return len(self.stations)
+
+
+class StationIndex:
+    """Station dimension table, grid index and sparse per-cell station sums."""
+
+    ARRAYS = ('user_types', 'genders', 'age_groups', 'names', 'lat', 'lon',
+              'dep_offsets', 'dep_ids', 'dep_trips', 'dep_dur_sum', 'dep_dur_n',
+              'arr_offsets', 'arr_ids', 'arr_trips')
+
+    def __init__(self, arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.user_types = [str(v) for v in self.user_types]
+        self.genders    = [str(v) for v in self.genders]
+        self.age_groups = [str(v) for v in self.age_groups]
+        self.names = [str(v) for v in self.names]
+        self.S = len(self.names)
+        self.shape = (len(self.user_types) + 1, len(self.genders) + 1, len(self.age_groups) + 1, HOURS + 1)
+        self.departures = {'offsets': self.dep_offsets, 'ids': self.dep_ids, 'trips': self.dep_trips,
+                           'dur_sum': self.dep_dur_sum, 'dur_n': self.dep_dur_n}
+        self.arrivals = {'offsets': self.arr_offsets, 'ids': self.arr_ids, 'trips': self.arr_trips}
+
+        self.everything = self._sum(np.ones(int(np.prod(self.shape)), dtype=bool))
+        self.table = pd.DataFrame({
+            'station': self.names,
+            'short': [short_label(name) for name in self.names],
+            'lat': self.lat,
+            'lon': self.lon,
+            'departures': self.everything.departures,
+            'arrivals': self.everything.arrivals,
+        })
+        self.everything.table = self.table
+        self.grid = GridIndex(self.lat, self.lon)
+
+    @classmethod
+    def from_aggregates(cls, aggregated):
+        """Encode an `aggregate_trips` / `merge_aggregates` result."""
+        departures, arrivals, places = aggregated
+        # Start stations in order of first appearance, then those only ever seen as destinations
+        names = pd.Index(pd.unique(places['station'].astype(str)))
+        S = len(names)
+        station = names.get_indexer(places['station'].astype(str))
+        side, n = places['side'].to_numpy(), places['n'].to_numpy(np.float64)
+        lat, lon = np.full(S, np.nan), np.full(S, np.nan)
+        for code in (1, 0):   # start coordinates win over end coordinates
+            rows = (side == code) & (n > 0)
+            lat[station[rows]] = places['lat_sum'].to_numpy(np.float64)[rows] / n[rows]
+            lon[station[rows]] = places['lon_sum'].to_numpy(np.float64)[rows] / n[rows]
+
+        cell, (user_types, genders, age_groups) = encode_cells(
+            pd.concat([departures[CELL_COLUMNS], arrivals[CELL_COLUMNS]], ignore_index=True))
+        ncells = (len(user_types) + 1) * (len(genders) + 1) * (len(age_groups) + 1) * (HOURS + 1)
+        nd = len(departures)
+
+        def ids(frame, col):
+            values = frame[col]
+            return np.where(values.notna(), names.get_indexer(values.astype(str)), -1)
+
+        dep = _partial_sums(cell[:nd], ids(departures, 'start_station_name'), ncells,
+                            trips=departures['trips'].to_numpy(np.float64),
+                            dur_sum=departures['dur_sum'].to_numpy(np.float64),
+                            dur_n=departures['dur_n'].to_numpy(np.float64))
+        arr = _partial_sums(cell[nd:], ids(arrivals, 'end_station_name'), ncells,
+                            trips=arrivals['trips'].to_numpy(np.float64))
+        return cls({
+            'user_types': user_types, 'genders': genders, 'age_groups': age_groups,
+            'names': list(names), 'lat': lat, 'lon': lon,
+            **{f'dep_{key}': value for key, value in dep.items()},
+            **{f'arr_{key}': value for key, value in arr.items()},
+        })
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls.from_aggregates(aggregate_trips(df))
+
+    # ── Storage ───────────────────────────────────────────────────────────────
+    def save(self, path):
+        """Write the arrays to an `.npz` file, replacing `path` atomically."""
+        tmp = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp, **{name: np.asarray(getattr(self, name)) for name in self.ARRAYS})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in cls.ARRAYS})
+
+    # ── Selection ─────────────────────────────────────────────────────────────
+    def _select(self, sums, cells, *fields):
+        entries = np.repeat(cells, np.diff(sums['offsets']))
+        ids = sums['ids'][entries]
+        return [np.bincount(ids, weights=sums[f][entries], minlength=self.S) for f in fields]
+
+    def _sum(self, cells):
+        departures, dur_sum, dur_n = self._select(self.departures, cells, 'trips', 'dur_sum', 'dur_n')
+        arrivals, = self._select(self.arrivals, cells, 'trips')
+        return StationStats(
+            departures=departures.astype(np.int64),
+            arrivals=arrivals.astype(np.int64),
+            dur_sum=dur_sum,
+            dur_n=dur_n.astype(np.int64),
+            table=getattr(self, 'table', None),
+        )
+
+    def stats(self, sel_user, sel_gender, sel_age, sel_hour):
+        """Per-station totals under the sidebar filters."""
+        cells = select_cells(self.user_types, self.genders, self.age_groups,
+                             sel_user, sel_gender, sel_age, sel_hour)
+        return self.everything if cells.all() else self._sum(cells)
+
+    def top_k(self, stats, metric='trips', k=TOP_K, bounds=None):
+        """
+        The `k` best stations by `metric`, limited to the (south, north,
+        west, east) box when `bounds` is given. Ties keep station order.
+        """
+        values = stats.metric(metric)
+        active = (stats.departures > 0) | (stats.arrivals > 0)
+        ids = np.flatnonzero(active & ~np.isnan(values))
+        if bounds is not None:
+            ids = np.intersect1d(ids, self.grid.within(*bounds), assume_unique=True)
+        order = ids[np.argsort(-values[ids], kind='stable')[:k]]
+        return Ranking(metric=metric, stations=[self.table['short'].iat[i] for i in order],
+                       values=values[order])
+
+
+def load_stations(source):
+    """
+    The station index saved by the preprocessing next to the partitions,
+    or one built from `source` when that file is missing or stale: the
+    loaded trips, or a function returning their `aggregate_trips` result
+    (as the out-of-core engine computes it; that one is saved for the next start).
+    """
+    from data import keep_aggregate, saved_aggregate
+
+    path = saved_aggregate(STATIONS_FILE)
+    if path:
+        return StationIndex.load(path)
+    if callable(source):
+        return keep_aggregate(STATIONS_FILE, StationIndex.from_aggregates(source()))
+    return StationIndex.from_aggregates(aggregate_trips(source))
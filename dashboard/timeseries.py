@@ -0,0 +1,257 @@
+"""
+Trips over Time
+Ford GoBike Interactive Dashboard
+
+Trip counts per filter cell (user type × gender × age group × start hour)
+and time bucket, rolled up at four resolutions: 5-minute, hourly, daily
+and weekly. Each level keeps only the non-empty (cell, bucket) pairs as
+sorted keys, so a date range is one binary search per selected cell.
+Buckets count from the Monday before the first trip, so weeks start on
+Mondays.
+
+A query uses the coarsest level that still gives MIN_POINTS points over
+the requested range; when the finest level has more than MAX_POINTS there,
+the line is downsampled with Largest-Triangle-Three-Buckets (LTTB).
+
+Like the flow matrix, the rollups are saved next to the partitions by
+`scripts/preprocessing.py` (ROLLUPS_FILE) and built from the loaded trips
+when that file is missing or stale.
+"""
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+from flows import CELL_COLUMNS, encode_cells, group_sum, select_cells
+
+# Level → bucket width in seconds, finest first
+RESOLUTIONS = {'5min': 300, 'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+RESOLUTION_LABELS = {'5min': '5-minute', 'hour': 'hourly', 'day': 'daily', 'week': 'weekly'}
+
+MIN_POINTS = 200
+MAX_POINTS = 1000
+ROLLUPS_FILE = '_rollups.npz'
+ROLLUP_COLUMNS = CELL_COLUMNS + ['start_time']
+_KEYS = CELL_COLUMNS + ['bucket']
+_DAY = 86400
+
+
+def to_seconds(value):
+    """Epoch seconds of a date, timestamp or ISO string (None stays None)."""
+    if value is None:
+        return None
+    return int(pd.Timestamp(value).value // 10**9)
+
+
+def zoom_range(view):
+    """(start, end) of the x-axis range in a chart's `relayoutData`, or None when not zoomed."""
+    view = view or {}
+    if 'xaxis.range[0]' in view and 'xaxis.range[1]' in view:
+        return view['xaxis.range[0]'], view['xaxis.range[1]']
+    if 'xaxis.range' in view:
+        return tuple(view['xaxis.range'][:2])
+    return None
+
+
+def day_after(date):
+    """ISO date of the day after `date` (None stays None): the picker's end day is inclusive."""
+    if date is None:
+        return None
+    return (pd.Timestamp(date).normalize() + pd.Timedelta(days=1)).isoformat()
+
+
+# ── Aggregation ───────────────────────────────────────────────────────────────
+def aggregate_trips(df):
+    """Trips per (cell, 5-minute bucket) of `df`; trips without a start time are left out."""
+    start = pd.to_datetime(df['start_time'], errors='coerce')
+    ok = start.notna().to_numpy()
+    seconds = start.to_numpy()[ok].astype('datetime64[s]').astype(np.int64)
+    step = RESOLUTIONS['5min']
+    frame = df.loc[ok, CELL_COLUMNS].assign(bucket=seconds // step * step)
+    return group_sum(frame, _KEYS, {'trips': np.ones(len(frame))})
+
+
+def merge_aggregates(parts):
+    """Combine `aggregate_trips` results of several partitions or batches."""
+    frame = pd.concat(parts, ignore_index=True)
+    return group_sum(frame, _KEYS, {'trips': frame['trips'].to_numpy(np.float64)})
+
+
+def coarser(level):
+    """The next coarser resolution than `level`, or None for the coarsest."""
+    levels = list(RESOLUTIONS)
+    i = levels.index(level) + 1
+    return levels[i] if i < len(levels) else None
+
+
+def lttb(x, y, n):
+    """
+    Largest-Triangle-Three-Buckets: `n` of the points (x, y), including the
+    first and last, chosen to keep the visual shape of the line.
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return x, y
+    xf, yf = x.astype(np.float64), y.astype(np.float64)
+    # n - 2 buckets between the first and the last point
+    edges = (np.arange(n - 1) * ((size - 2) / (n - 2))).astype(np.int64) + 1
+    counts = np.diff(np.append(edges, size))
+    mean_x = np.add.reduceat(xf, edges) / counts
+    mean_y = np.add.reduceat(yf, edges) / counts
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Triangle with the last kept point and the next bucket's mean
+        area = np.abs((xf[a] - mean_x[i + 1]) * (yf[lo:hi] - yf[a])
+                      - (xf[a] - xf[lo:hi]) * (mean_y[i + 1] - yf[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+# ── Query results ─────────────────────────────────────────────────────────────
+@dataclass
+class Timeline:
+    """Trips per time bucket over one range."""
+    resolution: str
+    times: np.ndarray       # bucket starts, datetime64[s]
+    trips: np.ndarray
+    total: int              # trips in the range (before downsampling)
+    downsampled: bool
+
+
+class Rollups:
+    """Sparse (filter cell × time bucket) trip counts at every resolution."""
+
+    ARRAYS = ('user_types', 'genders', 'age_groups', 'bounds',
+              *(f'{kind}_{level}' for level in RESOLUTIONS for kind in ('keys', 'trips')))
+
+    def __init__(self, arrays):
+        self.user_types = [str(v) for v in arrays['user_types']]
+        self.genders    = [str(v) for v in arrays['genders']]
+        self.age_groups = [str(v) for v in arrays['age_groups']]
+        # Monday before the first trip, first trip, end of the last 5-minute bucket
+        self.origin, self.first, self.end = (int(v) for v in arrays['bounds'])
+        self.levels, self.buckets, self.totals = {}, {}, {}
+        for level, step in RESOLUTIONS.items():
+            keys, trips = arrays[f'keys_{level}'], arrays[f'trips_{level}']
+            nb = (self.end - 1 - self.origin) // step + 1
+            self.levels[level], self.buckets[level] = (keys, trips), nb
+            self.totals[level] = np.bincount(keys % nb, weights=trips, minlength=nb)
+
+    @classmethod
+    def from_aggregates(cls, grouped):
+        """Encode an `aggregate_trips` / `merge_aggregates` result."""
+        cell, (user_types, genders, age_groups) = encode_cells(grouped)
+        seconds = grouped['bucket'].to_numpy(np.int64)
+        trips = grouped['trips'].to_numpy(np.float64)
+        first = int(seconds.min()) if len(seconds) else 0
+        day = first // _DAY
+        origin = (day - (day + 3) % 7) * _DAY   # 1970-01-01 was a Thursday
+        end = (int(seconds.max()) if len(seconds) else 0) + RESOLUTIONS['5min']
+
+        arrays = {'user_types': user_types, 'genders': genders, 'age_groups': age_groups,
+                  'bounds': np.array([origin, first, end], dtype=np.int64)}
+        for level, step in RESOLUTIONS.items():
+            nb = (end - 1 - origin) // step + 1
+            keys, inverse = np.unique(cell * nb + (seconds - origin) // step, return_inverse=True)
+            arrays[f'keys_{level}'] = keys
+            arrays[f'trips_{level}'] = np.bincount(inverse, weights=trips, minlength=len(keys)).astype(np.int32)
+        return cls(arrays)
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls.from_aggregates(aggregate_trips(df))
+
+    # ── Storage ───────────────────────────────────────────────────────────────
+    def save(self, path):
+        """Write the arrays to an `.npz` file, replacing `path` atomically."""
+        arrays = {'user_types': np.asarray(self.user_types), 'genders': np.asarray(self.genders),
+                  'age_groups': np.asarray(self.age_groups),
+                  'bounds': np.array([self.origin, self.first, self.end], dtype=np.int64)}
+        for level, (keys, trips) in self.levels.items():
+            arrays[f'keys_{level}'], arrays[f'trips_{level}'] = keys, trips
+        tmp = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in cls.ARRAYS})
+
+    # ── Selection ─────────────────────────────────────────────────────────────
+    def date_range(self):
+        """First and last day with trips, as `datetime64[D]`."""
+        return (np.datetime64(self.first, 's').astype('datetime64[D]'),
+                np.datetime64(self.end - 1, 's').astype('datetime64[D]'))
+
+    @staticmethod
+    def resolution(seconds):
+        """Coarsest level with at least MIN_POINTS buckets in a range of `seconds`."""
+        for level in reversed(RESOLUTIONS):
+            if seconds / RESOLUTIONS[level] >= MIN_POINTS:
+                return level
+        return next(iter(RESOLUTIONS))
+
+    def _window(self, level, cells, b0, b1):
+        """Trips per bucket b0..b1 summed over the selected cells."""
+        keys, trips = self.levels[level]
+        nb = self.buckets[level]
+        if cells.all():
+            return self.totals[level][b0:b1 + 1]
+        c = np.flatnonzero(cells)
+        lo = np.searchsorted(keys, c * nb + b0)
+        hi = np.searchsorted(keys, c * nb + b1, side='right')
+        n = hi - lo
+        idx = np.repeat(lo - np.cumsum(n) + n, n) + np.arange(n.sum())
+        return np.bincount(keys[idx] % nb - b0, weights=trips[idx], minlength=b1 - b0 + 1)
+
+    def span(self, start=None, end=None):
+        """`start` and `end` clamped to the data range, and the resolution they call for."""
+        start = self.first if start is None else min(max(start, self.first), self.end - 1)
+        end = self.end if end is None else min(max(end, start + 1), self.end)
+        return start, end, self.resolution(end - start)
+
+    def series(self, sel_user, sel_gender, sel_age, sel_hour, start=None, end=None, level=None):
+        """
+        Trips over time under the sidebar filters, from `start` to `end`
+        (epoch seconds, default: the whole data range), at `level` if given
+        instead of the resolution the range calls for.
+        """
+        start, end, picked = self.span(start, end)
+        level = level or picked
+        step = RESOLUTIONS[level]
+        b0, b1 = (start - self.origin) // step, (end - 1 - self.origin) // step
+
+        cells = select_cells(self.user_types, self.genders, self.age_groups,
+                             sel_user, sel_gender, sel_age, sel_hour)
+        trips = self._window(level, cells, b0, b1).astype(np.int64)
+        seconds = self.origin + (b0 + np.arange(len(trips))) * step
+        total = int(trips.sum())
+        downsampled = len(trips) > MAX_POINTS
+        if downsampled:
+            seconds, trips = lttb(seconds, trips, MAX_POINTS)
+        return Timeline(resolution=level, times=seconds.astype('datetime64[s]'), trips=trips,
+                        total=total, downsampled=downsampled)
+
+
+def load_rollups(source):
+    """
+    The rollups saved by the preprocessing next to the partitions, or
+    ones built from `source` when that file is missing or stale: the loaded
+    trips, or a function returning their `aggregate_trips` result (as the
+    out-of-core engine computes it; that one is saved for the next start).
+    """
+    from data import keep_aggregate, saved_aggregate
+
+    path = saved_aggregate(ROLLUPS_FILE)
+    if path:
+        return Rollups.load(path)
+    if callable(source):
+        return keep_aggregate(ROLLUPS_FILE, Rollups.from_aggregates(source()))
+    return Rollups.from_aggregates(aggregate_trips(source))
@@ -0,0 +1,124 @@
+"""
+Result Cache Warm-up
+Ford GoBike Interactive Dashboard
+
+Precomputes common dashboard views so the first visitors after a deploy
+do not pay the cold-path latency. The views are every dropdown
+combination from the sidebar (at the default hour range), followed by the
+most requested filter states from the request log when one is kept.
+
+Each serving process runs the warm-up in a background thread (started by
+`app.py`, `wsgi.py` or gunicorn's post_fork hook), and `/ready` answers
+503 until its cache is filled. Run this module directly to fill the
+shared store (GOBIKE_CACHE_DIR) before starting the workers: it holds the
+summaries behind the KPIs and summary charts and the figures of every
+warmed view, which the workers then read instead of computing them. The
+station, flow and timeline selections are per process and are not
+stored there:
+
+    GOBIKE_CACHE_DIR=/tmp/gobike-cache python dashboard/warmup.py --workers 4 --top 200
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import CACHE_DIR, normalize_filters, top_requests
+from components.filters import filter_space
+
+WARMUP_ENABLED = os.environ.get('GOBIKE_WARMUP', '1') != '0'
+WARMUP_WORKERS = int(os.environ.get('GOBIKE_WARMUP_WORKERS', '4'))
+WARMUP_TOP_N   = int(os.environ.get('GOBIKE_WARMUP_TOP', '100'))
+
+READY  = threading.Event()
+STATUS = {'views': 0, 'done': 0, 'seconds': None}
+_status_lock = threading.Lock()
+
+
+def _after_fork():
+    # A warm-up thread may hold the lock while a background job is forked
+    global _status_lock
+    _status_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def warmup_views(top_n=WARMUP_TOP_N):
+    """Normalized filter states to precompute, most important first."""
+    space = filter_space()
+    views = [normalize_filters(*combo) for combo in itertools.product(
+        space['user-type-filter'],
+        space['gender-filter'],
+        space['age-group-filter'],
+        space['hour-slider'],
+    )]
+    views += top_requests(top_n)
+    return list(dict.fromkeys(views))  # drop duplicates, keep order
+
+
+def warm_cache(workers=WARMUP_WORKERS, top_n=WARMUP_TOP_N):
+    """Fill the result cache with `warmup_views()` using a thread pool."""
+    import callbacks  # imported here so `app` exists first; loads the data on first use
+
+    views = warmup_views(top_n)
+    STATUS.update(views=len(views), done=0)
+    start = time.perf_counter()
+
+    def compute(filters):
+        callbacks.cached_dashboard(*filters)
+        with _status_lock:
+            STATUS['done'] += 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            list(pool.map(compute, views))
+    finally:
+        # A failed warm-up only costs latency; never keep the worker out of rotation
+        STATUS['seconds'] = round(time.perf_counter() - start, 3)
+        READY.set()
+    return STATUS
+
+
+def start_warmup():
+    """Warm the cache in a daemon thread, or mark ready at once when disabled."""
+    if not WARMUP_ENABLED:
+        READY.set()
+        return None
+    thread = threading.Thread(target=warm_cache, name='cache-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def register_readiness(server):
+    """Add `/ready` to the Flask server for load-balancer health checks."""
+
+    @server.route('/ready')
+    def ready():
+        body = {'ready': READY.is_set(), **STATUS}
+        return body, (200 if READY.is_set() else 503)
+
+    return ready
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Precompute the summaries and figures of common views into the shared "
+                    "cache store (GOBIKE_CACHE_DIR).")
+    parser.add_argument('--workers', type=int, default=WARMUP_WORKERS, help="Worker threads.")
+    parser.add_argument('--top', type=int, default=WARMUP_TOP_N,
+                        help="Also warm this many of the most requested filter states.")
+    args = parser.parse_args()
+    if not CACHE_DIR:
+        sys.exit("GOBIKE_CACHE_DIR is not set: the warmed views would only live in this process")
+
+    import dash
+    dash.Dash(__name__)  # callbacks register against an app
+
+    status = warm_cache(args.workers, args.top)
+    print(f"Warmed {status['done']} views in {status['seconds']}s")
@@ -0,0 +1,29 @@
+"""
+Production WSGI Entry Point
+Ford GoBike Interactive Dashboard
+
+`server` is the Flask app behind Dash. Importing this module loads the
+data once: gunicorn (`preload_app` in gunicorn.conf.py) imports it in the
+master process, so the workers it forks share the loaded trips, query
+engine and chart templates instead of each building their own.
+
+    cd dashboard && gunicorn wsgi:server      # Linux/macOS, settings in gunicorn.conf.py
+    python dashboard/wsgi.py                  # waitress, one multi-threaded process
+"""
+
+from app import app, server  # noqa: F401
+import callbacks
+from figures import templates
+from serving import HOST, PORT, THREADS, WORKERS
+from warmup import start_warmup
+
+# Preload: the data is loaded here, not when callbacks.py is imported, and
+# the chart templates are laid out once instead of in every worker
+callbacks.load_data()
+templates()
+
+if __name__ == '__main__':
+    from waitress import serve  # type: ignore
+
+    start_warmup()
+    serve(server, host=HOST, port=PORT, threads=WORKERS * THREADS)
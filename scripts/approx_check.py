@@ -0,0 +1,118 @@
+# ==============================
+# Approximate Mode Check
+# ==============================
+# Runs every filter state of the sidebar (each dropdown combination crossed
+# with the benchmark's hour ranges) through the stratified samples of the
+# approximate mode (dashboard/approx.py) and through an exact engine, and
+# reports:
+#   - latency of both (p50/p95 per summary),
+#   - that the values kept exactly (totals, subscriber share, user, gender
+#     and hour breakdowns) match,
+#   - how often the 95% intervals of the average duration and the distinct
+#     station count hold the exact value,
+#   - the error of the estimated weekday counts.
+#
+# Usage:
+#   python scripts/approx_check.py
+#   python scripts/approx_check.py --data-dir /tmp/bench/1000000/processed --engine duckdb
+#
+# Exits with status 1 when an exact value differs or an interval's
+# coverage falls below --min-coverage.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DASHBOARD_DIR = os.path.join(SCRIPTS_DIR, "..", "dashboard")
+
+EXACT_FIELDS = ("total", "subscriber_share", "hours", "hour_trips",
+                "user_types", "user_trips", "genders", "gender_trips")
+
+# Estimated KPI → rounding of its displayed value, allowed on top of the margin
+ESTIMATED = {"duration_mean": 0.05, "distinct_stations": 0.5}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def covered(exact, estimate, margin, slack):
+    """Whether the interval `estimate ± margin` holds `exact`, up to display rounding."""
+    if exact is None or estimate is None:
+        return exact is estimate
+    return abs(exact - estimate) <= margin + slack
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the approximate mode against exact answers.")
+    parser.add_argument("--data-dir", help="processed directory (default: the dashboard's)")
+    parser.add_argument("--engine", choices=["cube", "index", "duckdb"], default="cube",
+                        help="exact engine to compare with")
+    parser.add_argument("--min-coverage", type=float, default=0.9,
+                        help="lowest share of intervals that must hold the exact value")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        os.environ["GOBIKE_DATA_DIR"] = os.path.abspath(args.data_dir)
+    os.environ["GOBIKE_WARMUP"] = "0"
+    sys.path.insert(0, DASHBOARD_DIR)
+    import callbacks
+    from approx import load_samples
+    from benchmark import filter_matrix
+    from components.filters import filter_space
+    from data import trips
+
+    if args.engine in callbacks.OUT_OF_CORE:
+        engine = callbacks.ENGINES[args.engine]()
+        samples, build = timed(load_samples, engine.sample_aggregates)
+    else:
+        _, df = trips.get()
+        engine = callbacks.ENGINES[args.engine](df)
+        samples, build = timed(load_samples, df)
+
+    mismatches, latency = [], {"approx": [], "exact": []}
+    hits = dict.fromkeys(ESTIMATED, 0)
+    weekday_error = []
+    matrix = filter_matrix(filter_space())
+    for filters in matrix:
+        filters = tuple(tuple(f) if isinstance(f, list) else f for f in filters)
+        estimate, seconds = timed(samples.summarize, *filters)
+        latency["approx"].append(seconds)
+        exact, seconds = timed(engine.summarize, *filters)
+        latency["exact"].append(seconds)
+
+        for field in EXACT_FIELDS:
+            a, b = getattr(estimate, field), getattr(exact, field)
+            if not np.array_equal(np.asarray(a), np.asarray(b)):
+                mismatches.append(f"{field} for {filters}: {a} != {b}")
+        for field, slack in ESTIMATED.items():
+            hits[field] += covered(getattr(exact, field), getattr(estimate, field),
+                                   estimate.margins[field], slack)
+        if exact.total:
+            weekday_error.append(np.abs(estimate.weekday - exact.weekday).sum() / exact.total)
+
+    print(f"{samples.cell_trips.sum():,} trips, {len(samples.weekday):,} sampled, "
+          f"{len(matrix)} filter states; samples built or loaded in {build:.2f}s")
+    for name, values in latency.items():
+        ms = np.array(values) * 1000
+        print(f"{name:>7}: p50 {np.percentile(ms, 50):7.2f} ms, p95 {np.percentile(ms, 95):7.2f} ms")
+    coverage = {field: hit / len(matrix) for field, hit in hits.items()}
+    for field, share in coverage.items():
+        print(f"95% interval of {field} holds the exact value in {share:.1%} of states")
+    if weekday_error:
+        print(f"weekday counts: absolute errors sum to a median {np.median(weekday_error):.2%} of the trips, "
+              f"max {np.max(weekday_error):.2%}")
+    for line in mismatches[:10]:
+        print("exact value differs: " + line)
+
+    return 1 if mismatches or min(coverage.values()) < args.min_coverage else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
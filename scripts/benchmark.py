@@ -0,0 +1,555 @@
+# ==============================
+# Dashboard Benchmark Suite
+# ==============================
+# End-to-end timings on synthetic GoBike-shaped data, written to a JSON file
+# so runs can be compared before and after a change.
+#
+#   suite    For each size: write raw monthly CSVs (synthetic_trips.write_raw),
+#            run the preprocessing pipeline on them, then load the result in
+#            the dashboard and replay a filter matrix through the callbacks,
+#            cold (caches cleared) and warm, for every query engine. Reports
+#            p50/p95/p99 latency, JSON payload size and peak RSS. Each stage
+#            runs in its own process so its peak RSS is its own.
+#   http     Load generator against a running dashboard: concurrent
+#            `_dash-update-component` requests built from the app's own
+#            `_dash-dependencies` and `_dash-layout`.
+#   startup  Import time of the app and time from process start to the
+#            first callback response (which pays the lazy data load), in
+#            fresh processes; exit status 1 above --max-import-s or
+#            --max-first-response-s.
+#   compare  Flags metrics that got worse by more than --threshold between
+#            two result files (exit status 1 on regressions).
+#
+# Usage:
+#   python scripts/benchmark.py suite --sizes 100000 1000000 10000000 --output bench.json
+#   python scripts/benchmark.py http --url http://127.0.0.1:8055 --concurrency 16 --requests 2000
+#   python scripts/benchmark.py startup --max-import-s 3 --max-first-response-s 10
+#   python scripts/benchmark.py compare old.json new.json --threshold 0.1
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DASHBOARD_DIR = os.path.join(SCRIPTS_DIR, "..", "dashboard")
+
+DEFAULT_SIZES = [100_000, 1_000_000, 10_000_000]
+
+# Slider positions replayed for every dropdown combination: the default
+# full day, commute peaks, a quiet range, a single hour and no filter
+HOUR_RANGES = [[0, 23], [7, 9], [17, 18], [0, 5], [12, 12], None]
+
+# Filter inputs in callback argument order
+FILTER_IDS = ["user-type-filter", "gender-filter", "age-group-filter", "hour-slider"]
+
+
+# ==============================
+# Helpers
+# ==============================
+def percentiles(samples):
+    """p50/p95/p99/max of latencies in seconds, in milliseconds."""
+    if not samples:
+        return {}
+    ms = np.asarray(samples) * 1000
+    return {
+        "count": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size of this process (or its reaped children)."""
+    kb = resource.getrusage(who).ru_maxrss
+    return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def filter_matrix(space):
+    """Every dropdown combination crossed with HOUR_RANGES, in callback argument order."""
+    return [list(combo) for combo in itertools.product(
+        space["user-type-filter"], space["gender-filter"], space["age-group-filter"], HOUR_RANGES)]
+
+
+def run_metadata():
+    """Where and on what the results were measured."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=SCRIPTS_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(results, path):
+    with open(path, "w") as fh:
+        json.dump(results, fh, indent=2)
+    print(f"Results written to {path}")
+
+
+# ==============================
+# Stages (each in its own process)
+# ==============================
+def pipeline_stage(raw_dir, data_dir, workers):
+    """Time the preprocessing pipeline on every raw file in `raw_dir`."""
+    from preprocessing import run_pipeline
+
+    paths = sorted(os.path.join(raw_dir, name) for name in os.listdir(raw_dir) if name.endswith(".csv"))
+    start = time.perf_counter()
+    rows, _ = run_pipeline(paths, output_dir=os.path.join(data_dir, "trips"), workers=workers, full=True)
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "files": len(paths),
+        "rows": sum(rows.values()),
+        "peak_rss_mb": max(peak_rss_mb(), peak_rss_mb(resource.RUSAGE_CHILDREN)),
+    }
+
+
+def replay(callbacks, matrix, cold):
+    """Run every filter state through the server callbacks, as the browser would."""
+    from dash._utils import to_json
+
+    chains = {
+        "kpis": callbacks.update_kpis,
+        "time": callbacks.update_time_chart,
+        "user": callbacks.update_user_chart,
+        "station": callbacks.update_station_chart,
+        "station_map": callbacks.update_station_map,
+        # Whole-map ranking by trips, as on page load
+        "station_ranking": lambda *args: callbacks.update_station_ranking(*args[:4], "trips", None, args[4]),
+        # Whole date range, as on page load
+        "timeline": lambda *args: callbacks.update_timeline_chart(*args[:4], None, args[4]),
+        "flows": callbacks.update_flows_chart,
+        "balance": callbacks.update_balance_chart,
+    }
+    per_callback = {name: [] for name in chains}
+    interaction, payload = [], []
+    for filters in matrix:
+        if cold:
+            callbacks.result_cache.clear()
+            callbacks.summary_cache.clear()
+            callbacks.selection_cache.clear()
+        total, size = 0.0, 0
+        for name, fn in chains.items():
+            start = time.perf_counter()
+            outputs = fn(*filters, None)
+            elapsed = time.perf_counter() - start
+            per_callback[name].append(elapsed)
+            total += elapsed
+            size += len(to_json(list(outputs)))
+        interaction.append(total)
+        payload.append(size)
+    return {
+        "interaction": percentiles(interaction),
+        "callbacks": {name: percentiles(samples) for name, samples in per_callback.items()},
+        "payload_bytes": {"p50": int(np.percentile(payload, 50)), "max": int(max(payload))},
+    }
+
+
+def dashboard_stage(data_dir):
+    """Time loading `data_dir` and replaying the filter matrix on every engine."""
+    os.environ["GOBIKE_DATA_DIR"] = data_dir
+    os.environ["GOBIKE_WARMUP"] = "0"
+    for name in ("GOBIKE_REQUEST_LOG", "GOBIKE_CACHE_DIR", "GOBIKE_CALLBACK_MODE"):
+        os.environ.pop(name, None)
+    sys.path.insert(0, DASHBOARD_DIR)
+    import data
+
+    result = {"load": {}}
+    for label, mode in (("parquet_s", "parquet"), ("mmap_build_s", "mmap"), ("mmap_s", "mmap")):
+        start = time.perf_counter()
+        data.load_trips(mode=mode)
+        result["load"][label] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    import callbacks
+    callbacks.load_data()
+    result["startup_s"] = round(time.perf_counter() - start, 3)
+    result["rows"] = len(callbacks.df)
+
+    from components.filters import filter_space
+    matrix = filter_matrix(filter_space())
+    result["filter_states"] = len(matrix)
+
+    result["engines"] = {}
+    for name, engine_cls in callbacks.ENGINES.items():
+        start = time.perf_counter()
+        callbacks.engine = engine_cls() if name in callbacks.OUT_OF_CORE else engine_cls(callbacks.df)
+        build = time.perf_counter() - start
+        result["engines"][name] = {
+            "build_s": round(build, 3),
+            "cold": replay(callbacks, matrix, cold=True),
+            "warm": replay(callbacks, matrix, cold=False),
+        }
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_stage(kind, result_path, *args):
+    """Run one stage in a fresh interpreter and return its results."""
+    subprocess.run([sys.executable, os.path.abspath(__file__), "stage", kind, result_path, *args],
+                   check=True)
+    with open(result_path) as fh:
+        return json.load(fh)
+
+
+# ==============================
+# Suite
+# ==============================
+def run_suite(sizes, workdir, workers):
+    from synthetic_trips import write_raw
+
+    results = {"meta": run_metadata(), "datasets": {}}
+    for rows in sizes:
+        base = os.path.join(os.path.abspath(workdir), str(rows))
+        raw_dir, data_dir = os.path.join(base, "raw"), os.path.join(base, "processed")
+        marker = os.path.join(raw_dir, ".rows")
+        if not os.path.exists(marker):
+            print(f"[{rows:,}] writing raw CSVs")
+            start = time.perf_counter()
+            write_raw(rows, raw_dir, months=max(1, min(12, rows // 1_000_000)))
+            with open(marker, "w") as fh:
+                fh.write(str(rows))
+            print(f"[{rows:,}] generated in {time.perf_counter() - start:.1f}s")
+
+        print(f"[{rows:,}] preprocessing")
+        pipeline = run_stage("pipeline", os.path.join(base, "pipeline.json"), raw_dir, data_dir,
+                             str(workers or 0))
+        print(f"[{rows:,}] dashboard")
+        dashboard = run_stage("dashboard", os.path.join(base, "dashboard.json"), data_dir)
+        results["datasets"][str(rows)] = {"pipeline": pipeline, "dashboard": dashboard}
+        print_summary(rows, pipeline, dashboard)
+    return results
+
+
+def print_summary(rows, pipeline, dashboard):
+    print(f"  pipeline {pipeline['seconds']:.1f}s, peak RSS {pipeline['peak_rss_mb']:,.0f} MB")
+    load = dashboard["load"]
+    print(f"  load parquet {load['parquet_s']:.2f}s, mmap {load['mmap_s']:.2f}s "
+          f"(build {load['mmap_build_s']:.2f}s), peak RSS {dashboard['peak_rss_mb']:,.0f} MB")
+    for name, engine in dashboard["engines"].items():
+        cold, warm = engine["cold"]["interaction"], engine["warm"]["interaction"]
+        print(f"  {name:>6}: build {engine['build_s']:.2f}s | cold p50 {cold['p50_ms']:.1f} "
+              f"p95 {cold['p95_ms']:.1f} p99 {cold['p99_ms']:.1f} ms | warm p95 {warm['p95_ms']:.2f} ms"
+              f" | payload p50 {engine['cold']['payload_bytes']['p50'] / 1024:.1f} KiB")
+
+
+# ==============================
+# HTTP load generator
+# ==============================
+def _get_json(url):
+    with urllib.request.urlopen(url) as resp:
+        return json.load(resp)
+
+
+def _outputs(output):
+    """`_dash-dependencies` output string → list of {id, property} (single or multi-output)."""
+    multi = output.startswith("..")
+    parts = output[2:-2].split("...") if multi else [output]
+    specs = [dict(zip(("id", "property"), part.rsplit(".", 1))) for part in parts]
+    return specs if multi else specs[0]
+
+
+def _layout_space(layout):
+    """Dropdown options of the filter inputs, read from `_dash-layout`."""
+    space, stack = {}, [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            props = node.get("props", {})
+            if props.get("id") in FILTER_IDS and "options" in props:
+                space[props["id"]] = [opt["value"] if isinstance(opt, dict) else opt
+                                      for opt in props["options"]]
+            stack.extend(v for v in props.values() if isinstance(v, (dict, list)))
+    return space
+
+
+def request_bodies(url, count, seed):
+    """`count` callback requests over random filter states, for every server-side callback."""
+    deps = [d for d in _get_json(url + "/_dash-dependencies")
+            if not d.get("clientside_function")
+            and d["inputs"] and all(i["id"] in FILTER_IDS for i in d["inputs"])]
+    if not deps:
+        raise SystemExit("no server-side filter callbacks found (clientside mode?)")
+    matrix = filter_matrix(_layout_space(_get_json(url + "/_dash-layout")))
+    rng = random.Random(seed)
+
+    bodies = []
+    while len(bodies) < count:
+        values = dict(zip(FILTER_IDS, rng.choice(matrix)))
+        for dep in deps:
+            bodies.append((dep["output"], json.dumps({
+                "output": dep["output"],
+                "outputs": _outputs(dep["output"]),
+                "inputs": [{**i, "value": values[i["id"]]} for i in dep["inputs"]],
+                "state": [{**s, "value": None} for s in dep["state"]],
+                "changedPropIds": [f"{i['id']}.{i['property']}" for i in dep["inputs"]],
+            }).encode()))
+    return bodies[:count]
+
+
+def _post(url, body):
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req) as resp:
+            size = len(resp.read())
+        return time.perf_counter() - start, size, None
+    except OSError as exc:
+        return time.perf_counter() - start, 0, str(exc)
+
+
+def server_peak_rss_mb(pid):
+    """VmHWM of a local server process (Linux), or None."""
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def run_http(url, concurrency, count, seed, server_pid=None):
+    url = url.rstrip("/")
+    bodies = request_bodies(url, count, seed)
+    endpoint = url + "/_dash-update-component"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        replies = list(pool.map(lambda item: _post(endpoint, item[1]), bodies))
+    wall = time.perf_counter() - start
+
+    by_output = {}
+    for (output, _), (elapsed, _, error) in zip(bodies, replies):
+        if error is None:
+            by_output.setdefault(output, []).append(elapsed)
+    errors = [error for _, _, error in replies if error]
+    ok = [elapsed for elapsed, _, error in replies if error is None]
+    sizes = [size for _, size, error in replies if error is None]
+    result = {
+        "meta": {**run_metadata(), "url": url, "concurrency": concurrency, "seed": seed},
+        "http": {
+            "requests": len(replies),
+            "errors": len(errors),
+            "error_samples": sorted(set(errors))[:5],
+            "wall_s": round(wall, 3),
+            "throughput_rps": round(len(replies) / wall, 1) if wall else None,
+            "latency": percentiles(ok),
+            "callbacks": {output: percentiles(samples) for output, samples in by_output.items()},
+            "payload_bytes": {"p50": int(np.percentile(sizes, 50)), "max": int(max(sizes))} if sizes else {},
+            "server_peak_rss_mb": server_peak_rss_mb(server_pid) if server_pid else None,
+        },
+    }
+    lat = result["http"]["latency"]
+    print(f"{len(replies)} requests, {len(errors)} errors, {result['http']['throughput_rps']} req/s")
+    if lat:
+        print(f"latency p50 {lat['p50_ms']:.1f} p95 {lat['p95_ms']:.1f} p99 {lat['p99_ms']:.1f} ms")
+    return result
+
+
+# ==============================
+# Startup
+# ==============================
+IMPORT_APP = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+SERVE_APP = ("import sys; from werkzeug.serving import run_simple; from app import server; "
+             "run_simple('127.0.0.1', int(sys.argv[1]), server, threaded=True)")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _slowest_imports(env, count=8):
+    """Modules with the largest cumulative import time (`python -X importtime`)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=DASHBOARD_DIR,
+                          env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)}
+            for us, name in sorted(rows, reverse=True)[:count]]
+
+
+def first_response(env, timeout=120):
+    """Seconds from spawning a server until it listens, and until it answers a callback."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", SERVE_APP, str(port)], cwd=DASHBOARD_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise SystemExit("dashboard process exited during startup")
+            if time.perf_counter() - start > timeout:
+                raise SystemExit(f"dashboard did not answer within {timeout}s")
+            try:
+                _get_json(url + "/_dash-layout")
+                break
+            except OSError:
+                time.sleep(0.02)
+        listening = time.perf_counter() - start
+        (_, body), = request_bodies(url, 1, seed=0)
+        _, _, error = _post(url + "/_dash-update-component", body)
+        if error:
+            raise SystemExit(f"first callback failed: {error}")
+        return listening, time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run_startup(repeat):
+    env = {**os.environ, "GOBIKE_WARMUP": "0"}
+    imports, listening, first = [], [], []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", IMPORT_APP], cwd=DASHBOARD_DIR, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        imports.append(float(out.strip().splitlines()[-1]))
+        listen_s, first_s = first_response(env)
+        listening.append(listen_s)
+        first.append(first_s)
+    result = {
+        "meta": run_metadata(),
+        "startup": {
+            "repeat": repeat,
+            "import_s": round(float(np.median(imports)), 3),
+            "listen_s": round(float(np.median(listening)), 3),
+            "first_response_s": round(float(np.median(first)), 3),
+            "slowest_imports": _slowest_imports(env),
+        },
+    }
+    startup = result["startup"]
+    print(f"import {startup['import_s']:.2f}s, listening {startup['listen_s']:.2f}s, "
+          f"first callback response {startup['first_response_s']:.2f}s (median of {repeat})")
+    return result
+
+
+# ==============================
+# Compare
+# ==============================
+# Metrics where smaller is better, by key suffix
+LOWER_IS_BETTER = ("_ms", "_s", "_mb", "p50", "max", "errors")
+
+
+def _flatten(node, prefix=""):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key != "meta":
+                yield from _flatten(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        yield prefix, node
+
+
+def compare(old_path, new_path, threshold):
+    """Metrics present in both files that grew by more than `threshold` (relative)."""
+    with open(old_path) as fh:
+        old = dict(_flatten(json.load(fh)))
+    with open(new_path) as fh:
+        new = dict(_flatten(json.load(fh)))
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        if not key.endswith(LOWER_IS_BETTER) or old[key] <= 0:
+            continue
+        change = new[key] / old[key] - 1
+        if change > threshold:
+            regressions.append((key, old[key], new[key], change))
+    for key, before, after, change in regressions:
+        print(f"REGRESSION {key}: {before} -> {after} (+{change:.0%})")
+    print(f"{len(regressions)} regression(s) above {threshold:.0%}")
+    return regressions
+
+
+# ==============================
+# Entry point
+# ==============================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ford GoBike dashboard benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    suite = sub.add_parser("suite", help="pipeline, loader and callback timings on synthetic data")
+    suite.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="trips per dataset")
+    suite.add_argument("--workdir", default="benchmark-data", help="where generated data is kept (reused)")
+    suite.add_argument("--workers", type=int, default=None, help="preprocessing worker processes")
+    suite.add_argument("--output", default="benchmark-results.json", help="JSON results file")
+
+    http = sub.add_parser("http", help="concurrent callback requests against a running dashboard")
+    http.add_argument("--url", default="http://127.0.0.1:8055")
+    http.add_argument("--concurrency", type=int, default=8)
+    http.add_argument("--requests", type=int, default=1000)
+    http.add_argument("--seed", type=int, default=0)
+    http.add_argument("--server-pid", type=int, default=None, help="report this process's peak RSS")
+    http.add_argument("--output", default="benchmark-http.json", help="JSON results file")
+
+    startup = sub.add_parser("startup", help="import time and time to the first callback response")
+    startup.add_argument("--repeat", type=int, default=3)
+    startup.add_argument("--max-import-s", type=float, default=None, help="fail above this import time")
+    startup.add_argument("--max-first-response-s", type=float, default=None,
+                         help="fail above this time to the first callback response")
+    startup.add_argument("--output", default="benchmark-startup.json", help="JSON results file")
+
+    cmp_ = sub.add_parser("compare", help="flag regressions between two result files")
+    cmp_.add_argument("old")
+    cmp_.add_argument("new")
+    cmp_.add_argument("--threshold", type=float, default=0.1, help="allowed relative growth")
+
+    stage = sub.add_parser("stage")  # internal: one suite stage in a fresh process
+    stage.add_argument("kind", choices=["pipeline", "dashboard"])
+    stage.add_argument("result")
+    stage.add_argument("args", nargs="*")
+
+    args = parser.parse_args(argv)
+    if args.command == "suite":
+        write_results(run_suite(args.sizes, args.workdir, args.workers), args.output)
+    elif args.command == "http":
+        write_results(run_http(args.url, args.concurrency, args.requests, args.seed, args.server_pid),
+                      args.output)
+    elif args.command == "startup":
+        result = run_startup(args.repeat)
+        write_results(result, args.output)
+        limits = (("import_s", args.max_import_s), ("first_response_s", args.max_first_response_s))
+        over = [key for key, limit in limits if limit is not None and result["startup"][key] > limit]
+        if over:
+            print("Startup too slow: " + ", ".join(f"{key} {result['startup'][key]}s" for key in over))
+            return 1
+    elif args.command == "compare":
+        return 1 if compare(args.old, args.new, args.threshold) else 0
+    elif args.kind == "pipeline":
+        raw_dir, data_dir, workers = args.args
+        with open(args.result, "w") as fh:
+            json.dump(pipeline_stage(raw_dir, data_dir, int(workers) or None), fh)
+    else:
+        with open(args.result, "w") as fh:
+            json.dump(dashboard_stage(*args.args), fh)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
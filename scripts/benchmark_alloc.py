@@ -0,0 +1,106 @@
+# ==============================
+# Allocation Regression Benchmark
+# ==============================
+# Measures the peak memory allocated by one dashboard request (selection,
+# aggregation and the three figures) with wide-open filters, on synthetic
+# tables of growing size. The request path must not copy or convert the
+# trip table, so its allocation has to stay flat as the table grows.
+#
+# The `legacy` row shows the old callback's approach (copy the frame, then
+# chain boolean masks and an astype(str) per request) for comparison.
+#
+# Usage:
+#   python scripts/benchmark_alloc.py --rows 50000 200000 800000
+#
+# Exits with status 1 when an engine's allocation grows more than
+# --max-growth times between the smallest and largest table.
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dashboard"))
+
+from cube import TripCube  # noqa: E402
+from figures import station_figure, time_figure, user_figure  # noqa: E402
+from filter_index import FilterIndex  # noqa: E402
+from synthetic_trips import synthetic_trips  # noqa: E402
+
+ENGINES = {"cube": TripCube, "index": FilterIndex}
+
+# The sidebar's initial state, and the same without an hour filter
+WIDE_OPEN = [("All", "All", "All", [0, 23]), ("All", "All", "All", None)]
+
+
+def legacy_request(df, sel_user, sel_gender, sel_age, sel_hour):
+    """The row filtering the original callback did on every request."""
+    fdf = df.copy()
+    if sel_user != "All":
+        fdf = fdf[fdf["user_type"] == sel_user]
+    if sel_gender != "All":
+        fdf = fdf[fdf["member_gender"] == sel_gender]
+    if sel_age != "All":
+        fdf = fdf[fdf["age_group"].astype(str) == sel_age]
+    if sel_hour:
+        fdf = fdf[(fdf["start_hour"] >= sel_hour[0]) & (fdf["start_hour"] <= sel_hour[1])]
+    return fdf["start_station_name"].value_counts().head(8)
+
+
+def peak_allocation(request):
+    """Peak bytes allocated while running `request()` once."""
+    request()  # warm up lazily built state
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    request()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def measure(rows):
+    """Peak allocation per request for every engine (and legacy) on `rows` trips."""
+    df = synthetic_trips(rows)
+    results = {}
+    for name, engine_cls in ENGINES.items():
+        engine = engine_cls(df)
+
+        def request(filters):
+            s = engine.summarize(*filters)
+            return time_figure(s), user_figure(s), station_figure(s)
+
+        results[name] = max(peak_allocation(lambda: request(f)) for f in WIDE_OPEN)
+    results["legacy"] = max(peak_allocation(lambda: legacy_request(df, *f)) for f in WIDE_OPEN)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak allocation per dashboard request as the table grows.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[50_000, 200_000, 800_000],
+                        help="table sizes to measure")
+    parser.add_argument("--max-growth", type=float, default=1.5,
+                        help="allowed allocation ratio between the largest and smallest table")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(args.rows)
+    table = {rows: measure(rows) for rows in sizes}
+
+    names = list(table[sizes[0]])
+    print(f"{'rows':>12}" + "".join(f"{name:>14}" for name in names))
+    for rows in sizes:
+        print(f"{rows:>12,}" + "".join(f"{table[rows][name] / 1024:>11,.0f} KiB" for name in names))
+
+    failed = []
+    for name in ENGINES:
+        growth = table[sizes[-1]][name] / max(table[sizes[0]][name], 1)
+        print(f"{name}: x{growth:.2f} allocation from {sizes[0]:,} to {sizes[-1]:,} rows")
+        if growth > args.max_growth:
+            failed.append(name)
+    if failed:
+        print("Allocation scales with table size for: " + ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# ==============================
+# Cleaning Benchmark
+# ==============================
+# Times the in-memory cleaning (cleaning.clean_trips: one combined mask,
+# applied once) against the step-by-step version it replaced (`legacy`,
+# kept below: a filtered frame per step, four copies of the IQR filter),
+# and measures the peak memory each allocates on top of the raw frame.
+# Both must return the same rows, columns, dtypes and index.
+#
+# Usage:
+#   python scripts/benchmark_cleaning.py data/raw/fordgobike-tripdataFor201902.csv
+#   python scripts/benchmark_cleaning.py "data/raw/*.csv" --repeat 5
+#
+# Exits with status 1 when the two outputs differ.
+
+import argparse
+import glob
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from cleaning import CATEGORY_COLS, clean_trips
+
+
+def legacy_clean_trips(df):
+    """
+    The original clean_trips, step by step (plots left out, and its chained
+    in-place fillna written as assignments, which pandas 3 requires).
+    """
+    df['start_time'] = pd.to_datetime(df['start_time'], errors='coerce')
+    df['end_time'] = pd.to_datetime(df['end_time'], errors='coerce')
+    df.dropna(subset=['start_time', 'end_time'], inplace=True)
+    df['weekend_flag'] = df['start_time'].dt.dayofweek.isin([5, 6]).astype(int)
+
+    df.dropna(subset="start_station_name", inplace=True)
+    df.dropna(subset="start_station_id", inplace=True)
+    df.dropna(subset="end_station_id", inplace=True)
+    df.dropna(subset="end_station_name", inplace=True)
+
+    df["member_gender"] = df["member_gender"].fillna(df["member_gender"].mode()[0])
+    df["member_birth_year"] = df["member_birth_year"].fillna(df["member_birth_year"].median())
+
+    df[CATEGORY_COLS] = df[CATEGORY_COLS].astype("category")
+    df.drop_duplicates(inplace=True)
+
+    df['age'] = 2026 - df['member_birth_year']
+    df = df[(df['age'] >= 15) & (df['age'] <= 80)]
+
+    for col in ('start_station_latitude', 'end_station_latitude',
+                'start_station_longitude', 'end_station_longitude'):
+        df = df[df[col] != 0]
+        Q1 = df[col].quantile(0.05)
+        Q3 = df[col].quantile(0.95)
+        IQR = Q3 - Q1
+        df = df[(df[col] >= Q1 - 1.5 * IQR) & (df[col] <= Q3 + 1.5 * IQR)]
+    return df
+
+
+def measure(clean, raw, repeat):
+    """(best seconds, peak bytes allocated beyond the input, output) of `clean` on copies of `raw`."""
+    best = float("inf")
+    for _ in range(repeat):
+        df = raw.copy()
+        start = time.perf_counter()
+        clean(df)
+        best = min(best, time.perf_counter() - start)
+
+    df = raw.copy()
+    tracemalloc.start()
+    out = clean(df)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Single-pass cleaning against the step-by-step original.")
+    parser.add_argument("raw", nargs="+", help="raw monthly CSV files or glob patterns (concatenated)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per version (best is kept)")
+    args = parser.parse_args(argv)
+
+    paths = sorted(p for pattern in args.raw for p in glob.glob(pattern))
+    if not paths:
+        parser.error(f"no raw files match {args.raw}")
+    raw = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+
+    results = {name: measure(fn, raw, args.repeat)
+               for name, fn in (("legacy", legacy_clean_trips), ("single-pass", clean_trips))}
+
+    print(f"{len(raw):,} raw rows from {len(paths)} file(s)")
+    for name, (seconds, peak, out) in results.items():
+        print(f"{name:>12}: {seconds * 1000:8.1f} ms, peak {peak / 1024 ** 2:7.1f} MiB, {len(out):,} rows")
+    (t0, m0, expected), (t1, m1, got) = results.values()
+    print(f"speedup x{t0 / t1:.2f}, peak memory x{m1 / m0:.2f}")
+
+    try:
+        pd.testing.assert_frame_equal(got, expected)
+    except AssertionError as err:
+        print(f"Outputs differ: {err}")
+        return 1
+    print("Outputs are identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
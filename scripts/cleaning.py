@@ -0,0 +1,182 @@
+# ==============================
+# Trip Cleaning Library
+# ==============================
+# The cleaning rules shared by preprocessing.py (one frame in memory) and
+# preprocessing_stream.py (chunks), as small functions over column arrays.
+#
+# clean_trips() keeps the in-memory script's results row for row, but
+# instead of materializing a filtered frame after every step it builds one
+# boolean mask (valid timestamps and stations, first occurrence, realistic
+# age, in-bounds coordinates) and applies it once. The coordinate bounds
+# are still sequential, each IQR taken on the rows the previous filters
+# keep, but as array operations on that mask.
+
+import numpy as np
+import pandas as pd
+
+
+CATEGORY_COLS = [
+    "start_station_id",
+    "start_station_name",
+    "end_station_id",
+    "end_station_name",
+    "user_type",
+    "member_gender",
+    "bike_share_for_all_trip",
+    "bike_id",
+]
+
+# Trips missing any of these are dropped
+STATION_COLS = ["start_station_name", "start_station_id", "end_station_id", "end_station_name"]
+
+# Filtered in this order; each IQR is computed on what the previous ones kept
+COORD_COLS = [
+    "start_station_latitude",
+    "end_station_latitude",
+    "start_station_longitude",
+    "end_station_longitude",
+]
+
+# Quantiles standing in for the quartiles of the IQR rule, and its fence factor
+COORD_QUANTILES = (0.05, 0.95)
+IQR_FENCE = 1.5
+
+CURRENT_YEAR = 2026
+AGE_RANGE = (15, 80)
+AGE_BINS = [14, 24, 34, 44, 54, 64, 80]
+AGE_LABELS = ["15-24", "25-34", "35-44", "45-54", "55-64", "65-80"]
+
+
+# ==============================
+# Steps
+# ==============================
+def parse_times(df):
+    """Parse start/end timestamps in place; malformed values become NaT."""
+    df["start_time"] = pd.to_datetime(df["start_time"], errors="coerce")
+    df["end_time"] = pd.to_datetime(df["end_time"], errors="coerce")
+
+
+def valid_rows(df):
+    """Mask of trips with both timestamps and every station column."""
+    rows = np.ones(len(df), dtype=bool)
+    for col in ["start_time", "end_time", *STATION_COLS]:
+        rows &= df[col].notna().to_numpy()
+    return rows
+
+
+def fill_missing(df, rows):
+    """
+    Fill missing genders with the mode and birth years with the median of
+    `rows`. Assigns whole columns: no chained in-place fillna on a view.
+    """
+    df["member_gender"] = df["member_gender"].fillna(df["member_gender"][rows].mode()[0])
+    df["member_birth_year"] = df["member_birth_year"].fillna(df["member_birth_year"][rows].median())
+
+
+def first_occurrences(df, rows):
+    """
+    Mask of `rows` that are not an exact copy of an earlier row in `rows`.
+    Rows are compared by a 64-bit hash first; only rows whose hash repeats
+    are compared in full, so hash collisions never drop a trip.
+    """
+    idx = np.flatnonzero(rows)
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()[idx]
+    repeated = pd.Series(hashes).duplicated(keep=False).to_numpy()
+    keep = np.zeros(len(df), dtype=bool)
+    keep[idx] = True
+    if repeated.any():
+        candidates = idx[repeated]
+        keep[candidates[df.iloc[candidates].duplicated().to_numpy()]] = False
+    return keep
+
+
+def age_in_range(birth_year, low=AGE_RANGE[0], high=AGE_RANGE[1]):
+    """Mask of riders aged `low`–`high` in CURRENT_YEAR."""
+    age = CURRENT_YEAR - np.asarray(birth_year, dtype=np.float64)
+    return (age >= low) & (age <= high)
+
+
+def coordinate_bounds(df, mask, cols=COORD_COLS):
+    """
+    IQR bounds of each coordinate column over the rows of `mask`, after
+    dropping zero coordinates; each column's bounds are taken on the rows
+    the previous columns keep. Returns the bounds and the narrowed mask.
+    """
+    mask = mask.copy()
+    bounds = {}
+    for col in cols:
+        values = df[col].to_numpy(np.float64)
+        mask &= values != 0
+        q1, q3 = pd.Series(values[mask]).quantile(list(COORD_QUANTILES))
+        iqr = q3 - q1
+        bounds[col] = (q1 - IQR_FENCE * iqr, q3 + IQR_FENCE * iqr)
+        mask &= (values >= bounds[col][0]) & (values <= bounds[col][1])
+    return bounds, mask
+
+
+def categorize(df, cols, rows):
+    """
+    Convert `cols` to categories in place, labelled like `astype("category")`
+    on `rows` alone: the sorted values found there. Values only found
+    outside `rows` become missing. One factorize per column, no rehashing.
+    """
+    for col in cols:
+        codes, uniques = pd.factorize(df[col])
+        present = np.zeros(len(uniques), dtype=bool)
+        found = codes[rows]
+        present[found[found >= 0]] = True
+        ids = np.flatnonzero(present)
+        labels = pd.Index(uniques).take(ids)
+        order = labels.argsort()
+        remap = np.full(len(uniques) + 1, -1, dtype=np.int64)   # last slot: missing (-1)
+        remap[ids[order]] = np.arange(len(ids))
+        dtype = pd.CategoricalDtype(labels.take(order))
+        df[col] = pd.Categorical.from_codes(remap[codes], dtype=dtype)
+
+
+def plot_boxplots(df, num_cols):
+    """Horizontal boxplot per numerical column (EDA only)."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(14, 10))
+
+    for i, col in enumerate(num_cols):
+        plt.subplot(3, 3, i+1)
+        sns.boxplot(df[col], orient='h')  # Horizontal boxplot
+        plt.title(col)
+
+    plt.tight_layout()
+    plt.show()
+
+
+# ==============================
+# Single-Pass Cleaning
+# ==============================
+def clean_trips(df, show_plots=False):
+    """
+    Clean one raw frame: timestamps, missing values, dedupe, age and
+    coordinate outliers. `show_plots` opts in to the EDA boxplots before
+    and after the outlier filters (they block until closed).
+    """
+    parse_times(df)
+    rows = valid_rows(df)
+    # Weekend flag (1 = Saturday/Sunday); start_time and end_time stay for the dashboard
+    df["weekend_flag"] = df["start_time"].dt.dayofweek.isin([5, 6]).astype(int)
+    fill_missing(df, rows)
+    categorize(df, CATEGORY_COLS, rows)
+
+    mask = first_occurrences(df, rows)
+    if show_plots:
+        num_cols = [c for c in df.select_dtypes("number").columns if c not in CATEGORY_COLS]
+        plot_boxplots(df[mask], num_cols)
+
+    mask &= age_in_range(df["member_birth_year"])
+    _, mask = coordinate_bounds(df, mask)
+
+    df = df.take(np.flatnonzero(mask))
+    df["age"] = CURRENT_YEAR - df["member_birth_year"]
+
+    if show_plots:
+        plot_boxplots(df, num_cols)
+    return df
@@ -0,0 +1,141 @@
+# ==============================
+# Query Backend Parity Check
+# ==============================
+# Runs every filter state of the sidebar (each dropdown combination crossed
+# with the benchmark's hour ranges) through every query backend and checks
+# that they return the same KPI texts and the same chart data: the summary
+# charts, station map and ranking, flows, balance and trips over time.
+#
+# The in-memory backends (cube, index) are built from the loaded trips; the
+# out-of-core backend (duckdb) only from the aggregates its SQL returns.
+# The station, flow and timeline views are always rebuilt from each
+# backend's own aggregates, never taken from the saved files.
+#
+# Usage:
+#   python scripts/parity.py
+#   python scripts/parity.py --data-dir /tmp/bench/1000000/processed --backends cube duckdb
+#
+# Exits with status 1 when any backend differs from the first one.
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DASHBOARD_DIR = os.path.join(SCRIPTS_DIR, "..", "dashboard")
+
+BACKENDS = ["cube", "index", "duckdb"]
+
+# Floats are summed in a different order by each backend
+RTOL = 1e-9
+
+
+# ==============================
+# Backends
+# ==============================
+def build_backend(name, df):
+    """(engine, station index, flow matrix, rollups) of backend `name`."""
+    import callbacks
+    from flows import FlowMatrix
+    from stations import StationIndex
+    from timeseries import Rollups
+
+    if name in callbacks.OUT_OF_CORE:
+        engine = callbacks.ENGINES[name]()
+        return (engine, StationIndex.from_aggregates(engine.station_aggregates()),
+                FlowMatrix.from_aggregates(engine.flow_aggregates()),
+                Rollups.from_aggregates(engine.rollup_aggregates()))
+    return (callbacks.ENGINES[name](df), StationIndex.from_frame(df), FlowMatrix.from_frame(df),
+            Rollups.from_frame(df))
+
+
+def outputs(backend, filters, windows):
+    """Chart id (or 'kpis') → the data the dashboard draws for `filters`."""
+    from callbacks import CHARTS, SUMMARY_CHARTS, kpi_texts
+    from stations import METRICS
+
+    engine, station_index, flows, rollups = backend
+    summary = engine.summarize(*filters)
+    stats = station_index.stats(*filters)
+    top, balance = flows.views(*filters)
+
+    out = {"kpis": kpi_texts(summary)}
+    for chart_id in SUMMARY_CHARTS:
+        out[chart_id] = CHARTS[chart_id][0](summary)
+    out["station-map-chart"] = CHARTS["station-map-chart"][0](stats)
+    for metric in METRICS:
+        out[f"station-ranking-chart/{metric}"] = CHARTS["station-ranking-chart"][0](
+            station_index.top_k(stats, metric))
+    out["flows-chart"] = CHARTS["flows-chart"][0](top)
+    out["balance-chart"] = CHARTS["balance-chart"][0](balance)
+    for start, end in windows:
+        out[f"timeline-chart/{start}-{end}"] = CHARTS["timeline-chart"][0](
+            rollups.series(*filters, start, end))
+    return out
+
+
+def same(a, b):
+    """Equal data: labels and counts exactly, floats to RTOL."""
+    if isinstance(a, (tuple, list)) and isinstance(b, (tuple, list)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        if a.shape != b.shape:
+            return False
+        if a.dtype.kind == "f" or b.dtype.kind == "f":
+            return bool(np.allclose(a, b, rtol=RTOL, atol=0, equal_nan=True))
+        return bool(np.array_equal(a, b))
+    return a == b
+
+
+# ==============================
+# Main
+# ==============================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that every query backend returns the same dashboard data.")
+    parser.add_argument("--data-dir", help="processed directory (default: the dashboard's)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--show", type=int, default=10, help="differences to print")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        os.environ["GOBIKE_DATA_DIR"] = os.path.abspath(args.data_dir)
+    os.environ["GOBIKE_WARMUP"] = "0"
+    sys.path.insert(0, DASHBOARD_DIR)
+    from benchmark import filter_matrix
+    from components.filters import filter_space
+    from data import trips
+
+    _, df = trips.get()
+    backends = {name: build_backend(name, df) for name in args.backends}
+    rollups = backends[args.backends[0]][3]
+    day = 86400
+    # The whole range, its first day and its first week
+    windows = [(None, None), (rollups.first, rollups.first + day), (rollups.first, rollups.first + 7 * day)]
+
+    matrix = filter_matrix(filter_space())
+    reference, *others = args.backends
+    differences = 0
+    for filters in matrix:
+        filters = tuple(filters)
+        expected = outputs(backends[reference], filters, windows)
+        for name in others:
+            got = outputs(backends[name], filters, windows)
+            for key, value in expected.items():
+                if not same(value, got[key]):
+                    differences += 1
+                    if differences <= args.show:
+                        print(f"{name} != {reference} on {key} for {filters}:\n"
+                              f"  {reference}: {value}\n  {name}: {got[key]}")
+
+    checks = len(matrix) * len(others) * len(expected)
+    print(f"{len(df):,} trips, {len(matrix)} filter states, backends {', '.join(args.backends)}: "
+          f"{differences} of {checks} outputs differ")
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,248 +1,426 @@
 # ==============================
 # Import Libraries
 # ==============================
+import argparse
+import glob
+import hashlib
+import json
+import os
+import pickle
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
 
+# matplotlib/seaborn (EDA plots) and sklearn (encoding, scaling) are
+# imported inside the functions that use them: most runs need neither
 
-# ==============================
-# Load Dataset
-# ==============================
-df = pd.read_csv("data/raw/fordgobike-tripdataFor201902.csv")
-df  # Display dataset
+try:
+    from cleaning import clean_trips
+    from preprocessing_stream import estimate_chunksize, sketch_files, write_files
+except ImportError:  # imported as scripts.preprocessing from the project root
+    from scripts.cleaning import clean_trips
+    from scripts.preprocessing_stream import estimate_chunksize, sketch_files, write_files
 
+# The output schema, flow matrix, station index, time rollups and samples are shared with the dashboard
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dashboard"))
+import approx  # noqa: E402
+import flows  # noqa: E402
+import schema  # noqa: E402
+import stations  # noqa: E402
+import timeseries  # noqa: E402
 
-# ==============================
-# Check Missing Values
-# ==============================
-df_nulls = df.isnull().sum()  # Count nulls per column
-ratio = df_nulls / df.shape[0]  # Calculate null ratio
-
-# Create summary table for missing values
-pd.DataFrame({"null": df_nulls, "Ratio": ratio}).T
-
-
-# ==============================
-# Descriptive Statistics
-# ==============================
-df.describe().T  # Statistical summary for numerical columns
-
-
-# ==============================
-# Feature Engineering - Time & Weekend Flag
-# ==============================
-# errors='coerce' converts any malformed timestamps to NaT instead of crashing
-df['start_time'] = pd.to_datetime(df['start_time'], errors='coerce')
-df['end_time'] = pd.to_datetime(df['end_time'], errors='coerce')
-
-# Drop rows where timestamp couldn't be parsed
-df.dropna(subset=['start_time', 'end_time'], inplace=True)
-
-# Create weekend flag (1 = Saturday/Sunday, 0 = weekday)
-df['weekend_flag'] = df['start_time'].dt.dayofweek.isin([5, 6]).astype(int)
-
-# We keep start_time and end_time because the dashboard needs them for time series analysis!
-
-# ==============================
-# Handle Missing Values
-# ==============================
 
-# Drop rows with missing station data (critical columns)
-df.dropna(subset="start_station_name", inplace=True)
-df.dropna(subset="start_station_id", inplace=True)
-df.dropna(subset="end_station_id", inplace=True)
-df.dropna(subset="end_station_name", inplace=True)
+# Pipeline usage (all raw monthly files, one partition per file, all cores):
+#   python scripts/preprocessing.py "data/raw/*.csv" --workers 8
+# Original single-frame run, with the EDA boxplots:
+#   python scripts/preprocessing.py data/raw/fordgobike-tripdataFor201902.csv --in-memory --plots
 
-# Fill missing gender with most frequent value (mode)
-df["member_gender"].fillna(df["member_gender"].mode()[0], inplace=True)
+RAW_GLOB = "data/raw/*.csv"
+OUTPUT_DIR = "data/processed/trips"
+FEATURES_NAME = "features"   # training features: a sibling of the output directory
+CSV_EXPORT = "data/processed/cleaned_fordgobike_data.csv"
+MANIFEST = "_manifest.json"
+SKETCH_DIR = "_sketches"
+AGGREGATE_BATCH_ROWS = 1_000_000
 
-# Fill missing birth year with median value
-df["member_birth_year"].fillna(df["member_birth_year"].median(), inplace=True)
 
-df.head()
-
-
-# ==============================
-# Check Data Types & Unique Values
-# ==============================
-def check_datatype(df):
-    datatypes = df.dtypes  # Column data types
-    n_unique = df.nunique()  # Number of unique values
-
-    return pd.DataFrame({
-        "Data type": datatypes,
-        "Num_unique": n_unique
-    }).T
-
-check_datatype(df)
-
-
-# ==============================
-# Convert Columns to Category
-# ==============================
-def handle_datatype(df, cols):
-    df[cols] = df[cols].astype("category")
-
-handle_datatype(df, [
-    "start_station_id",
-    "start_station_name",
-    "end_station_id",
-    "end_station_name",
-    "user_type",
-    "member_gender",
-    "bike_share_for_all_trip",
-    "bike_id"
-])
-
-check_datatype(df)
-
-
-# ==============================
-# Select Numerical Columns
-# ==============================
-num_cols = df.select_dtypes('number').columns
-num_cols.value_counts()
-
-
-# ==============================
-# Check & Remove Duplicates
-# ==============================
-df.duplicated().sum()  # Count duplicates
+#--------------------------------------------------------------------------------------------------------
+#Feature Engineering & EDA Coding
+def add_features(df):
+    """Create new columns (Duration mins, Age groups), then encode/scale."""
+    df["duration_mins"] = (df["duration_sec"] / 60).round()
+    df.drop(columns = ['duration_sec'], inplace= True)
 
-df.drop_duplicates(inplace=True)
+    bins = [14, 24, 34, 44, 54, 64, 80]
+    labels = ["15-24", "25-34", "35-44", "45-54", "55-64", "65-80"]
+    df["age_group"] = pd.cut(df["age"], bins=bins, labels=labels)
 
-df.duplicated().sum()  # Confirm removal
+    #---------------------------------------------------------------------------
+    #Encode/Scale categorical data
 
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
 
-# ==============================
-# Visualize Outliers Using Boxplots
-# ==============================
-plt.figure(figsize=(14, 10))
+    Encoder = LabelEncoder()
+    df["member_gender_encoded"] = Encoder.fit_transform(df["member_gender"])
+    df["user_type_encoded"] = Encoder.fit_transform(df["user_type"])
 
-for i, col in enumerate(num_cols):
-    plt.subplot(3, 3, i+1)
-    sns.boxplot(df[col], orient='h')  # Horizontal boxplot
-    plt.title(col)
+    Scaler = StandardScaler()
+    df[["duration_mins_scaled", "age_scaled"]] = Scaler.fit_transform(df[["duration_mins", "age"]])
+    return df
 
-plt.tight_layout()
-plt.show()
 
 # ==============================
-# Feature Engineering - Create Age
+# Compact Dtypes for Storage
 # ==============================
-df['age'] = 2026 - df['member_birth_year']
-
-# Keep realistic age range only
-df = df[(df['age'] >= 15) & (df['age'] <= 80)]
+def compact_dtypes(df):
+    """
+    Stations, user type and gender are already categories; ages, hours and
+    encodings fit in small integers, which keeps the columnar file compact.
+    """
+    df["start_hour"] = df["start_time"].dt.hour.astype("int8")
+    df["day_of_week"] = df["start_time"].dt.dayofweek.astype("int8")
+    df["age"] = df["age"].astype("int8")
+    df["member_birth_year"] = df["member_birth_year"].astype("int16")
+    df["member_gender_encoded"] = df["member_gender_encoded"].astype("int8")
+    df["user_type_encoded"] = df["user_type_encoded"].astype("int8")
+    return df
+
+
+def process_in_memory(raw_path, show_plots=False):
+    """The original single-frame pipeline for one raw file."""
+    df = pd.read_csv(raw_path)
+    df = clean_trips(df, show_plots=show_plots)
+    df = add_features(df)
+    return compact_dtypes(df)
+
+
+def write_split(df, serving_path, features_path):
+    """Write `df` as a serving partition and a features partition (dashboard/schema.py)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for path, part in zip((serving_path, features_path), schema.split_serving(df)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        pq.write_table(schema.stamp(pa.Table.from_pandas(part, preserve_index=False)), path)
 
 
 # ==============================
-# Remove Zero Coordinates
+# Parallel Partitioned Pipeline
 # ==============================
-df = df[df['start_station_latitude'] != 0]
-
-# IQR Outlier Removal (Using 5% and 95% Quantiles)
-Q1 = df['start_station_latitude'].quantile(0.05)
-Q3 = df['start_station_latitude'].quantile(0.95)
-IQR = Q3 - Q1
-
-lower = Q1 - 1.5 * IQR
-upper = Q3 + 1.5 * IQR
-
-df = df[(df['start_station_latitude'] >= lower) & 
-        (df['start_station_latitude'] <= upper)]
-
-
-# Repeat Same Process for End Latitude
-df = df[df['end_station_latitude'] != 0]
-
-Q1 = df['end_station_latitude'].quantile(0.05)
-Q3 = df['end_station_latitude'].quantile(0.95)
-IQR = Q3 - Q1
-
-lower = Q1 - 1.5 * IQR
-upper = Q3 + 1.5 * IQR
-
-df = df[(df['end_station_latitude'] >= lower) & 
-        (df['end_station_latitude'] <= upper)]
-
-
-# Repeat for Start Longitude
-df = df[df['start_station_longitude'] != 0]
-
-Q1 = df['start_station_longitude'].quantile(0.05)
-Q3 = df['start_station_longitude'].quantile(0.95)
-IQR = Q3 - Q1
-
-lower = Q1 - 1.5 * IQR
-upper = Q3 + 1.5 * IQR
-
-df = df[(df['start_station_longitude'] >= lower) & 
-        (df['start_station_longitude'] <= upper)]
-
-
-# Repeat for End Longitude
-df = df[df['end_station_longitude'] != 0]
-
-Q1 = df['end_station_longitude'].quantile(0.05)
-Q3 = df['end_station_longitude'].quantile(0.95)
-IQR = Q3 - Q1
-
-lower = Q1 - 1.5 * IQR
-upper = Q3 + 1.5 * IQR
-
-df = df[(df['end_station_longitude'] >= lower) & 
-        (df['end_station_longitude'] <= upper)]
+def partition_path(raw_path, output_dir):
+    """One Parquet partition per raw monthly file."""
+    stem = os.path.splitext(os.path.basename(raw_path))[0]
+    return os.path.join(output_dir, f"part-{stem}.parquet")
+
+
+def features_dir(output_dir):
+    """Directory of the training-feature partitions, next to `output_dir`."""
+    return os.path.join(os.path.dirname(os.path.normpath(output_dir)), FEATURES_NAME)
+
+
+def _sketch_partition(raw_path, max_memory_mb):
+    return sketch_files([raw_path], estimate_chunksize(raw_path, max_memory_mb))
+
+
+def _write_partition(raw_path, stats, output_dir, max_memory_mb):
+    chunksize = estimate_chunksize(raw_path, max_memory_mb)
+    return write_files([raw_path], stats, partition_path(raw_path, output_dir), chunksize,
+                       features_path=partition_path(raw_path, features_dir(output_dir)))
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 of a raw file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    """Raw files already ingested into `output_dir` and the stats they used."""
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"files": {}, "stats": None}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_manifest(output_dir, manifest):
+    tmp = os.path.join(output_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(tmp, os.path.join(output_dir, MANIFEST))
+
+
+def _sketch_path(raw_path, output_dir):
+    stem = os.path.splitext(os.path.basename(raw_path))[0]
+    return os.path.join(output_dir, SKETCH_DIR, f"{stem}.pkl")
+
+
+def _aggregates_path(raw_path, output_dir):
+    stem = os.path.splitext(os.path.basename(raw_path))[0]
+    return os.path.join(output_dir, SKETCH_DIR, f"{stem}.aggregates.pkl")
+
+
+def stats_drift(old, new, tolerance):
+    """
+    Reasons the global statistics moved too far for old partitions to stay.
+    Numbers may move by `tolerance` (relative; coordinate bounds relative to
+    their range). Gender mode and encoder classes must match exactly.
+    """
+    reasons = []
+    for key in ("gender_mode", "gender_classes", "user_type_classes"):
+        if old[key] != new[key]:
+            reasons.append(f"{key} changed")
+    if abs(new["birth_median"] - old["birth_median"]) > tolerance * abs(old["birth_median"]):
+        reasons.append("birth_median moved")
+    for col, (lower, upper) in old["coord_bounds"].items():
+        width = upper - lower
+        new_lower, new_upper = new["coord_bounds"][col]
+        if max(abs(new_lower - lower), abs(new_upper - upper)) > tolerance * width:
+            reasons.append(f"{col} bounds moved")
+    for col, (mean, std) in old["scale"].items():
+        new_mean, new_std = new["scale"][col]
+        if abs(new_mean - mean) > tolerance * std or abs(new_std - std) > tolerance * std:
+            reasons.append(f"{col} scaling moved")
+    return reasons
+
+
+def run_pipeline(raw_paths, output_dir=OUTPUT_DIR, workers=None, max_memory_mb=4096,
+                 tolerance=0.01, full=False):
+    """
+    Clean `raw_paths` across a process pool, one partition per file.
+
+    Each worker sketches its file (pass 1); the sketches are merged so the
+    IQR bounds, birth-year median, gender mode, category labels and scaler
+    moments are global, then each worker writes its partition (pass 2).
+    Duplicate rows are removed within a file, not across files.
+    `max_memory_mb` is the total budget, shared between the workers.
+
+    Runs are incremental: a manifest records each ingested file's size and
+    content hash, and per-file sketches are kept next to the partitions.
+    Only new or changed files are processed, using the statistics of the
+    previous run, unless merging them shifts those statistics past
+    `tolerance` (see `stats_drift`) or the partitions were written with
+    another schema version; then every partition is rebuilt.
+    The flow matrix, station index, time rollups and samples are rebuilt
+    whenever a partition was written, from per-partition aggregates cached
+    next to the sketches: only the partitions just written are read again
+    (see `write_aggregates`).
+    """
+    workers = workers or os.cpu_count() or 1
+    per_worker = max(max_memory_mb // workers, 64)
+    manifest = {"files": {}, "stats": None} if full else load_manifest(output_dir)
+    stale_schema = manifest["stats"] is not None and manifest.get("schema") != schema.SCHEMA_VERSION
+
+    files, todo = {}, []
+    for path in raw_paths:
+        entry = {"size": os.path.getsize(path), "sha256": file_digest(path),
+                 "partition": os.path.basename(partition_path(path, output_dir))}
+        old = manifest["files"].get(path)
+        if (old is None or old["size"] != entry["size"] or old["sha256"] != entry["sha256"]
+                or not os.path.exists(_sketch_path(path, output_dir))):
+            todo.append(path)
+        files[path] = entry
+    removed = [path for path in manifest["files"] if path not in files]
+    if not todo and not removed and manifest["stats"] is not None and not stale_schema:
+        if not all(os.path.exists(os.path.join(output_dir, name))
+                   for name in (flows.FLOWS_FILE, stations.STATIONS_FILE, timeseries.ROLLUPS_FILE,
+                                 approx.SAMPLES_FILE)):
+            with ProcessPoolExecutor(max_workers=max(min(workers, len(raw_paths)), 1)) as pool:
+                write_aggregates(output_dir, pool, files)
+        return {}, manifest["stats"]
+
+    os.makedirs(os.path.join(output_dir, SKETCH_DIR), exist_ok=True)
+    with ProcessPoolExecutor(max_workers=max(min(workers, len(raw_paths)), 1)) as pool:
+        for path, sketch in zip(todo, pool.map(_sketch_partition, todo, [per_worker] * len(todo))):
+            with open(_sketch_path(path, output_dir), "wb") as fh:
+                pickle.dump(sketch, fh)
+        sketch = None
+        for path in raw_paths:
+            with open(_sketch_path(path, output_dir), "rb") as fh:
+                part = pickle.load(fh)
+            sketch = part if sketch is None else sketch.merge(part)
+        stats = sketch.resolve()
+
+        old_stats = manifest["stats"]
+        reasons = ["no previous run"] if old_stats is None else stats_drift(old_stats, stats, tolerance)
+        if stale_schema:
+            reasons.append("schema changed")
+        if reasons:
+            print("Full rebuild: " + ", ".join(reasons))
+            clear_partitions(output_dir)
+            write = list(raw_paths)
+        else:
+            # Keep the old statistics; only widen the category labels
+            for col, labels in stats["categories"].items():
+                old_stats["categories"][col] = sorted(set(old_stats["categories"][col]) | set(labels))
+            stats = old_stats
+            write = todo
+        for path in removed:
+            name = manifest["files"][path]["partition"]
+            for stale in (os.path.join(output_dir, name), os.path.join(features_dir(output_dir), name),
+                          _sketch_path(path, output_dir), _aggregates_path(path, output_dir)):
+                if os.path.exists(stale):
+                    os.remove(stale)
+
+        n = len(write)
+        rows = list(pool.map(_write_partition, write, [stats] * n, [output_dir] * n, [per_worker] * n))
+        write_aggregates(output_dir, pool, files)
+
+    for path, count in zip(write, rows):
+        files[path]["rows"] = count
+    for path in files:
+        files[path].setdefault("rows", manifest["files"].get(path, {}).get("rows"))
+    save_manifest(output_dir, {"files": files, "stats": stats, "schema": schema.SCHEMA_VERSION})
+    return dict(zip(write, rows)), stats
 
 
 # ==============================
-# Visualize After Cleaning
+# Flow Matrix, Station Index, Time Rollups & Samples
 # ==============================
-plt.figure(figsize=(14, 10))
-
-for i, col in enumerate(num_cols):
-    plt.subplot(3, 3, i+1)
-    sns.boxplot(df[col], orient='h')
-    plt.title(col)
-
-plt.tight_layout()
-plt.show()
-
-
-df.head()
-
-import os
-if not os.path.exists('data/processed'):
-    os.makedirs('data/processed')
-
-df.to_csv("data/processed/cleaned_fordgobike_data.csv", index=False)
-
-#--------------------------------------------------------------------------------------------------------
-#Feature Engineering & EDA Coding
-#Create new columns (Duration mins, Age groups)
-
-df = pd.read_csv("data/processed/cleaned_fordgobike_data.csv")
-
-df["duration_mins"] = (df["duration_sec"] / 60).round()
-df.drop(columns = ['duration_sec'], inplace= True)
-
-bins = [14, 24, 34, 44, 54, 64, 80]
-labels = ["15-24", "25-34", "35-44", "45-54", "55-64", "65-80"]
-df["age_group"] = pd.cut(df["age"], bins=bins, labels=labels)
-
-#---------------------------------------------------------------------------
-#Encode/Scale categorical data
-
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-
-Encoder = LabelEncoder()
-df["member_gender_encoded"] = Encoder.fit_transform(df["member_gender"])
-df["user_type_encoded"] = Encoder.fit_transform(df["user_type"])
-
-Scaler = StandardScaler()
-df[["duration_mins_scaled", "age_scaled"]] = Scaler.fit_transform(df[["duration_mins", "age"]])
-
-df.to_csv("data/processed/cleaned_fordgobike_data.csv", index=False)
\ No newline at end of file
+def _partition_aggregates(path):
+    """
+    Flow, station, time-rollup and sample aggregates of one partition, read
+    AGGREGATE_BATCH_ROWS rows at a time. The sample is seeded by the
+    partition's name, so a rebuild draws the same trips.
+    """
+    import pyarrow.parquet as pq
+
+    columns = list(dict.fromkeys(flows.FLOW_COLUMNS + stations.STATION_COLUMNS + timeseries.ROLLUP_COLUMNS
+                                 + approx.SAMPLE_COLUMNS))
+    rng = np.random.default_rng(zlib.crc32(os.path.basename(path).encode()))
+    flow_parts, station_parts, rollup_parts, sample_parts = [], [], [], []
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=AGGREGATE_BATCH_ROWS, columns=columns):
+        df = batch.to_pandas()
+        flow_parts.append(flows.aggregate_trips(df))
+        station_parts.append(stations.aggregate_trips(df))
+        rollup_parts.append(timeseries.aggregate_trips(df))
+        sample_parts.append(approx.aggregate_trips(df, rng))
+    return (flows.merge_aggregates(flow_parts), stations.merge_aggregates(station_parts),
+            timeseries.merge_aggregates(rollup_parts), approx.merge_aggregates(sample_parts))
+
+
+def _aggregates_key(entry, path):
+    """A manifest entry and the identity of the partition written from it."""
+    st = os.stat(path)
+    return entry["sha256"], st.st_size, st.st_mtime_ns
+
+
+def _load_aggregates(cache, key):
+    """The aggregates cached in `cache` when they were made for `key`, else None."""
+    try:
+        with open(cache, "rb") as fh:
+            cached_key, aggregated = pickle.load(fh)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    return aggregated if cached_key == key else None
+
+
+def write_aggregates(output_dir, pool=None, files=None):
+    """
+    Save the origin–destination matrix (dashboard/flows.py), the station
+    index (dashboard/stations.py), the time rollups
+    (dashboard/timeseries.py) and the stratified samples
+    (dashboard/approx.py) of every partition in `output_dir` next to the
+    partitions. Partitions are aggregated in `pool` when given.
+
+    With `files` (the manifest's raw path → entry), each partition's
+    aggregates are cached next to its sketch, keyed by its entry and the
+    partition file, so only partitions written since are read again.
+    """
+    if files is None:
+        sources = [(path, None, None) for path in glob.glob(os.path.join(output_dir, "part-*.parquet"))]
+    else:
+        sources = [(partition_path(raw, output_dir), _aggregates_path(raw, output_dir), entry)
+                   for raw, entry in files.items()]
+        sources = [source for source in sources if os.path.exists(source[0])]
+    if not sources:
+        return
+    sources.sort()
+
+    parts = [cache and _load_aggregates(cache, _aggregates_key(entry, path)) for path, cache, entry in sources]
+    todo = [i for i, part in enumerate(parts) if part is None]
+    computed = (pool.map if pool else map)(_partition_aggregates, [sources[i][0] for i in todo])
+    for i, aggregated in zip(todo, computed):
+        parts[i] = aggregated
+        path, cache, entry = sources[i]
+        if cache:
+            with open(f"{cache}.tmp", "wb") as fh:
+                pickle.dump((_aggregates_key(entry, path), aggregated), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{cache}.tmp", cache)
+
+    flow_parts, station_parts, rollup_parts, sample_parts = zip(*parts)
+    flows.FlowMatrix.from_aggregates(flows.merge_aggregates(flow_parts)).save(
+        os.path.join(output_dir, flows.FLOWS_FILE))
+    stations.StationIndex.from_aggregates(stations.merge_aggregates(station_parts)).save(
+        os.path.join(output_dir, stations.STATIONS_FILE))
+    timeseries.Rollups.from_aggregates(timeseries.merge_aggregates(rollup_parts)).save(
+        os.path.join(output_dir, timeseries.ROLLUPS_FILE))
+    approx.TripSample.from_aggregates(approx.merge_aggregates(sample_parts)).save(
+        os.path.join(output_dir, approx.SAMPLES_FILE))
+
+
+def clear_partitions(output_dir):
+    """Remove the partitions and feature partitions of a previous run (sketches are kept)."""
+    for directory in (output_dir, features_dir(output_dir)):
+        for path in glob.glob(os.path.join(directory, "part-*.parquet")):
+            os.remove(path)
+
+
+def export_csv(output_dir, csv_path=CSV_EXPORT):
+    """Concatenate the partitions into the optional CSV export."""
+    for i, path in enumerate(sorted(glob.glob(os.path.join(output_dir, "part-*.parquet")))):
+        pd.read_parquet(path).to_csv(csv_path, mode="a" if i else "w", header=not i, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ford GoBike preprocessing pipeline")
+    parser.add_argument("raw", nargs="*", default=[RAW_GLOB],
+                        help="raw monthly CSV files or glob patterns")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="partitioned Parquet output directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--max-memory-mb", type=int, default=4096,
+                        help="approximate total memory budget shared by the workers")
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild every partition instead of only new/changed files")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="relative drift of the global statistics allowed before a full rebuild")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="run the original single-frame pipeline on one file")
+    parser.add_argument("--plots", action="store_true", help="show the EDA boxplots (--in-memory)")
+    parser.add_argument("--csv", action="store_true", help="also export a CSV copy")
+    args = parser.parse_args(argv)
+
+    paths = sorted(p for pattern in args.raw for p in glob.glob(pattern))
+    if not paths:
+        parser.error(f"no raw files match {args.raw}")
+
+    if args.in_memory:
+        if len(paths) != 1:
+            parser.error("--in-memory takes exactly one raw file")
+        clear_partitions(args.output)
+        os.makedirs(args.output, exist_ok=True)
+        if os.path.exists(os.path.join(args.output, MANIFEST)):
+            # The next pipeline run must not trust a manifest for these partitions
+            os.remove(os.path.join(args.output, MANIFEST))
+        df = process_in_memory(paths[0], show_plots=args.plots)
+        write_split(df, partition_path(paths[0], args.output),
+                    partition_path(paths[0], features_dir(args.output)))
+        write_aggregates(args.output)
+        print(f"Wrote {len(df):,} rows to {args.output}")
+    else:
+        rows, _ = run_pipeline(paths, args.output, args.workers, args.max_memory_mb,
+                               args.tolerance, args.full)
+        print(f"Wrote {sum(rows.values()):,} rows from {len(rows)} of {len(paths)} files to {args.output}")
+
+    if args.csv:
+        export_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+# ==============================
+# Streaming Preprocessing (Bounded Memory)
+# ==============================
+# Same cleaning and feature engineering as preprocessing.py, but over any
+# number of monthly raw CSVs read in chunks, so a full year of trips fits
+# on a small machine. It works in two passes:
+#
+#   Pass 1 reads every chunk once and keeps only compact statistics: value
+#          counts for the gender mode and birth-year median, the category
+#          labels, and a weighted histogram of the station coordinates
+#          (plus duration/age sums) for the rows that survive deduplication.
+#          Replaying the four IQR filters on that histogram gives the same
+#          bounds the in-memory script computes on the full frame.
+#   Pass 2 re-reads the chunks, applies the resolved filters and features
+#          and appends each chunk to the Parquet output: the columns the
+#          dashboard serves, in compact dtypes, to the output file and the
+#          training-only features to `<output>_features.parquet`.
+#
+# The coordinate histogram is exact while the number of distinct station
+# pairs stays under `max_sketch_keys`; past that its coordinates are rounded
+# and the bounds become approximate.
+#
+# Usage:
+#   python scripts/preprocessing_stream.py "data/raw/*.csv" --max-memory-mb 512
+
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Cleaning rules shared with the in-memory script
+try:
+    from cleaning import (AGE_BINS, AGE_LABELS, AGE_RANGE, CATEGORY_COLS, COORD_COLS, CURRENT_YEAR,
+                          STATION_COLS, parse_times)
+except ImportError:  # imported as scripts.preprocessing_stream from the project root
+    from scripts.cleaning import (AGE_BINS, AGE_LABELS, AGE_RANGE, CATEGORY_COLS, COORD_COLS,
+                                  CURRENT_YEAR, STATION_COLS, parse_times)
+
+# The output schema is shared with the dashboard's loaders
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dashboard"))
+import schema  # noqa: E402
+
+
+RAW_DTYPES = {
+    "duration_sec": "int64",
+    "start_time": "object",
+    "end_time": "object",
+    "start_station_id": "float64",
+    "start_station_name": "object",
+    "start_station_latitude": "float64",
+    "start_station_longitude": "float64",
+    "end_station_id": "float64",
+    "end_station_name": "object",
+    "end_station_latitude": "float64",
+    "end_station_longitude": "float64",
+    "bike_id": "int64",
+    "user_type": "object",
+    "member_birth_year": "float64",
+    "member_gender": "object",
+    "bike_share_for_all_trip": "object",
+}
+
+# Rough working-set multiplier over the parsed chunk (copies made while filtering)
+_WORKING_SET_FACTOR = 4
+
+
+# ==============================
+# Chunk Reading
+# ==============================
+def estimate_chunksize(path, max_memory_mb, sample_rows=2000):
+    """Rows per chunk that keep one chunk's working set under `max_memory_mb`."""
+    sample = pd.read_csv(path, nrows=sample_rows, dtype=RAW_DTYPES)
+    per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    return max(1000, int(max_memory_mb * 1024 ** 2 / (per_row * _WORKING_SET_FACTOR)))
+
+
+def iter_chunks(paths, chunksize):
+    """Yield raw chunks from every file in order, with a fixed schema."""
+    for path in paths:
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype=RAW_DTYPES):
+            yield chunk
+
+
+def base_clean(chunk):
+    """Timestamp parsing, weekend flag and station dropna (stat-free steps)."""
+    parse_times(chunk)
+    chunk = chunk.dropna(subset=["start_time", "end_time"])
+    chunk["weekend_flag"] = chunk["start_time"].dt.dayofweek.isin([5, 6]).astype(int)
+    return chunk.dropna(subset=STATION_COLS)
+
+
+class SeenHashes:
+    """
+    Global duplicate detector over 64-bit row hashes, kept as a few sorted
+    arrays that are merged log-structured style to keep lookups cheap.
+    """
+
+    def __init__(self):
+        self.levels = []
+
+    def _contains(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for level in self.levels:
+            pos = np.searchsorted(level, hashes).clip(max=len(level) - 1)
+            found |= level[pos] == hashes
+        return found
+
+    def first_seen(self, frame):
+        """Mask of rows in `frame` not seen in this or any earlier chunk."""
+        hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        keep = ~pd.Series(hashes).duplicated().to_numpy() & ~self._contains(hashes)
+        new = np.sort(hashes[keep])
+        while self.levels and len(self.levels[-1]) <= len(new):
+            new = np.union1d(self.levels.pop(), new)
+        self.levels.append(new)
+        return keep
+
+
+# ==============================
+# Pass 1 - Statistics Sketch
+# ==============================
+class StatsSketch:
+    """Mergeable pass-1 statistics; see the module header for the layout."""
+
+    KEY_COLS = COORD_COLS + ["age_status", "member_gender", "user_type"]
+
+    def __init__(self, max_sketch_keys=2_000_000):
+        self.max_sketch_keys = max_sketch_keys
+        self.decimals = None          # coordinate rounding once compacted
+        self.gender_counts = pd.Series(dtype="int64")
+        self.birth_counts = pd.Series(dtype="int64")
+        self.categories = {col: set() for col in CATEGORY_COLS}
+        self.hist = None
+
+    def update(self, chunk, seen):
+        """Fold one base-cleaned raw chunk into the sketch."""
+        # Mode / median are taken before deduplication, like the in-memory path
+        self.gender_counts = self.gender_counts.add(
+            chunk["member_gender"].value_counts(), fill_value=0)
+        self.birth_counts = self.birth_counts.add(
+            chunk["member_birth_year"].value_counts(), fill_value=0)
+        for col in CATEGORY_COLS:
+            self.categories[col].update(chunk[col].dropna().unique().tolist())
+
+        chunk = chunk[seen.first_seen(chunk)]
+
+        age = CURRENT_YEAR - chunk["member_birth_year"]
+        status = np.where(age.isna(), "missing",
+                          np.where(age.between(*AGE_RANGE), "in", "out"))
+        duration = (chunk["duration_sec"] / 60).round()
+        part = pd.DataFrame({
+            **{col: chunk[col] for col in COORD_COLS},
+            "age_status": status,
+            "member_gender": chunk["member_gender"].fillna("__missing__"),
+            "user_type": chunk["user_type"],
+            "n": 1,
+            "dur": duration,
+            "dur_sq": duration ** 2,
+            "age": age.fillna(0),
+            "age_sq": age.fillna(0) ** 2,
+        })
+        self._add(part)
+
+    def _add(self, part):
+        if self.decimals is not None:
+            part[COORD_COLS] = part[COORD_COLS].round(self.decimals)
+        if self.hist is not None:
+            part = pd.concat([self.hist, part], ignore_index=True)
+        self.hist = part.groupby(self.KEY_COLS, as_index=False, sort=False, dropna=False).sum()
+        while len(self.hist) > self.max_sketch_keys:
+            self.decimals = 5 if self.decimals is None else self.decimals - 1
+            hist, self.hist = self.hist, None
+            self._add(hist)
+
+    def merge(self, other):
+        """Combine with a sketch built over another partition of the data."""
+        self.gender_counts = self.gender_counts.add(other.gender_counts, fill_value=0)
+        self.birth_counts = self.birth_counts.add(other.birth_counts, fill_value=0)
+        for col in CATEGORY_COLS:
+            self.categories[col] |= other.categories[col]
+        if other.decimals is not None and (self.decimals is None or other.decimals < self.decimals):
+            self.decimals = other.decimals
+        if other.hist is not None:
+            self._add(other.hist.copy())
+        return self
+
+    def resolve(self):
+        """Turn the sketch into the global parameters pass 2 needs."""
+        return resolve_stats(self)
+
+
+def weighted_quantile(values, weights, q):
+    """
+    Linear-interpolated quantile of a weighted sample, computed exactly as
+    ``Series.quantile`` would on the expanded values.
+    """
+    order = np.argsort(values, kind="stable")
+    values, cum = values[order], np.cumsum(weights[order])
+    n = cum[-1]
+    q = np.true_divide(np.asarray(q) * 100, 100)
+    virtual = (n - 1) * q
+    lo = np.floor(virtual)
+    a = values[np.searchsorted(cum, lo, side="right")]
+    b = values[np.searchsorted(cum, min(lo + 1, n - 1), side="right")]
+    return float(np.quantile(np.array([a, b]), virtual - lo))
+
+
+def weighted_median(counts):
+    """Median of a value -> count table, matching ``Series.median``."""
+    counts = counts[counts > 0].sort_index()
+    cum = counts.cumsum().to_numpy()
+    n = cum[-1]
+    values = counts.index.to_numpy()
+    lo = values[np.searchsorted(cum, (n - 1) // 2, side="right")]
+    hi = values[np.searchsorted(cum, n // 2, side="right")]
+    return float(np.median([lo, hi]))
+
+
+def resolve_stats(sketch):
+    """Fill values, IQR bounds, encoder classes and scaler moments."""
+    counts = sketch.gender_counts[sketch.gender_counts > 0]
+    gender_mode = sorted(counts[counts == counts.max()].index)[0]
+    birth_median = weighted_median(sketch.birth_counts)
+
+    hist = sketch.hist.copy()
+    hist["member_gender"] = hist["member_gender"].replace("__missing__", gender_mode)
+    fill_age = CURRENT_YEAR - birth_median
+    missing = hist["age_status"] == "missing"
+    hist.loc[missing, "age"] = fill_age * hist.loc[missing, "n"]
+    hist.loc[missing, "age_sq"] = fill_age ** 2 * hist.loc[missing, "n"]
+    if AGE_RANGE[0] <= fill_age <= AGE_RANGE[1]:
+        hist.loc[missing, "age_status"] = "in"
+    hist = hist[hist["age_status"] == "in"]
+
+    bounds = {}
+    for col in COORD_COLS:
+        hist = hist[hist[col] != 0]
+        values, weights = hist[col].to_numpy(), hist["n"].to_numpy()
+        q1 = weighted_quantile(values, weights, 0.05)
+        q3 = weighted_quantile(values, weights, 0.95)
+        iqr = q3 - q1
+        bounds[col] = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+        hist = hist[(hist[col] >= bounds[col][0]) & (hist[col] <= bounds[col][1])]
+
+    n = hist["n"].sum()
+    scale = {}
+    for col, src in (("duration_mins", "dur"), ("age", "age")):
+        mean = hist[src].sum() / n
+        var = max(hist[f"{src}_sq"].sum() / n - mean ** 2, 0.0)
+        scale[col] = (float(mean), float(np.sqrt(var)) if var > 0 else 1.0)
+
+    return {
+        "gender_mode": gender_mode,
+        "birth_median": birth_median,
+        "coord_bounds": bounds,
+        "categories": {col: sorted(vals) for col, vals in sketch.categories.items()},
+        "gender_classes": sorted(hist["member_gender"].unique().tolist()),
+        "user_type_classes": sorted(hist["user_type"].unique().tolist()),
+        "scale": scale,
+        "exact": sketch.decimals is None,
+    }
+
+
+# ==============================
+# Pass 2 - Apply Filters & Features
+# ==============================
+def transform_chunk(chunk, stats, seen):
+    """Clean and feature-engineer one base-cleaned chunk with global stats."""
+    chunk["member_gender"] = chunk["member_gender"].fillna(stats["gender_mode"])
+    chunk["member_birth_year"] = chunk["member_birth_year"].fillna(stats["birth_median"])
+    for col in CATEGORY_COLS:
+        chunk[col] = pd.Categorical(chunk[col], categories=stats["categories"][col])
+
+    chunk = chunk[seen.first_seen(chunk)]
+
+    chunk = chunk.assign(age=CURRENT_YEAR - chunk["member_birth_year"])
+    mask = chunk["age"].between(*AGE_RANGE)
+    for col, (lower, upper) in stats["coord_bounds"].items():
+        mask &= (chunk[col] != 0) & (chunk[col] >= lower) & (chunk[col] <= upper)
+    chunk = chunk[mask]
+
+    chunk = chunk.assign(duration_mins=(chunk["duration_sec"] / 60).round())
+    chunk = chunk.drop(columns=["duration_sec"])
+    chunk["age_group"] = pd.cut(chunk["age"], bins=AGE_BINS, labels=AGE_LABELS)
+
+    # Same codes a LabelEncoder fitted on the whole dataset would assign
+    chunk["member_gender_encoded"] = np.searchsorted(
+        stats["gender_classes"], chunk["member_gender"].astype(object))
+    chunk["user_type_encoded"] = np.searchsorted(
+        stats["user_type_classes"], chunk["user_type"].astype(object))
+    for col in ("duration_mins", "age"):
+        mean, std = stats["scale"][col]
+        chunk[f"{col}_scaled"] = (chunk[col] - mean) / std
+
+    chunk["start_hour"] = chunk["start_time"].dt.hour.astype("int8")
+    chunk["day_of_week"] = chunk["start_time"].dt.dayofweek.astype("int8")
+    chunk["age"] = chunk["age"].astype("int8")
+    chunk["member_birth_year"] = chunk["member_birth_year"].astype("int16")
+    chunk["member_gender_encoded"] = chunk["member_gender_encoded"].astype("int8")
+    chunk["user_type_encoded"] = chunk["user_type_encoded"].astype("int8")
+    return chunk
+
+
+def sketch_files(paths, chunksize, max_sketch_keys=2_000_000):
+    """Pass 1 over `paths`: fold every chunk into one StatsSketch."""
+    sketch = StatsSketch(max_sketch_keys)
+    seen = SeenHashes()
+    for chunk in iter_chunks(paths, chunksize):
+        sketch.update(base_clean(chunk), seen)
+    return sketch
+
+
+def features_file(output_path):
+    """Training features next to a single-file output: `<name>_features.parquet`."""
+    return os.path.splitext(output_path)[0] + "_features.parquet"
+
+
+def write_files(paths, stats, output_path, chunksize, csv_path=None, features_path=None):
+    """
+    Pass 2 over `paths`: transform each chunk, then append its serving
+    columns to `output_path` and its training features to `features_path`
+    (see dashboard/schema.py).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    features_path = features_path or features_file(output_path)
+    for path in (output_path, features_path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    writers, rows = {}, 0
+    seen = SeenHashes()
+    for chunk in iter_chunks(paths, chunksize):
+        chunk = transform_chunk(base_clean(chunk), stats, seen)
+        if chunk.empty:
+            continue
+        serving, features = schema.split_serving(chunk)
+        for path, part in ((output_path, serving), (features_path, features)):
+            writer = writers.get(path)
+            table = pa.Table.from_pandas(part, preserve_index=False,
+                                         schema=writer.schema if writer else None)
+            if writer is None:
+                table = schema.stamp(table)
+                writer = writers[path] = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+        if csv_path:
+            serving.to_csv(csv_path, mode="a" if rows else "w", header=not rows, index=False)
+        rows += len(chunk)
+    for writer in writers.values():
+        writer.close()
+    return rows
+
+
+def run_streaming(raw_paths, output_path, max_memory_mb=512, chunksize=None,
+                  export_csv=False, max_sketch_keys=2_000_000):
+    """Two-pass bounded-memory preprocessing of `raw_paths` into `output_path`."""
+    chunksize = chunksize or estimate_chunksize(raw_paths[0], max_memory_mb)
+    stats = sketch_files(raw_paths, chunksize, max_sketch_keys).resolve()
+    csv_path = os.path.splitext(output_path)[0] + ".csv" if export_csv else None
+    return write_files(raw_paths, stats, output_path, chunksize, csv_path), stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bounded-memory GoBike preprocessing")
+    parser.add_argument("raw", nargs="+", help="raw monthly CSV files or glob patterns")
+    parser.add_argument("--output", default="data/processed/cleaned_fordgobike_data.parquet")
+    parser.add_argument("--max-memory-mb", type=int, default=512,
+                        help="approximate peak memory budget per chunk")
+    parser.add_argument("--chunksize", type=int, help="rows per chunk (overrides the budget)")
+    parser.add_argument("--csv", action="store_true", help="also export a CSV copy")
+    args = parser.parse_args()
+
+    paths = sorted(p for pattern in args.raw for p in glob.glob(pattern))
+    rows, stats = run_streaming(paths, args.output, args.max_memory_mb,
+                                args.chunksize, args.csv)
+    print(f"Wrote {rows:,} rows to {args.output}"
+          + ("" if stats["exact"] else " (approximate coordinate bounds)"))
@@ -0,0 +1,134 @@
+# ==============================
+# Synthetic Trips
+# ==============================
+# Generates GoBike-shaped data at any size for benchmarks: raw monthly CSVs
+# in the published schema (to run the preprocessing pipeline on), or a
+# processed-trips table with the columns and dtypes the dashboard reads.
+# Proportions roughly follow the February 2019 data: ~90% subscribers,
+# ~75% male riders, a few hundred start stations with a long tail, and
+# commute peaks at 8h and 17h. Raw files also carry the defects the
+# cleaning removes: missing gender/birth year/station, zero coordinates,
+# and a few duplicated rows.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from preprocessing_stream import AGE_LABELS
+
+USER_TYPES = ["Subscriber", "Customer"]
+GENDERS = ["Male", "Female", "Other"]
+
+# Rows generated at once when writing raw files
+RAW_CHUNK_ROWS = 1_000_000
+
+
+def _hour_weights():
+    """Two commute peaks on top of a flat daytime base."""
+    weights = np.full(24, 1.0)
+    weights[6:22] += 3
+    weights[[7, 8, 9, 16, 17, 18]] += [6, 12, 6, 6, 12, 6]
+    return weights / weights.sum()
+
+
+def _popularity(stations):
+    weights = 1.0 / np.arange(1, stations + 1) ** 0.8
+    return weights / weights.sum()
+
+
+def synthetic_raw(rows, seed=0, stations=330, month="2019-02"):
+    """Random trips in the raw monthly CSV schema."""
+    rng = np.random.default_rng(seed)
+    station_rng = np.random.default_rng(12345)  # same stations in every file
+    lat = 37.77 + station_rng.normal(0, 0.03, stations)
+    lon = -122.41 + station_rng.normal(0, 0.04, stations)
+    lat[-1] = lon[-1] = 0.0  # one station with broken coordinates
+    names = np.array([f"Station {i}" for i in range(stations)], dtype=object)
+
+    start_station = rng.choice(stations, size=rows, p=_popularity(stations))
+    end_station = rng.choice(stations, size=rows, p=_popularity(stations))
+    days = pd.Timestamp(month + "-01").days_in_month
+    seconds = (rng.integers(0, days, size=rows) * 86400
+               + rng.choice(24, size=rows, p=_hour_weights()) * 3600
+               + rng.integers(0, 3600, size=rows))
+    start_time = pd.Timestamp(month + "-01") + pd.to_timedelta(seconds, unit="s")
+    duration = np.round(rng.gamma(2.0, 360.0, size=rows)).astype(np.int64) + 61
+    end_time = start_time + pd.to_timedelta(duration, unit="s")
+
+    birth_year = rng.integers(1945, 2004, size=rows).astype(float)
+    birth_year[rng.random(rows) < 0.045] = np.nan
+    gender = np.array(GENDERS, dtype=object)[rng.choice(3, size=rows, p=[0.74, 0.23, 0.03])]
+    gender[rng.random(rows) < 0.045] = None
+    start_id = start_station.astype(float)
+    start_id[rng.random(rows) < 0.001] = np.nan
+
+    df = pd.DataFrame({
+        "duration_sec": duration,
+        "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S.%f").str[:-2],
+        "end_time": end_time.strftime("%Y-%m-%d %H:%M:%S.%f").str[:-2],
+        "start_station_id": start_id,
+        "start_station_name": np.where(np.isnan(start_id), None, names[start_station]),
+        "start_station_latitude": lat[start_station],
+        "start_station_longitude": lon[start_station],
+        "end_station_id": end_station.astype(float),
+        "end_station_name": names[end_station],
+        "end_station_latitude": lat[end_station],
+        "end_station_longitude": lon[end_station],
+        "bike_id": rng.integers(1, 7000, size=rows),
+        "user_type": np.where(rng.random(rows) < 0.1, "Customer", "Subscriber"),
+        "member_birth_year": birth_year,
+        "member_gender": gender,
+        "bike_share_for_all_trip": np.where(rng.random(rows) < 0.1, "Yes", "No"),
+    })
+    # A few exact duplicates, like the published files
+    return pd.concat([df, df.iloc[:max(rows // 10_000, 1)]], ignore_index=True)
+
+
+def write_raw(rows, raw_dir, months=1, seed=0):
+    """
+    Write `rows` raw trips split over `months` monthly CSVs in `raw_dir`,
+    generating at most RAW_CHUNK_ROWS rows at a time. Returns the paths.
+    """
+    os.makedirs(raw_dir, exist_ok=True)
+    paths = []
+    for m in range(months):
+        month = (pd.Timestamp("2019-01-01") + pd.DateOffset(months=m)).strftime("%Y-%m")
+        path = os.path.join(raw_dir, f"fordgobike-tripdataFor{month.replace('-', '')}.csv")
+        todo = rows // months + (m < rows % months)
+        part = 0
+        while todo > 0 or part == 0:
+            n = min(todo, RAW_CHUNK_ROWS)
+            chunk = synthetic_raw(n, seed=seed * 1000 + m * 100 + part, month=month)
+            chunk.to_csv(path, mode="a" if part else "w", header=not part, index=False)
+            todo -= n
+            part += 1
+        paths.append(path)
+    return paths
+
+
+def synthetic_trips(rows, seed=0, stations=330, start="2019-02-01", days=28):
+    """Random trips shaped like `scripts/preprocessing.py` output."""
+    rng = np.random.default_rng(seed)
+    hour = rng.choice(24, size=rows, p=_hour_weights())
+    day = rng.integers(0, days, size=rows)
+    offset = pd.to_timedelta(day * 86400 + hour * 3600 + rng.integers(0, 3600, size=rows), unit="s")
+    start_time = pd.Timestamp(start) + offset
+
+    station_names = np.array([f"Station {i}" for i in range(stations)], dtype=object)
+
+    return pd.DataFrame({
+        "start_time": start_time,
+        "start_hour": hour.astype("int8"),
+        "day_of_week": start_time.dayofweek.astype("int8"),
+        "user_type": pd.Categorical.from_codes(
+            (rng.random(rows) < 0.1).astype(np.int8), USER_TYPES),
+        "member_gender": pd.Categorical.from_codes(
+            rng.choice(3, size=rows, p=[0.74, 0.23, 0.03]).astype(np.int8), GENDERS),
+        "age_group": pd.Categorical.from_codes(
+            rng.choice(len(AGE_LABELS), size=rows, p=[0.08, 0.42, 0.27, 0.13, 0.08, 0.02]).astype(np.int8),
+            AGE_LABELS, ordered=True),
+        "start_station_name": pd.Categorical(
+            station_names[rng.choice(stations, size=rows, p=_popularity(stations))]),
+        "duration_mins": np.round(rng.gamma(2.0, 6.0, size=rows)).clip(0, 65535).astype("uint16"),
+    })
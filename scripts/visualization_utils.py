@@ -1,34 +1,40 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
 import pandas as pd
 import numpy as np
 
+# matplotlib and seaborn are imported by the functions that draw, so
+# importing this module stays cheap
+
 # Data loading is moved to the __main__ block at the bottom to allow safe importing.
 
 #Univariate Plotting Functions
 def duration_distribution(ax, df):
+    import seaborn as sns
     sns.histplot(df["duration_mins"], bins=40, kde=True, ax=ax)
     ax.set_title("Distribution of Trip Duration (Minutes)", fontsize = 10)
     ax.set_xlabel("Duration (Minutes)")
     ax.set_ylabel("Count")
 
 def age_distribution(ax, df):
+    import seaborn as sns
     sns.histplot(df["age"], bins=30, kde=True, ax=ax)
     ax.set_title("Distribution of Age", fontsize = 10)
     ax.set_xlabel("Age")
     ax.set_ylabel("Count")
 
 def gender_distribution(ax, df):
+    import seaborn as sns
     sns.countplot(x="member_gender", data=df, ax=ax)
     ax.set_title("Gender Distribution", fontsize = 10)
 
 def age_group_count(ax, df):
+    import seaborn as sns
     sns.countplot(x="age_group", data=df, ax=ax)
     ax.set_title("Number of Riders per Age Group", fontsize = 10)
 
 #Bivariate Plot Functions
 
 def age_vs_duration(ax, df):
+    import seaborn as sns
     sns.scatterplot(x="age", y="duration_mins", data=df, alpha=0.3, ax=ax)
     ax.set_title("Age vs Trip Duration", fontsize = 10)
 
@@ -39,6 +45,7 @@ def avg_duration_by_age_group(ax, df):
     ax.set_ylabel("Average Duration (Minutes)", fontsize = 10)
 
 def duration_by_gender(ax, df):
+    import seaborn as sns
     sns.barplot(x="member_gender", y="duration_mins", data=df, ax=ax)
     ax.set_title("Trip Duration by Gender", fontsize = 10)
 
@@ -50,6 +57,7 @@ def user_type_distribution(ax, df):
     ax.set_ylabel("Count")
 
 def numerical_boxplots(df):
+    import matplotlib.pyplot as plt
     num_cols = df.select_dtypes(include=["int64", "float64"]).columns
     for col in num_cols:
         fig, ax = plt.subplots()
@@ -58,6 +66,7 @@ def numerical_boxplots(df):
         plt.show()
 
 def run_all_plots(df):
+    import matplotlib.pyplot as plt
 
     fig, axes = plt.subplots(3, 3, figsize=(18, 15))
     fig.suptitle("EDA", fontsize=10)
@@ -79,5 +88,5 @@ def run_all_plots(df):
 if __name__ == "__main__":
     import os
     # Load data for testing the plots directly
-    data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'cleaned_fordgobike_data.csv')
-    test_df = pd.read_csv(data_path)
\ No newline at end of file
+    data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'trips')
+    test_df = pd.read_parquet(data_path)
\ No newline at end of file